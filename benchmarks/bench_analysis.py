@@ -0,0 +1,77 @@
+"""
+Runtime of the analysis scripts on the loaded feed: the same load_* and
+plot_* steps their main() runs, with charts written to a temp directory.
+
+The stop_times-heavy analyses (temporal, headways) run twice: straight
+from the database and from a Parquet feed cache written from the scaled
+feed, since both paths are used in practice.
+"""
+import matplotlib
+import pytest
+
+matplotlib.use('Agg')
+
+from src.analysis import headways, route_analysis, spatial_analysis, temporal_analysis  # noqa: E402
+from src.analysis.nearest_stops import isolated_stops  # noqa: E402
+from src.analysis.temporal_engine import load_temporal_aggregates  # noqa: E402
+from src.etl.feed_cache import write_feed_cache  # noqa: E402
+
+ANALYSIS_ROUNDS = {1: 3, 10: 2, 100: 1}
+SOURCES = ['database', 'feed_cache']
+
+
+@pytest.fixture(scope='session')
+def feed_cache_dirs(loaded_feed, feed_dir, tmp_path_factory):
+    """{source: cache_dir}; 'database' points at a directory with no cache."""
+    cache_dir = tmp_path_factory.mktemp('gtfs_cache')
+    write_feed_cache(feed_dir, cache_dir, force=True)
+    return {'database': tmp_path_factory.mktemp('no_cache'), 'feed_cache': cache_dir}
+
+
+def run_rounds(benchmark, target, scale, **extra_info):
+    benchmark.extra_info.update(scale=scale, **extra_info)
+    return benchmark.pedantic(target, rounds=ANALYSIS_ROUNDS.get(scale, 1), iterations=1)
+
+
+def test_route_analysis(benchmark, bench_engine, loaded_feed, scale, tmp_path):
+    def run():
+        route_analysis.plot_route_frequency(route_analysis.load_route_frequency(bench_engine), tmp_path)
+        route_analysis.plot_stop_distribution(route_analysis.load_stop_distribution(bench_engine), tmp_path)
+
+    run_rounds(benchmark, run, scale)
+
+
+def test_spatial_analysis(benchmark, bench_engine, loaded_feed, scale, tmp_path):
+    def run():
+        spatial_analysis.save_stop_map(spatial_analysis.load_stops_with_connectivity(bench_engine), tmp_path)
+        df_isolated = isolated_stops(bench_engine, threshold_m=spatial_analysis.ISOLATION_THRESHOLD_M)
+        if len(df_isolated) > 0:
+            spatial_analysis.plot_stop_isolation(df_isolated, tmp_path)
+        return spatial_analysis.load_network_stats(bench_engine)
+
+    run_rounds(benchmark, run, scale)
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_temporal_analysis(benchmark, bench_engine, feed_cache_dirs, scale, source, tmp_path):
+    cache_dir = feed_cache_dirs[source]
+
+    def run():
+        aggregates = load_temporal_aggregates(bench_engine, cache_dir)
+        temporal_analysis.plot_hourly_service(temporal_analysis.load_hourly_departures(aggregates), tmp_path)
+        temporal_analysis.plot_day_type(temporal_analysis.load_day_type_trips(bench_engine, cache_dir), tmp_path)
+        temporal_analysis.plot_peak_hours(
+            temporal_analysis.load_route_peaks(aggregates, bench_engine, cache_dir=cache_dir), tmp_path
+        )
+
+    run_rounds(benchmark, run, scale, source=source)
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_headways(benchmark, bench_engine, feed_cache_dirs, scale, source):
+    cache_dir = feed_cache_dirs[source]
+    route_headways, stop_headways, _ = run_rounds(
+        benchmark, lambda: headways.compute_headways(engine=bench_engine, cache_dir=cache_dir),
+        scale, source=source,
+    )
+    benchmark.extra_info.update(route_rows=len(route_headways), stop_rows=len(stop_headways))
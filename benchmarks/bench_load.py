@@ -0,0 +1,46 @@
+"""
+ETL throughput: a full COPY load of the scaled feed, as load_gtfs does it.
+
+Each round truncates the GTFS tables and loads every file in load order.
+The per-table rows/sec of the last round go into extra_info, so the JSON
+results show which table regressed, not just the total.
+"""
+from benchmarks.harness import clear_gtfs_tables, finish_load, load_feed, mark_loaded
+from src.etl.schema_parser import parse_schema
+
+LOAD_ROUNDS = {1: 3, 10: 2, 100: 1}
+
+
+def test_full_load(benchmark, bench_engine, feed_dir, scale):
+    schema = parse_schema()
+    results = benchmark.pedantic(
+        load_feed,
+        args=(bench_engine, feed_dir, schema),
+        setup=lambda: clear_gtfs_tables(bench_engine),
+        rounds=LOAD_ROUNDS.get(scale, 1),
+        iterations=1,
+    )
+
+    benchmark.extra_info['scale'] = scale
+    benchmark.extra_info['tables'] = {
+        table: {
+            'rows_loaded': r['rows_loaded'],
+            'seconds': round(r['seconds'], 4),
+            'rows_per_sec': round(r['rows_per_sec']),
+        }
+        for table, r in results.items()
+    }
+    total_rows = sum(r['rows_loaded'] for r in results.values())
+    benchmark.extra_info['total_rows'] = total_rows
+    benchmark.extra_info['rows_per_sec'] = round(total_rows / benchmark.stats.stats.mean)
+
+    assert total_rows > 0
+
+    finish_load(bench_engine)
+    mark_loaded(feed_dir, results)
+
+
+def test_feature_refresh(benchmark, bench_engine, loaded_feed, scale):
+    """Post-load work: route_stats/stop_stats, service_dates and ANALYZE."""
+    benchmark.extra_info['scale'] = scale
+    benchmark.pedantic(finish_load, args=(bench_engine,), rounds=LOAD_ROUNDS.get(scale, 1), iterations=1)
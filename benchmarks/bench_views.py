@@ -0,0 +1,52 @@
+"""
+Latency of every view in sql/feature_queries.sql on the loaded feed.
+
+The views read the route_stats/stop_stats summary tables; a change that
+puts stop_times back in a view's plan fails here (the seq scan also shows
+in extra_info) instead of only showing up as a slower dashboard.
+"""
+import json
+import re
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+from src.database.instrumentation import plan_summary
+
+project_root = Path(__file__).parent.parent
+feature_queries_path = project_root / 'sql' / 'feature_queries.sql'
+
+VIEW_PATTERN = re.compile(r"CREATE\s+(?:OR\s+REPLACE\s+)?VIEW\s+(\w+)", re.IGNORECASE)
+
+# Tables no feature view should scan in full
+GUARDED_TABLES = {'stop_times', 'trips'}
+
+
+def feature_views(path=feature_queries_path):
+    return VIEW_PATTERN.findall(Path(path).read_text())
+
+
+def seq_scanned_tables(conn, query):
+    """Relations read with a Seq Scan in query's plan."""
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {query}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return sorted({scan['relation'] for scan in plan_summary(plan)['seq_scans']})
+
+
+def fetch_all(engine, query):
+    with engine.connect() as conn:
+        return len(conn.execute(text(query)).fetchall())
+
+
+@pytest.mark.parametrize('view', feature_views())
+def test_view_latency(benchmark, bench_engine, loaded_feed, scale, view):
+    query = f"SELECT * FROM {view}"
+    with bench_engine.connect() as conn:
+        seq_scans = seq_scanned_tables(conn, query)
+
+    rows = benchmark(fetch_all, bench_engine, query)
+
+    benchmark.extra_info.update(scale=scale, view=view, rows=rows, seq_scans=seq_scans)
+    assert not GUARDED_TABLES & set(seq_scans), f"{view} seq-scans {sorted(GUARDED_TABLES & set(seq_scans))}"
@@ -0,0 +1,96 @@
+"""
+Compare two saved benchmark runs (pytest-benchmark JSON).
+
+    python -m benchmarks.compare                  # the two latest runs
+    python -m benchmarks.compare OLD.json NEW.json
+
+Prints the mean time of every benchmark in both runs, and the load rows/sec
+per table; exits with 1 when any benchmark got more than
+REGRESSION_THRESHOLD slower, so it can gate a CI job.
+"""
+import json
+import sys
+from pathlib import Path
+
+results_dir = Path(__file__).parent / 'results'
+
+REGRESSION_THRESHOLD = 0.10
+
+
+def latest_runs(count=2, directory=results_dir):
+    # Saved as results/<machine>/<NNNN>_<commit>_<time>.json; the counter orders runs
+    return sorted(Path(directory).glob('*/*.json'), key=lambda p: p.name)[-count:]
+
+
+def read_run(path):
+    with open(path) as f:
+        data = json.load(f)
+    return {b['fullname']: b for b in data['benchmarks']}
+
+
+def compare_runs(old, new):
+    """Rows of (name, old_mean, new_mean, change) for benchmarks in both runs."""
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        old_mean = old[name]['stats']['mean']
+        new_mean = new[name]['stats']['mean']
+        rows.append((name, old_mean, new_mean, new_mean / old_mean - 1 if old_mean else 0.0))
+    return rows
+
+
+def compare_load_tables(old, new):
+    """Rows of (benchmark, table, old_rows_per_sec, new_rows_per_sec) from the load benchmarks."""
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        old_tables = old[name].get('extra_info', {}).get('tables', {})
+        new_tables = new[name].get('extra_info', {}).get('tables', {})
+        for table in sorted(old_tables.keys() & new_tables.keys()):
+            rows.append((name, table, old_tables[table]['rows_per_sec'], new_tables[table]['rows_per_sec']))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'Benchmark':<70}{'Old (s)':>10}{'New (s)':>10}{'Change':>9}")
+    print("-" * 99)
+    for name, old_mean, new_mean, change in rows:
+        flag = "  ✗" if change > REGRESSION_THRESHOLD else ""
+        print(f"{name[-70:]:<70}{old_mean:>10.4f}{new_mean:>10.4f}{change:>+9.1%}{flag}")
+
+
+def print_load_tables(rows):
+    print(f"{'Load benchmark':<50}{'Table':<16}{'Old rows/s':>14}{'New rows/s':>14}")
+    print("-" * 94)
+    for name, table, old_rate, new_rate in rows:
+        print(f"{name[-50:]:<50}{table:<16}{old_rate:>14,}{new_rate:>14,}")
+
+
+def main():
+    paths = [Path(p) for p in sys.argv[1:3]] or latest_runs()
+    if len(paths) < 2:
+        print(f"✗ Need two benchmark runs to compare (found {len(paths)} in {results_dir})")
+        return 1
+
+    old, new = (read_run(p) for p in paths)
+    print(f"Old: {paths[0]}")
+    print(f"New: {paths[1]}")
+    print()
+
+    rows = compare_runs(old, new)
+    print_comparison(rows)
+    print()
+
+    table_rows = compare_load_tables(old, new)
+    if table_rows:
+        print_load_tables(table_rows)
+        print()
+
+    regressions = [row for row in rows if row[3] > REGRESSION_THRESHOLD]
+    if regressions:
+        print(f"✗ {len(regressions)} benchmark(s) more than {REGRESSION_THRESHOLD:.0%} slower")
+        return 1
+    print(f"✓ No benchmark more than {REGRESSION_THRESHOLD:.0%} slower")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Shared fixtures for the benchmarks.
+
+They run against a scratch PostgreSQL/PostGIS database that already has
+sql/schema.sql, sql/indexes.sql and sql/feature_queries.sql applied: the
+harness TRUNCATEs and reloads its GTFS tables. Point HALIFAX_BENCH_CONFIG
+at a database.yml for that database; without it every benchmark is
+skipped, so config/database.yml is never touched.
+
+    HALIFAX_BENCH_CONFIG=config/bench.yml pytest benchmarks --gtfs-scale 1,10
+
+Each run is saved as JSON under benchmarks/results (see pytest.ini);
+compare runs with `python -m benchmarks.compare`.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.harness import (  # noqa: E402
+    clear_gtfs_tables, finish_load, load_feed, loaded_feed_state, mark_loaded
+)
+from benchmarks.synthetic_gtfs import generate_feed  # noqa: E402
+from src.database.connection import create_pooled_engine, load_config  # noqa: E402
+from src.etl.schema_parser import parse_schema  # noqa: E402
+
+CONFIG_ENV = 'HALIFAX_BENCH_CONFIG'
+
+
+def pytest_addoption(parser):
+    parser.addoption('--gtfs-scale', default='1',
+                     help="Comma-separated feed scales to benchmark, e.g. 1,10,100")
+
+
+def pytest_generate_tests(metafunc):
+    if 'scale' in metafunc.fixturenames:
+        scales = [int(s) for s in metafunc.config.getoption('gtfs_scale').split(',')]
+        metafunc.parametrize('scale', scales, ids=[f"{s}x" for s in scales], scope='session')
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    output_json['gtfs_scales'] = config.getoption('gtfs_scale')
+
+
+@pytest.fixture(scope='session')
+def bench_engine():
+    path = os.environ.get(CONFIG_ENV)
+    if not path:
+        pytest.skip(f"{CONFIG_ENV} not set (database.yml of a scratch benchmark database)")
+    engine = create_pooled_engine(load_config(path)).execution_options(isolation_level="AUTOCOMMIT")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def feed_dir(scale):
+    return generate_feed(scale)
+
+
+@pytest.fixture(scope='session')
+def loaded_feed(bench_engine, feed_dir):
+    """The scaled feed loaded (once per scale) for the read benchmarks."""
+    state = loaded_feed_state()
+    if state['dir'] != Path(feed_dir):
+        clear_gtfs_tables(bench_engine)
+        results = load_feed(bench_engine, feed_dir, parse_schema())
+        finish_load(bench_engine)
+        mark_loaded(feed_dir, results)
+    return loaded_feed_state()['results']
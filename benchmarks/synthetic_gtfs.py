@@ -0,0 +1,148 @@
+"""
+Synthetic GTFS feeds: the Halifax feed in data/raw/gtfs_static scaled up.
+
+A feed at scale N holds N copies of the network. Copy k > 0 suffixes every
+route, stop, trip and shape id with _k and shifts its stops to a tile of its
+own, so the copies neither collide on keys nor pile up on the same
+coordinates (spatial queries see a network of the same density, N times
+larger). agency, calendar, calendar_dates and feed_info are shared: the
+copies run more trips on the same service calendar.
+
+stop_times is read in chunks and each chunk is written N times, so memory
+stays flat at 100x.
+"""
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+
+project_root = Path(__file__).parent.parent
+source_dir = project_root / 'data' / 'raw' / 'gtfs_static'
+synthetic_dir = project_root / 'data' / 'synthetic'
+
+SCALES = [1, 10, 100]
+CHUNK_SIZE = 500_000
+
+# Degrees between neighbouring copies; wider/taller than the Halifax network
+TILE_LON = 1.0
+TILE_LAT = 0.6
+TILES_PER_ROW = 10
+
+# Copied unchanged into every scaled feed
+SHARED_FILES = ['agency.txt', 'calendar.txt', 'calendar_dates.txt', 'feed_info.txt']
+
+# {file: columns holding ids that get the copy suffix}
+ID_COLUMNS = {
+    'routes.txt': ['route_id'],
+    'stops.txt': ['stop_id', 'stop_code', 'parent_station'],
+    'trips.txt': ['route_id', 'trip_id', 'block_id', 'shape_id'],
+    'shapes.txt': ['shape_id'],
+    'stop_times.txt': ['trip_id', 'stop_id'],
+}
+
+
+def scaled_feed_dir(scale, output_dir=synthetic_dir):
+    return output_dir / f"gtfs_{scale}x"
+
+
+def suffix_ids(df, columns, copy_index):
+    """Copy copy_index of df: ids suffixed with _copy_index (copy 0 is the original)."""
+    if copy_index == 0:
+        return df
+    df = df.copy()
+    for col in columns:
+        if col in df.columns:
+            present = df[col] != ''
+            df.loc[present, col] = df.loc[present, col] + f"_{copy_index}"
+    return df
+
+
+def shift_coordinates(df, copy_index, lat_column, lon_column):
+    """Move copy copy_index to its own tile (row-major, TILES_PER_ROW wide)."""
+    if copy_index == 0:
+        return df
+    row, col = divmod(copy_index, TILES_PER_ROW)
+    df = df.copy()
+    for column, offset in ((lat_column, row * TILE_LAT), (lon_column, col * TILE_LON)):
+        values = pd.to_numeric(df[column], errors='coerce') + offset
+        df[column] = values.map(lambda v: '' if pd.isna(v) else f"{v:.6f}")
+    return df
+
+
+def scale_copy(df, filename, copy_index):
+    df = suffix_ids(df, ID_COLUMNS[filename], copy_index)
+    if filename == 'stops.txt':
+        df = shift_coordinates(df, copy_index, 'stop_lat', 'stop_lon')
+    elif filename == 'shapes.txt':
+        df = shift_coordinates(df, copy_index, 'shape_pt_lat', 'shape_pt_lon')
+    return df
+
+
+def read_gtfs_text(path, chunksize=None):
+    # Everything as text, blanks kept blank: values are written back untouched
+    return pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=chunksize)
+
+
+def write_scaled_file(source_path, output_path, scale):
+    """Write scale copies of one id-bearing file; returns rows written."""
+    filename = source_path.name
+    chunks = read_gtfs_text(source_path, chunksize=CHUNK_SIZE)
+    rows = 0
+    header = True
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in chunks:
+            for copy_index in range(scale):
+                scale_copy(chunk, filename, copy_index).to_csv(f, index=False, header=header)
+                header = False
+                rows += len(chunk)
+    return rows
+
+
+def generate_feed(scale, source=source_dir, output_dir=synthetic_dir, force=False):
+    """
+    Write the feed at scale to output_dir/gtfs_{scale}x and return its path.
+
+    An existing feed is reused unless force is set (the .complete marker is
+    written last, so an interrupted run is regenerated).
+    """
+    feed_dir = scaled_feed_dir(scale, output_dir)
+    marker = feed_dir / '.complete'
+    if marker.exists() and not force:
+        return feed_dir
+
+    feed_dir.mkdir(parents=True, exist_ok=True)
+    marker.unlink(missing_ok=True)
+    for filename in SHARED_FILES:
+        if (source / filename).exists():
+            shutil.copyfile(source / filename, feed_dir / filename)
+    for filename in ID_COLUMNS:
+        if (source / filename).exists():
+            write_scaled_file(source / filename, feed_dir / filename, scale)
+    marker.write_text(str(scale))
+    return feed_dir
+
+
+def feed_row_counts(feed_dir):
+    """Data rows per file (the header line excluded)."""
+    counts = {}
+    for path in sorted(Path(feed_dir).glob('*.txt')):
+        with open(path, 'rb') as f:
+            counts[path.name] = max(sum(1 for _ in f) - 1, 0)
+    return counts
+
+
+def main():
+    for scale in SCALES:
+        start = time.perf_counter()
+        feed_dir = generate_feed(scale, force=True)
+        seconds = time.perf_counter() - start
+        counts = feed_row_counts(feed_dir)
+        print(f"✓ {scale}x feed in {seconds:.1f}s: {feed_dir}")
+        for filename, rows in counts.items():
+            print(f"    {filename:<20}{rows:>14,}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,162 @@
+-- Summary tables behind the feature views. They hold the aggregates over
+-- stop_times × trips × routes/stops, so reading a view is an index/table scan
+-- of a few thousand rows instead of a full stop_times join. The ETL refreshes
+-- them at the end of a load (only the affected routes/stops on incremental
+-- reloads) with refresh_route_stats() / refresh_stop_stats() below.
+-- route_hourly_stats (departures per route and hour of day) is refreshed
+-- together with route_stats and serves the API's hourly endpoints.
+
+CREATE TABLE IF NOT EXISTS route_stats (
+    route_id VARCHAR(20) PRIMARY KEY,
+    route_short_name VARCHAR(10),
+    route_long_name VARCHAR(100),
+    route_type INTEGER,
+    total_trips BIGINT,
+    service_patterns BIGINT,
+    unique_stops BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS route_hourly_stats (
+    route_id VARCHAR(20),
+    hour INTEGER,
+    num_departures BIGINT,
+    PRIMARY KEY (route_id, hour)
+);
+
+CREATE TABLE IF NOT EXISTS stop_stats (
+    stop_id VARCHAR(20) PRIMARY KEY,
+    stop_name VARCHAR(100),
+    stop_lat DECIMAL(10, 8),
+    stop_lon DECIMAL(11, 8),
+    routes_serving_stop BIGINT,
+    total_trips BIGINT,
+    stop_time_count BIGINT,
+    route_list TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_route_stats_short_name ON route_stats(route_short_name);
+CREATE INDEX IF NOT EXISTS idx_stop_stats_routes ON stop_stats(routes_serving_stop DESC);
+CREATE INDEX IF NOT EXISTS idx_stop_stats_stop_time_count ON stop_stats(stop_time_count DESC);
+
+-- Recompute route_stats and route_hourly_stats for the given routes (all
+-- routes when route_ids is NULL); returns the route_stats rows refreshed
+CREATE OR REPLACE FUNCTION refresh_route_stats(route_ids TEXT[] DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    refreshed INTEGER;
+BEGIN
+    DELETE FROM route_stats
+    WHERE route_ids IS NULL OR route_id = ANY(route_ids);
+
+    INSERT INTO route_stats
+    SELECT
+        r.route_id,
+        r.route_short_name,
+        r.route_long_name,
+        r.route_type,
+        COUNT(DISTINCT t.trip_id) AS total_trips,
+        COUNT(DISTINCT t.service_id) AS service_patterns,
+        COUNT(DISTINCT st.stop_id) AS unique_stops
+    FROM routes r
+    LEFT JOIN trips t ON r.route_id = t.route_id
+    LEFT JOIN stop_times st ON t.trip_id = st.trip_id
+    WHERE route_ids IS NULL OR r.route_id = ANY(route_ids)
+    GROUP BY r.route_id, r.route_short_name, r.route_long_name, r.route_type;
+
+    GET DIAGNOSTICS refreshed = ROW_COUNT;
+
+    DELETE FROM route_hourly_stats
+    WHERE route_ids IS NULL OR route_id = ANY(route_ids);
+
+    INSERT INTO route_hourly_stats
+    SELECT
+        t.route_id,
+        EXTRACT(HOUR FROM st.departure_time)::integer AS hour,
+        COUNT(*) AS num_departures
+    FROM stop_times st
+    JOIN trips t ON st.trip_id = t.trip_id
+    WHERE st.departure_time IS NOT NULL
+      AND (route_ids IS NULL OR t.route_id = ANY(route_ids))
+    GROUP BY t.route_id, EXTRACT(HOUR FROM st.departure_time)::integer;
+
+    RETURN refreshed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute stop_stats for the given stops (all stops when stop_ids is NULL)
+CREATE OR REPLACE FUNCTION refresh_stop_stats(stop_ids TEXT[] DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    refreshed INTEGER;
+BEGIN
+    DELETE FROM stop_stats
+    WHERE stop_ids IS NULL OR stop_id = ANY(stop_ids);
+
+    INSERT INTO stop_stats
+    SELECT
+        s.stop_id,
+        s.stop_name,
+        s.stop_lat,
+        s.stop_lon,
+        COUNT(DISTINCT t.route_id) AS routes_serving_stop,
+        COUNT(DISTINCT st.trip_id) AS total_trips,
+        COUNT(st.trip_id) AS stop_time_count,
+        STRING_AGG(DISTINCT r.route_short_name, ', ' ORDER BY r.route_short_name) AS route_list
+    FROM stops s
+    LEFT JOIN stop_times st ON s.stop_id = st.stop_id
+    LEFT JOIN trips t ON st.trip_id = t.trip_id
+    LEFT JOIN routes r ON t.route_id = r.route_id
+    WHERE stop_ids IS NULL OR s.stop_id = ANY(stop_ids)
+    GROUP BY s.stop_id, s.stop_name, s.stop_lat, s.stop_lon;
+
+    GET DIAGNOSTICS refreshed = ROW_COUNT;
+    RETURN refreshed;
+END;
+$$ LANGUAGE plpgsql;
+
 CREATE OR REPLACE VIEW route_summary AS
 SELECT
-    r.route_id,
-    r.route_short_name,
-    r.route_long_name,
-    r.route_type,
-    COUNT(DISTINCT t.trip_id) AS total_trips,
-    COUNT(DISTINCT t.service_id) AS service_patterns,
-    COUNT(DISTINCT st.stop_id) AS unique_stops
-FROM routes r
-LEFT JOIN trips t ON r.route_id = t.route_id
-LEFT JOIN stop_times st ON t.trip_id = st.trip_id
-GROUP BY r.route_id, r.route_short_name, r.route_long_name, r.route_type
-ORDER BY r.route_short_name;
+    route_id,
+    route_short_name,
+    route_long_name,
+    route_type,
+    total_trips,
+    service_patterns,
+    unique_stops
+FROM route_stats
+ORDER BY route_short_name;
 
 CREATE OR REPLACE VIEW stop_connectivity AS
 SELECT
-    s.stop_id,
-    s.stop_name,
-    s.stop_lat,
-    s.stop_lon,
-    COUNT(DISTINCT t.route_id) AS routes_serving_stop,
-    COUNT(DISTINCT st.trip_id) AS total_trips,
-    STRING_AGG(DISTINCT r.route_short_name, ', ' ORDER BY r.route_short_name) AS route_list
-FROM stops s
-LEFT JOIN stop_times st ON s.stop_id = st.stop_id
-LEFT JOIN trips t ON st.trip_id = t.trip_id
-LEFT JOIN routes r ON t.route_id = r.route_id
-GROUP BY s.stop_id, s.stop_name, s.stop_lat, s.stop_lon
+    stop_id,
+    stop_name,
+    stop_lat,
+    stop_lon,
+    routes_serving_stop,
+    total_trips,
+    route_list
+FROM stop_stats
 ORDER BY routes_serving_stop DESC;
 
 CREATE OR REPLACE VIEW busiest_stops AS
-SELECT 
-    s.stop_id,
-    s.stop_name,
-    s.stop_lat,
-    s.stop_lon,
-    COUNT(st.trip_id) AS daily_trips,
-    COUNT(DISTINCT t.route_id) AS num_routes
-FROM stops s
-LEFT JOIN stop_times st ON s.stop_id = st.stop_id
-LEFT JOIN trips t ON st.trip_id = t.trip_id
-GROUP BY s.stop_id, s.stop_name, s.stop_lat, s.stop_lon
-HAVING COUNT(st.trip_id) > 0
+SELECT
+    stop_id,
+    stop_name,
+    stop_lat,
+    stop_lon,
+    stop_time_count AS daily_trips,
+    routes_serving_stop AS num_routes
+FROM stop_stats
+WHERE stop_time_count > 0
 ORDER BY daily_trips DESC;
 
 CREATE OR REPLACE VIEW route_efficiency AS
-SELECT 
-    r.route_id,
-    r.route_short_name,
-    r.route_long_name,
-    COUNT(t.trip_id) AS total_trips,
-    COUNT(t.trip_id) / NULLIF(COUNT(DISTINCT t.service_id), 0) AS avg_trips_per_service
-FROM routes r
-LEFT JOIN trips t ON r.route_id = t.route_id
-GROUP BY r.route_id, r.route_short_name, r.route_long_name
-HAVING COUNT(t.trip_id) > 0
-ORDER BY avg_trips_per_service DESC;
\ No newline at end of file
+SELECT
+    route_id,
+    route_short_name,
+    route_long_name,
+    total_trips,
+    total_trips / NULLIF(service_patterns, 0) AS avg_trips_per_service
+FROM route_stats
+WHERE total_trips > 0
+ORDER BY avg_trips_per_service DESC;
@@ -5,9 +5,21 @@ CREATE INDEX IF NOT EXISTS idx_trips_route_id ON trips(route_id);
 CREATE INDEX IF NOT EXISTS idx_trips_service_id ON trips(service_id);
 
 CREATE INDEX IF NOT EXISTS idx_calendar_dates_service_id ON calendar_dates(service_id);
+CREATE INDEX IF NOT EXISTS idx_service_dates_service_id ON service_dates(service_id);
 
 CREATE INDEX IF NOT EXISTS idx_shapes_shape_id ON shapes(shape_id);
+CREATE INDEX IF NOT EXISTS idx_stop_shape_offsets_stop_id ON stop_shape_offsets(stop_id);
 
 CREATE INDEX IF NOT EXISTS idx_stops_geom ON stops USING GIST(geom);
 CREATE INDEX IF NOT EXISTS idx_shapes_geom ON shapes USING GIST(geom);
-CREATE INDEX IF NOT EXISTS idx_vehicle_positions_geom ON vehicle_positions USING GIST(geom);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_shape_geometries_geom ON shape_geometries USING GIST(geom);
+CREATE INDEX IF NOT EXISTS idx_vehicle_positions_geom ON vehicle_positions USING GIST(geom);
+
+-- Real-time tables (partitioned: each index is created on every partition).
+-- Rows arrive in time order, so BRIN on timestamp stays tiny and precise.
+CREATE INDEX IF NOT EXISTS idx_vehicle_positions_timestamp ON vehicle_positions USING BRIN(timestamp);
+CREATE INDEX IF NOT EXISTS idx_vehicle_positions_route_time ON vehicle_positions(route_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_trip_updates_timestamp ON trip_updates USING BRIN(timestamp);
+CREATE INDEX IF NOT EXISTS idx_trip_updates_trip_stop ON trip_updates(trip_id, stop_id);
+
+CREATE INDEX IF NOT EXISTS idx_trip_delay_summary_route ON trip_delay_summary(route_id, service_date);
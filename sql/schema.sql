@@ -96,8 +96,57 @@ CREATE TABLE feed_info (
     feed_version VARCHAR(50)
 );
 
+-- File fingerprints of the last load, used by incremental reloads
+CREATE TABLE gtfs_load_state (
+    table_name VARCHAR(50) PRIMARY KEY,
+    file_name VARCHAR(100),
+    file_hash CHAR(64),
+    loaded_at TIMESTAMP
+);
+
+-- Identity of the loaded feed, one row, written as the last step of a load
+-- (after the derived tables are refreshed); caches key on it
+CREATE TABLE feed_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version TEXT NOT NULL,
+    loaded_at TIMESTAMP NOT NULL
+);
+
+-- calendar + calendar_dates expanded to one row per service per active date
+-- (rebuilt after every load by src/etl/service_calendar.py)
+CREATE TABLE service_dates (
+    service_id VARCHAR(50),
+    date DATE,
+    PRIMARY KEY (date, service_id)
+);
+
+-- Each shape as one LineString, simplified at several tolerances (0 = every
+-- point), plus each stop's distance along the shape of the trips serving it
+-- (rebuilt after every load by src/etl/shape_geometry.py)
+CREATE TABLE shape_geometries (
+    shape_id VARCHAR(50),
+    tolerance_m INTEGER,
+    num_points INTEGER,
+    length_m DOUBLE PRECISION,
+    geom GEOMETRY(LineString, 4326),
+    PRIMARY KEY (shape_id, tolerance_m)
+);
+
+CREATE TABLE stop_shape_offsets (
+    shape_id VARCHAR(50),
+    stop_sequence INTEGER,
+    stop_id VARCHAR(20),
+    offset_m DOUBLE PRECISION,
+    snap_distance_m DOUBLE PRECISION,
+    PRIMARY KEY (shape_id, stop_sequence, stop_id)
+);
+
+-- Real-time tables are append-only and partitioned by day on timestamp
+-- (vehicle_positions_pYYYYMMDD, ...). src/etl/partitions.py creates upcoming
+-- partitions and drops expired ones; rows outside every partition land in
+-- the _default partition.
 CREATE TABLE vehicle_positions (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     vehicle_id VARCHAR(50),
     trip_id VARCHAR(50),
     route_id VARCHAR(20),
@@ -105,18 +154,67 @@ CREATE TABLE vehicle_positions (
     position_lon DECIMAL(11, 8),
     bearing DECIMAL(5, 2),
     speed DECIMAL(5, 2),
-    timestamp TIMESTAMP,
-    geom GEOMETRY(Point, 4326)
-);
+    timestamp TIMESTAMP NOT NULL,
+    geom GEOMETRY(Point, 4326),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE vehicle_positions_default PARTITION OF vehicle_positions DEFAULT;
 
 CREATE TABLE trip_updates (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     trip_id VARCHAR(50),
     route_id VARCHAR(20),
     stop_id VARCHAR(20),
     arrival_delay INTEGER,
     departure_delay INTEGER,
-    timestamp TIMESTAMP
+    timestamp TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE trip_updates_default PARTITION OF trip_updates DEFAULT;
+
+-- One row per trip per day, rolled up from trip_updates partitions before
+-- they are dropped (final prediction per stop, then aggregated per trip)
+CREATE TABLE trip_delay_summary (
+    service_date DATE,
+    trip_id VARCHAR(50),
+    route_id VARCHAR(20),
+    stops_reported INTEGER,
+    updates_received INTEGER,
+    avg_arrival_delay DECIMAL(8, 2),
+    max_arrival_delay INTEGER,
+    min_arrival_delay INTEGER,
+    final_arrival_delay INTEGER,
+    first_update TIMESTAMP,
+    last_update TIMESTAMP,
+    PRIMARY KEY (service_date, trip_id)
+);
+
+-- On-time performance counters, added to by src/analysis/delay_engine.py
+-- every flush interval (observations = on_time + early + late)
+CREATE TABLE route_otp (
+    service_date DATE,
+    route_id VARCHAR(20),
+    hour INTEGER,
+    observations BIGINT,
+    on_time BIGINT,
+    early BIGINT,
+    late BIGINT,
+    total_delay_sec BIGINT,
+    PRIMARY KEY (service_date, route_id, hour)
+);
+
+CREATE TABLE stop_otp (
+    service_date DATE,
+    stop_id VARCHAR(20),
+    hour INTEGER,
+    observations BIGINT,
+    on_time BIGINT,
+    early BIGINT,
+    late BIGINT,
+    total_delay_sec BIGINT,
+    PRIMARY KEY (service_date, stop_id, hour)
 );
 
 CREATE OR REPLACE FUNCTION update_stops_geom()
@@ -155,7 +253,15 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- The realtime ingester sends geom with each row, so the insert trigger only
+-- fills it in for writers that leave it NULL
+CREATE TRIGGER trigger_insert_vehicle_positions_geom
+BEFORE INSERT ON vehicle_positions
+FOR EACH ROW
+WHEN (NEW.geom IS NULL)
+EXECUTE FUNCTION update_vehicle_positions_geom();
+
 CREATE TRIGGER trigger_update_vehicle_positions_geom
-BEFORE INSERT OR UPDATE ON vehicle_positions
+BEFORE UPDATE ON vehicle_positions
 FOR EACH ROW
 EXECUTE FUNCTION update_vehicle_positions_geom();
\ No newline at end of file
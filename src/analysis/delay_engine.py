@@ -0,0 +1,336 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.database.connection import get_engine
+from src.etl import feed_cache
+from src.etl.copy_loader import copy_dataframe
+
+# trip_updates timestamps are UTC; schedule times are local to the agency
+AGENCY_TIMEZONE = 'America/Halifax'
+
+# A stop is on time when it is served between 1 minute early and 5 minutes late
+ON_TIME_WINDOW = (-60, 300)
+
+FLUSH_INTERVAL = 30.0
+POLL_INTERVAL = 5.0
+
+# Service days whose last scheduled stop is this long past are dropped from memory
+STATE_RETENTION = timedelta(hours=6)
+
+OTP_COLUMNS = ['observations', 'on_time', 'early', 'late', 'total_delay_sec']
+
+SCHEDULE_QUERY = """
+SELECT
+    st.trip_id,
+    t.route_id,
+    st.stop_id,
+    st.stop_sequence,
+    EXTRACT(EPOCH FROM COALESCE(st.arrival_time, st.departure_time))::integer AS arrival_sec
+FROM stop_times st
+JOIN trips t ON st.trip_id = t.trip_id;
+"""
+
+TRIP_UPDATES_QUERY = """
+SELECT id, trip_id, stop_id, arrival_delay, departure_delay, timestamp
+FROM trip_updates
+WHERE timestamp >= :since AND id > :last_id
+ORDER BY id
+LIMIT :limit;
+"""
+
+
+def local_epoch(timestamps):
+    """
+    Naive UTC timestamps as seconds since 1970-01-01 00:00 agency local time,
+    so day boundaries (// 86400) fall on local midnight like the schedule's.
+    """
+    local = pd.DatetimeIndex(pd.to_datetime(timestamps)).tz_localize('UTC').tz_convert(AGENCY_TIMEZONE)
+    return ((local.tz_localize(None) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+
+
+class ScheduleArrays:
+    """
+    The static schedule as flat arrays sorted by (trip, stop_sequence).
+
+    Row i is one scheduled stop: trip_code[i], stop_sequence[i], stop_code[i],
+    route_code[i] and arrival_sec[i] (seconds since service-day midnight).
+    Rows of a trip are contiguous and in sequence order, so "this stop and
+    every later stop of the trip" is a slice.
+    """
+
+    def __init__(self, df):
+        df = df[df['arrival_sec'].notna()]
+        trip_codes, trip_ids = pd.factorize(df['trip_id'].astype('string'))
+        stop_codes, stop_ids = pd.factorize(df['stop_id'].astype('string'))
+        route_codes, route_ids = pd.factorize(df['route_id'].astype('string'))
+        stop_sequence = df['stop_sequence'].to_numpy(dtype=np.int64)
+
+        order = np.lexsort((stop_sequence, trip_codes))
+        self.trip_ids = pd.Index(trip_ids)
+        self.stop_ids = pd.Index(stop_ids)
+        self.route_ids = pd.Index(route_ids)
+        self.trip_code = trip_codes[order].astype(np.int32)
+        self.stop_sequence = stop_sequence[order].astype(np.int32)
+        self.stop_code = stop_codes[order].astype(np.int32)
+        self.route_code = route_codes[order].astype(np.int32)
+        self.arrival_sec = df['arrival_sec'].to_numpy(dtype=np.int32)[order]
+        self.hour = (self.arrival_sec // 3600) % 24
+
+        # (trip, stop) -> first row of that stop in the trip, for updates that
+        # carry stop_id but no stop_sequence
+        self.trip_stop_key = self.trip_code.astype(np.int64) * len(self.stop_ids) + self.stop_code
+        key_order = np.argsort(self.trip_stop_key, kind='stable')
+        self._sorted_keys = self.trip_stop_key[key_order]
+        self._sorted_rows = key_order
+
+    def __len__(self):
+        return len(self.trip_code)
+
+    def rows_for(self, trip_ids, stop_ids):
+        """Schedule row of each (trip_id, stop_id), -1 where it isn't in the schedule."""
+        trips = self.trip_ids.get_indexer(pd.Index(trip_ids, dtype='string'))
+        stops = self.stop_ids.get_indexer(pd.Index(stop_ids, dtype='string'))
+        known = (trips >= 0) & (stops >= 0)
+        keys = trips.astype(np.int64) * len(self.stop_ids) + stops
+        position = np.searchsorted(self._sorted_keys, keys)
+        position = np.minimum(position, len(self._sorted_keys) - 1)
+        found = known & (self._sorted_keys[position] == keys)
+        return np.where(found, self._sorted_rows[position], -1)
+
+
+class DelayEngine:
+    """
+    Streams trip_updates against the schedule and keeps OTP aggregates in memory.
+
+    For each service day seen, the latest reported delay per scheduled stop is
+    kept in one float array over the schedule rows. GTFS-RT delays carry
+    forward: a stop without its own update takes the delay of the closest
+    earlier stop of the same trip that has one. That as-of join is one
+    searchsorted over the rows that have updates.
+
+    A stop counts once, when its scheduled arrival plus delay has passed.
+    Its outcome (early / on time / late, delay) is added to route x hour and
+    stop x hour counters; flush() writes the counters to route_otp and
+    stop_otp and starts new ones, so dashboards read small tables that are
+    at most one flush interval behind.
+    """
+
+    def __init__(self, schedule, on_time_window=ON_TIME_WINDOW):
+        self.schedule = schedule
+        self.early_limit, self.late_limit = on_time_window
+        self.days = {}
+        self._reset_counters()
+
+    def _reset_counters(self):
+        # {service_day: (codes * 24 hours, OTP_COLUMNS) array}
+        self.route_counts = {}
+        self.stop_counts = {}
+
+    def _day_state(self, service_date):
+        if service_date not in self.days:
+            n = len(self.schedule)
+            self.days[service_date] = {
+                'delay': np.full(n, np.nan, dtype=np.float32),
+                'reported_at': np.zeros(n, dtype=np.int64),
+                'counted': np.zeros(n, dtype=bool),
+            }
+        return self.days[service_date]
+
+    def ingest(self, updates):
+        """
+        Apply a batch of trip_updates rows (trip_id, stop_id, arrival_delay,
+        departure_delay, timestamp). Returns the number of rows matched to
+        the schedule.
+        """
+        if len(updates) == 0:
+            return 0
+        rows = self.schedule.rows_for(updates['trip_id'], updates['stop_id'])
+        delay = updates['arrival_delay'].astype('Float64').fillna(
+            updates['departure_delay'].astype('Float64')).to_numpy(dtype=np.float64, na_value=np.nan)
+        matched = (rows >= 0) & ~np.isnan(delay)
+        rows, delay = rows[matched], delay[matched]
+        reported_epoch = local_epoch(updates['timestamp'].to_numpy()[matched])
+
+        # Service date: the midnight closest to (report time - scheduled time
+        # - delay), which also places after-midnight trips (25:10:00) correctly
+        midnight = reported_epoch - self.schedule.arrival_sec[rows] - delay.astype(np.int64)
+        service_day = (midnight + 43_200) // 86_400
+
+        for day in np.unique(service_day):
+            in_day = service_day == day
+            state = self._day_state(int(day))
+            day_rows, day_delay, day_reported = rows[in_day], delay[in_day], reported_epoch[in_day]
+
+            # Keep the latest report per stop (stable sort by time, last write wins)
+            order = np.argsort(day_reported, kind='stable')
+            day_rows, day_delay, day_reported = day_rows[order], day_delay[order], day_reported[order]
+            newer = day_reported >= state['reported_at'][day_rows]
+            state['delay'][day_rows[newer]] = day_delay[newer]
+            state['reported_at'][day_rows[newer]] = day_reported[newer]
+        return int(matched.sum())
+
+    def effective_delay(self, state):
+        """Delay for every schedule row, carried forward within each trip (NaN if none)."""
+        known = np.flatnonzero(~np.isnan(state['delay']))
+        effective = np.full(len(self.schedule), np.nan, dtype=np.float32)
+        if len(known) == 0:
+            return effective
+        position = np.searchsorted(known, np.arange(len(self.schedule)), side='right') - 1
+        has_prior = position >= 0
+        source = known[np.maximum(position, 0)]
+        same_trip = has_prior & (self.schedule.trip_code[source] == self.schedule.trip_code)
+        effective[same_trip] = state['delay'][source[same_trip]]
+        return effective
+
+    def observe(self, now=None):
+        """
+        Count every stop whose (delayed) arrival time has passed and that
+        hasn't been counted yet. Returns the number of stops counted.
+        """
+        now_epoch = int(local_epoch([now or datetime.utcnow()])[0])
+        counted = 0
+        for day, state in list(self.days.items()):
+            midnight = day * 86_400
+            effective = self.effective_delay(state)
+            arrived = midnight + self.schedule.arrival_sec + np.nan_to_num(effective.astype(np.float64), nan=np.inf) <= now_epoch
+            new = np.flatnonzero(arrived & ~state['counted'])
+            if len(new):
+                self._count(day, new, effective[new])
+                state['counted'][new] = True
+                counted += len(new)
+
+            last_arrival = midnight + int(self.schedule.arrival_sec.max()) if len(self.schedule) else midnight
+            if now_epoch - last_arrival > STATE_RETENTION.total_seconds():
+                del self.days[day]
+        return counted
+
+    def _count(self, day, rows, delay):
+        early = delay < self.early_limit
+        late = delay > self.late_limit
+        on_time = ~early & ~late
+        values = np.column_stack([np.ones(len(rows)), on_time, early, late, delay]).astype(np.float64)
+        hours = self.schedule.hour[rows]
+
+        for counters, codes, n_codes in (
+            (self.route_counts, self.schedule.route_code[rows], len(self.schedule.route_ids)),
+            (self.stop_counts, self.schedule.stop_code[rows], len(self.schedule.stop_ids)),
+        ):
+            if day not in counters:
+                counters[day] = np.zeros((n_codes * 24, len(OTP_COLUMNS)), dtype=np.float64)
+            np.add.at(counters[day], codes.astype(np.int64) * 24 + hours, values)
+
+    def _frames(self, counters, ids, id_column):
+        frames = []
+        for day, counts in counters.items():
+            nonzero = np.flatnonzero(counts[:, 0])
+            if len(nonzero) == 0:
+                continue
+            codes, hours = np.divmod(nonzero, 24)
+            frame = pd.DataFrame(counts[nonzero].round().astype(np.int64), columns=OTP_COLUMNS)
+            frame.insert(0, 'hour', hours)
+            frame.insert(0, id_column, ids[codes].to_numpy())
+            frame.insert(0, 'service_date', pd.Timestamp(day * 86_400, unit='s').date())
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['service_date', id_column, 'hour'] + OTP_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def flush(self, engine):
+        """
+        Add the counters to route_otp / stop_otp (one transaction) and reset
+        them. Returns {table: rows_upserted}.
+        """
+        route_rows = self._frames(self.route_counts, self.schedule.route_ids, 'route_id')
+        stop_rows = self._frames(self.stop_counts, self.schedule.stop_ids, 'stop_id')
+        written = {}
+        with engine.begin() as conn:
+            cursor = conn.connection.cursor()
+            try:
+                for table_name, key, df in (('route_otp', 'route_id', route_rows),
+                                            ('stop_otp', 'stop_id', stop_rows)):
+                    if len(df):
+                        written[table_name] = upsert_otp(cursor, table_name, key, df)
+            finally:
+                cursor.close()
+        self._reset_counters()
+        return written
+
+
+def upsert_otp(cursor, table_name, key, df):
+    """Add df's counts onto table_name through a temp staging table."""
+    staging = f"{table_name}_incoming"
+    cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table_name})")
+    copy_dataframe(cursor, df, staging)
+    updates = ", ".join(f"{col} = {table_name}.{col} + EXCLUDED.{col}" for col in OTP_COLUMNS)
+    cursor.execute(f"""
+        INSERT INTO {table_name}
+        SELECT * FROM {staging}
+        ON CONFLICT (service_date, {key}, hour) DO UPDATE SET {updates}
+    """)
+    cursor.execute(f"DROP TABLE {staging}")
+    return len(df)
+
+
+def load_schedule(engine=None, cache_dir=feed_cache.default_cache_dir):
+    """ScheduleArrays from the Parquet feed cache when present, else the database."""
+    if feed_cache.cache_available(cache_dir):
+        df = feed_cache.load_stop_times(
+            columns=['trip_id', 'route_id', 'stop_id', 'stop_sequence', 'arrival_sec', 'departure_sec'],
+            cache_dir=cache_dir,
+        )
+        df['arrival_sec'] = df['arrival_sec'].fillna(df['departure_sec'])
+        return ScheduleArrays(df)
+    return ScheduleArrays(pd.read_sql(SCHEDULE_QUERY, engine or get_engine()))
+
+
+def follow_trip_updates(engine, delay_engine, poll_interval=POLL_INTERVAL, flush_interval=FLUSH_INTERVAL,
+                        batch_limit=200_000, lookback=timedelta(hours=2)):
+    """
+    Tail trip_updates by id, feed new rows to delay_engine, flush every
+    flush_interval seconds. Runs until interrupted.
+    """
+    last_id = 0
+    since = datetime.utcnow() - lookback
+    last_flush = time.perf_counter()
+    while True:
+        batch = pd.read_sql(text(TRIP_UPDATES_QUERY), engine,
+                            params={'since': since, 'last_id': last_id, 'limit': batch_limit})
+        if len(batch):
+            last_id = int(batch['id'].max())
+            # Only partitions from the last report onward are scanned next time
+            since = min(pd.Timestamp(batch['timestamp'].max()).to_pydatetime(),
+                        datetime.utcnow()) - lookback
+            delay_engine.ingest(batch)
+
+        if time.perf_counter() - last_flush >= flush_interval:
+            counted = delay_engine.observe()
+            written = delay_engine.flush(engine)
+            last_flush = time.perf_counter()
+            print(f"✓ {counted:,} stops observed, " +
+                  ", ".join(f"{table}: {rows:,} rows" for table, rows in written.items()))
+
+        if len(batch) < batch_limit:
+            time.sleep(poll_interval)
+
+
+def main():
+    engine = get_engine()
+    print("Loading schedule...", end=" ")
+    schedule = load_schedule(engine)
+    print(f"✓ {len(schedule):,} scheduled stops")
+
+    print(f"Following trip_updates (flush every {FLUSH_INTERVAL:.0f}s)...")
+    delay_engine = DelayEngine(schedule)
+    try:
+        follow_trip_updates(engine, delay_engine)
+    except KeyboardInterrupt:
+        delay_engine.observe()
+        delay_engine.flush(engine)
+
+
+if __name__ == "__main__":
+    main()
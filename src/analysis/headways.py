@@ -0,0 +1,220 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.database.connection import get_engine
+from src.etl import feed_cache
+from src.etl.service_calendar import day_type_labels, load_service_calendar
+
+project_root = Path(__file__).parent.parent.parent
+features_dir = project_root / 'data' / 'features'
+
+# [start_hour, end_hour) of each window; service-day hours run past 24
+TIME_WINDOWS = {
+    'early': (4, 7),
+    'am_peak': (7, 9),
+    'midday': (9, 15),
+    'pm_peak': (15, 18),
+    'evening': (18, 22),
+    'night': (22, 30),
+}
+
+# A scheduled gap shorter than this share of its group's median headway means
+# two buses are timetabled to run nearly together
+BUNCHING_RATIO = 0.25
+
+STOP_TIMES_QUERY = """
+SELECT
+    st.trip_id,
+    t.route_id,
+    t.direction_id,
+    t.service_id,
+    st.stop_id,
+    st.stop_sequence,
+    EXTRACT(EPOCH FROM st.departure_time)::integer AS departure_sec
+FROM stop_times st
+JOIN trips t ON st.trip_id = t.trip_id
+WHERE st.departure_time IS NOT NULL;
+"""
+
+
+def representative_dates(service_calendar):
+    """
+    One date per day type (Weekday, Saturday, Sunday): the date whose trip
+    count is closest to that type's median, so holidays aren't picked.
+    """
+    daily = service_calendar.daily_counts()
+    daily = daily[daily['num_trips'] > 0]
+    dates = {}
+    for label, group in daily.groupby(day_type_labels(daily['date'])):
+        distance = (group['num_trips'] - group['num_trips'].median()).abs()
+        dates[label] = group.loc[distance.idxmin(), 'date'].date()
+    return dates
+
+
+def window_labels(departure_sec):
+    hours = np.asarray(departure_sec) // 3600
+    labels = np.full(len(hours), None, dtype=object)
+    for name, (start_hour, end_hour) in TIME_WINDOWS.items():
+        labels[(hours >= start_hour) & (hours < end_hour)] = name
+    return labels
+
+
+def departure_gaps(departures, group_columns):
+    """
+    Consecutive departure gaps within each group.
+
+    One lexsort orders all departures by group then time; a gap is the
+    difference to the previous row when both rows share the group. Each
+    gap is attributed to the window of the later departure.
+    """
+    codes = [pd.factorize(departures[col])[0] for col in group_columns]
+    departure_sec = departures['departure_sec'].to_numpy(dtype=np.int64)
+    order = np.lexsort([departure_sec] + codes[::-1])
+
+    sorted_codes = [c[order] for c in codes]
+    same_group = np.ones(len(order) - 1, dtype=bool) if len(order) else np.array([], dtype=bool)
+    for c in sorted_codes:
+        same_group &= c[1:] == c[:-1]
+
+    later = order[1:][same_group]
+    earlier = order[:-1][same_group]
+    gaps = departures.iloc[later][group_columns].reset_index(drop=True)
+    gaps['departure_sec'] = departure_sec[later]
+    gaps['previous_departure_sec'] = departure_sec[earlier]
+    gaps['gap_sec'] = departure_sec[later] - departure_sec[earlier]
+    gaps['window'] = window_labels(departure_sec[later])
+    return gaps[gaps['window'].notna()].reset_index(drop=True)
+
+
+def summarize_gaps(gaps, group_columns):
+    """Headway distribution per group and window, with scheduled bunching."""
+    keys = group_columns + ['window']
+    grouped = gaps.groupby(keys, observed=True, sort=False)['gap_sec']
+    summary = grouped.agg(['size', 'median', 'max']).rename(
+        columns={'size': 'num_gaps', 'median': 'median_headway_sec', 'max': 'max_gap_sec'})
+    summary['p90_headway_sec'] = grouped.quantile(0.9)
+
+    median = grouped.transform('median')
+    bunched = gaps['gap_sec'] < BUNCHING_RATIO * median
+    summary['bunched_gaps'] = bunched.groupby([gaps[k] for k in keys], observed=True, sort=False).sum()
+    summary['bunched_share'] = (summary['bunched_gaps'] / summary['num_gaps']).round(3)
+    # Duplicate departures at the same second can make the median gap 0;
+    # those stay in as bunching but give no frequency (NaN, not inf)
+    summary['trips_per_hour'] = (3600 / summary['median_headway_sec'].replace(0, np.nan)).round(2)
+    return summary.reset_index(), gaps[bunched].reset_index(drop=True)
+
+
+def load_departures(service_date, service_calendar, feed_departures=None,
+                    cache_dir=feed_cache.default_cache_dir):
+    """
+    All departures of the trips running on service_date, with route and
+    direction: from the feed cache (only the active service_id partitions),
+    or filtered out of feed_departures (STOP_TIMES_QUERY, read once).
+    """
+    service_ids = [str(s) for s in service_calendar.active_services(service_date)]
+    if feed_departures is None:
+        departures = feed_cache.load_stop_times(
+            service_ids,
+            columns=['trip_id', 'route_id', 'stop_id', 'stop_sequence', 'departure_sec'],
+            cache_dir=cache_dir,
+        )
+        trips = feed_cache.load_table('trips', columns=['trip_id', 'direction_id'], cache_dir=cache_dir)
+        departures = departures.merge(trips, on='trip_id', how='left')
+    else:
+        departures = feed_departures[feed_departures['service_id'].astype(str).isin(service_ids)]
+    departures = departures[departures['departure_sec'].notna()].copy()
+    departures['direction_id'] = departures['direction_id'].fillna(0).astype(int)
+    for col in ('trip_id', 'route_id', 'stop_id'):
+        departures[col] = departures[col].astype('string')
+    return departures.reset_index(drop=True)
+
+
+def first_stop_departures(departures):
+    """The departure of each trip from its first stop."""
+    order = np.lexsort((departures['stop_sequence'].to_numpy(), pd.factorize(departures['trip_id'])[0]))
+    trip_codes = pd.factorize(departures['trip_id'])[0][order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = trip_codes[1:] != trip_codes[:-1]
+    return departures.iloc[order[first]].reset_index(drop=True)
+
+
+def compute_headways(service_dates=None, engine=None, cache_dir=feed_cache.default_cache_dir):
+    """
+    Headways per route/direction (from first-stop departures) and per
+    route/direction/stop, for each service day.
+
+    service_dates maps a label to a date; by default one representative
+    Weekday, Saturday and Sunday. Returns (route_headways, stop_headways,
+    bunching) DataFrames, each with a day_type column.
+    """
+    engine = engine or get_engine()
+    service_calendar = load_service_calendar(engine, cache_dir)
+    if service_dates is None:
+        service_dates = representative_dates(service_calendar)
+    feed_departures = None
+    if not feed_cache.cache_available(cache_dir):
+        feed_departures = pd.read_sql(STOP_TIMES_QUERY, engine)
+
+    route_frames, stop_frames, bunching_frames = [], [], []
+    for label, service_date in service_dates.items():
+        departures = load_departures(service_date, service_calendar, feed_departures, cache_dir)
+
+        route_gaps = departure_gaps(first_stop_departures(departures), ['route_id', 'direction_id'])
+        route_summary, bunched = summarize_gaps(route_gaps, ['route_id', 'direction_id'])
+        stop_summary, _ = summarize_gaps(
+            departure_gaps(departures, ['route_id', 'direction_id', 'stop_id']),
+            ['route_id', 'direction_id', 'stop_id']
+        )
+
+        for frame, frames in ((route_summary, route_frames), (stop_summary, stop_frames),
+                              (bunched, bunching_frames)):
+            frame.insert(0, 'service_date', service_date)
+            frame.insert(0, 'day_type', label)
+            frames.append(frame)
+
+    return (
+        pd.concat(route_frames, ignore_index=True),
+        pd.concat(stop_frames, ignore_index=True),
+        pd.concat(bunching_frames, ignore_index=True),
+    )
+
+
+def save_headways(route_headways, stop_headways, bunching, output_dir=features_dir):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, df in (('route_headways', route_headways), ('stop_headways', stop_headways),
+                     ('schedule_bunching', bunching)):
+        path = output_dir / f"{name}.parquet"
+        df.to_parquet(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def main():
+    start = time.perf_counter()
+    route_headways, stop_headways, bunching = compute_headways()
+    seconds = time.perf_counter() - start
+    print(f"✓ Computed {len(route_headways):,} route and {len(stop_headways):,} stop headway rows "
+          f"in {seconds:.1f}s")
+
+    for path in save_headways(route_headways, stop_headways, bunching):
+        print(f"✓ Saved: {path}")
+    print()
+
+    weekday_peak = route_headways[(route_headways['day_type'] == 'Weekday')
+                                  & (route_headways['window'] == 'am_peak')]
+    print("Most frequent routes, weekday AM peak (median headway, minutes):")
+    top = weekday_peak.nsmallest(10, 'median_headway_sec')
+    print((top.assign(median_min=top['median_headway_sec'] / 60)
+           [['route_id', 'direction_id', 'median_min', 'trips_per_hour', 'bunched_gaps']])
+          .to_string(index=False))
+    print()
+    print(f"Scheduled bunching: {len(bunching):,} first-stop gaps under "
+          f"{BUNCHING_RATIO:.0%} of the median headway")
+
+
+if __name__ == "__main__":
+    main()
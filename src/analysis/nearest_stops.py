@@ -0,0 +1,132 @@
+import math
+
+import pandas as pd
+from sqlalchemy import text
+
+METERS_PER_DEGREE = 111320
+
+# The <-> operator orders by planar distance in degrees, which at Halifax's
+# latitude overweights east-west offsets. Fetch a few extra candidates from the
+# index and re-rank them by true geography distance.
+CANDIDATE_PADDING = 8
+
+NEAREST_STOPS_QUERY = """
+SELECT
+    s.stop_id,
+    n.stop_id AS neighbor_stop_id,
+    n.stop_name AS neighbor_stop_name,
+    n.neighbor_rank,
+    n.distance_m
+FROM stops s
+CROSS JOIN LATERAL (
+    SELECT
+        c.stop_id,
+        c.stop_name,
+        ROW_NUMBER() OVER (ORDER BY c.distance_m) AS neighbor_rank,
+        c.distance_m
+    FROM (
+        SELECT
+            s2.stop_id,
+            s2.stop_name,
+            ST_Distance(s.geom::geography, s2.geom::geography) AS distance_m
+        FROM stops s2
+        WHERE s2.stop_id <> s.stop_id AND s2.geom IS NOT NULL
+        ORDER BY s.geom <-> s2.geom
+        LIMIT :candidates
+    ) c
+    ORDER BY c.distance_m
+    LIMIT :k
+) n
+WHERE s.geom IS NOT NULL
+ORDER BY s.stop_id, n.neighbor_rank;
+"""
+
+
+def nearest_stops(engine, k=1):
+    """
+    The k nearest stops to every stop, with distances in meters.
+
+    Each stop runs one index-assisted KNN lookup on idx_stops_geom (the
+    <-> operator in a LATERAL join), so the cost is about n·log(n) rather
+    than the n² of comparing every pair of stops.
+
+    Returns a DataFrame with stop_id, neighbor_stop_id, neighbor_stop_name,
+    neighbor_rank (1 = nearest) and distance_m.
+    """
+    return pd.read_sql(
+        text(NEAREST_STOPS_QUERY),
+        engine,
+        params={'k': k, 'candidates': k + CANDIDATE_PADDING}
+    )
+
+
+def isolated_stops(engine, threshold_m=500):
+    """
+    Stops whose nearest other stop is more than threshold_m meters away.
+
+    Same columns as the original isolation query: stop_name, stop_lat,
+    stop_lon, nearest_stop_meters, most isolated first.
+    """
+    query = f"""
+    WITH nearest AS (
+        {NEAREST_STOPS_QUERY.rstrip().rstrip(';')}
+    )
+    SELECT
+        s.stop_name,
+        s.stop_lat,
+        s.stop_lon,
+        ROUND(n.distance_m::numeric, 0) AS nearest_stop_meters
+    FROM nearest n
+    JOIN stops s ON s.stop_id = n.stop_id
+    WHERE n.distance_m > :threshold
+    ORDER BY n.distance_m DESC;
+    """
+    return pd.read_sql(
+        text(query),
+        engine,
+        params={'k': 1, 'candidates': 1 + CANDIDATE_PADDING, 'threshold': threshold_m}
+    )
+
+
+def stops_within(engine, lat, lon, radius_m):
+    """
+    Stops within radius_m meters of a point, nearest first.
+
+    A bounding box in degrees (&&, served by idx_stops_geom) narrows the
+    candidates before the exact geography distance check.
+    """
+    lon_degrees = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    query = """
+    WITH point AS (
+        SELECT ST_SetSRID(ST_MakePoint(:lon, :lat), 4326) AS geom
+    )
+    SELECT
+        s.stop_id,
+        s.stop_name,
+        s.stop_lat,
+        s.stop_lon,
+        ST_Distance(s.geom::geography, p.geom::geography) AS distance_m
+    FROM stops s, point p
+    WHERE s.geom && ST_Expand(p.geom, :degrees)
+      AND ST_DWithin(s.geom::geography, p.geom::geography, :radius)
+    ORDER BY distance_m;
+    """
+    return pd.read_sql(
+        text(query),
+        engine,
+        params={'lat': lat, 'lon': lon, 'degrees': lon_degrees, 'radius': radius_m}
+    )
+
+
+def coverage_by_radius(neighbors, radii=(250, 400, 500, 800)):
+    """
+    Count stops whose nearest neighbour is farther than each radius.
+
+    Takes the output of nearest_stops, so thresholds can be compared without
+    querying the database again.
+    """
+    nearest = neighbors[neighbors['neighbor_rank'] == 1]
+    return pd.DataFrame({
+        'radius_m': list(radii),
+        'stops_beyond_radius': [int((nearest['distance_m'] > r).sum()) for r in radii],
+    })
@@ -0,0 +1,355 @@
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.analysis.headways import representative_dates
+from src.analysis.nearest_stops import nearest_stops
+from src.database.connection import get_engine
+from src.etl import feed_cache
+from src.etl.service_calendar import load_service_calendar
+from src.utils.gtfs_time import seconds_to_gtfs_time
+
+project_root = Path(__file__).parent.parent.parent
+output_dir = project_root / 'data' / 'processed'
+
+INF = np.iinfo(np.int32).max
+
+MAX_ROUNDS = 6            # up to 5 transfers
+WALK_SPEED = 1.3          # m/s
+MAX_WALK_M = 400          # longest transfer walk between two stops
+FOOTPATH_NEIGHBORS = 10   # candidates per stop from the KNN index
+
+ISOCHRONE_MINUTES = [15, 30, 45, 60]
+
+SCHEDULE_QUERY = """
+SELECT
+    st.trip_id,
+    st.stop_id,
+    st.stop_sequence,
+    EXTRACT(EPOCH FROM st.arrival_time)::integer AS arrival_sec,
+    EXTRACT(EPOCH FROM st.departure_time)::integer AS departure_sec
+FROM stop_times st
+JOIN trips t ON st.trip_id = t.trip_id
+WHERE t.service_id = ANY(:service_ids);
+"""
+
+
+class Timetable:
+    """
+    One service day's timetable in the array layout RAPTOR works on.
+
+    Trips with the same stop sequence form a pattern. Each pattern keeps its
+    stops (stop codes) and two (trips x stops) int32 matrices of arrival and
+    departure seconds, trips ordered by first departure. stop_patterns is a
+    CSR index (stop -> patterns serving it); footpaths are a CSR index of
+    (neighbor stop, walking seconds).
+
+    Trips within a pattern are assumed not to overtake each other, so the
+    earliest trip boarded is also the earliest to arrive further along.
+    """
+
+    def __init__(self, stop_ids, pattern_stops, arrivals, departures, footpaths=None):
+        self.stop_ids = pd.Index(stop_ids, dtype='string')
+        self.num_stops = len(self.stop_ids)
+        self.pattern_stops = pattern_stops
+        self.arrivals = arrivals
+        self.departures = departures
+
+        pattern_of = np.concatenate([np.full(len(s), p, dtype=np.int32) for p, s in enumerate(pattern_stops)]) \
+            if pattern_stops else np.array([], dtype=np.int32)
+        stops_flat = np.concatenate(pattern_stops) if pattern_stops else np.array([], dtype=np.int32)
+        order = np.argsort(stops_flat, kind='stable')
+        self.stop_patterns = pattern_of[order]
+        self.stop_pattern_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(stops_flat, minlength=self.num_stops))]
+        )
+
+        self.foot_targets = np.array([], dtype=np.int32)
+        self.foot_seconds = np.array([], dtype=np.int32)
+        self.foot_offsets = np.zeros(self.num_stops + 1, dtype=np.int64)
+        if footpaths is not None and len(footpaths):
+            self._index_footpaths(footpaths)
+
+    def _index_footpaths(self, footpaths):
+        source = self.stop_ids.get_indexer(footpaths['stop_id'].astype('string'))
+        target = self.stop_ids.get_indexer(footpaths['neighbor_stop_id'].astype('string'))
+        seconds = np.ceil(footpaths['distance_m'].to_numpy(dtype=float) / WALK_SPEED).astype(np.int32)
+        known = (source >= 0) & (target >= 0)
+
+        # Walking works both ways; keep the shortest per pair
+        pairs = pd.DataFrame({
+            'source': np.concatenate([source[known], target[known]]),
+            'target': np.concatenate([target[known], source[known]]),
+            'seconds': np.concatenate([seconds[known], seconds[known]]),
+        }).groupby(['source', 'target'], as_index=False)['seconds'].min()
+
+        self.foot_targets = pairs['target'].to_numpy(dtype=np.int32)
+        self.foot_seconds = pairs['seconds'].to_numpy(dtype=np.int32)
+        self.foot_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(pairs['source'], minlength=self.num_stops))]
+        )
+
+    @classmethod
+    def from_stop_times(cls, stop_times, stop_ids=None, footpaths=None):
+        """
+        Build from stop_times rows (trip_id, stop_id, stop_sequence,
+        arrival_sec, departure_sec) of the trips running that day.
+
+        Blank intermediate times (non-timepoints) are interpolated by position
+        between the trip's neighbouring timed stops.
+        """
+        df = stop_times.sort_values(['trip_id', 'stop_sequence'], kind='stable').reset_index(drop=True)
+        df['arrival_sec'] = df['arrival_sec'].astype('Float64').fillna(df['departure_sec'].astype('Float64'))
+        df['departure_sec'] = df['departure_sec'].astype('Float64').fillna(df['arrival_sec'])
+        # Interpolate the whole frame at once, then drop the values that came
+        # from another trip: only rows with a timed stop before and after
+        # them in their own trip were interpolated within it
+        timed = df['arrival_sec'].notna()
+        before = timed.groupby(df['trip_id']).cumsum() > 0
+        after = timed[::-1].groupby(df['trip_id'][::-1]).cumsum()[::-1] > 0
+        inside = timed | (before & after)
+        for col in ('arrival_sec', 'departure_sec'):
+            df[col] = df[col].astype(float).interpolate(limit_area='inside').where(inside)
+        df = df[df['arrival_sec'].notna() & df['departure_sec'].notna()]
+
+        if stop_ids is None:
+            stop_ids = df['stop_id'].astype('string').unique()
+        stop_index = pd.Index(stop_ids, dtype='string')
+        stop_index = stop_index.append(pd.Index(df['stop_id'].astype('string')).difference(stop_index))
+        stop_codes = stop_index.get_indexer(df['stop_id'].astype('string'))
+        trip_codes, _ = pd.factorize(df['trip_id'].astype('string'))
+        arrival = df['arrival_sec'].to_numpy().round().astype(np.int32)
+        departure = df['departure_sec'].to_numpy().round().astype(np.int32)
+
+        boundaries = np.flatnonzero(np.diff(trip_codes)) + 1
+        starts = np.concatenate([[0], boundaries])
+        ends = np.concatenate([boundaries, [len(trip_codes)]])
+
+        # Group trips by their exact stop sequence
+        patterns = {}
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            patterns.setdefault(stop_codes[start:end].tobytes(), []).append(start)
+
+        pattern_stops, arrivals, departures = [], [], []
+        for key, trip_starts in patterns.items():
+            stops = np.frombuffer(key, dtype=stop_codes.dtype).astype(np.int32)
+            rows = np.asarray(trip_starts)[:, None] + np.arange(len(stops))
+            trip_order = np.argsort(departure[rows[:, 0]], kind='stable')
+            pattern_stops.append(stops)
+            arrivals.append(arrival[rows[trip_order]])
+            departures.append(departure[rows[trip_order]])
+
+        return cls(stop_index, pattern_stops, arrivals, departures, footpaths)
+
+    def stop_code(self, stop_id):
+        code = self.stop_ids.get_indexer([str(stop_id)])[0]
+        if code < 0:
+            raise KeyError(f"Unknown stop_id: {stop_id}")
+        return code
+
+    def _walk(self, times, sources):
+        """Relax footpaths out of sources in place; returns the stops improved."""
+        counts = self.foot_offsets[sources + 1] - self.foot_offsets[sources]
+        if counts.sum() == 0:
+            return np.array([], dtype=np.int64)
+        origin = np.repeat(sources, counts)
+        index = np.repeat(self.foot_offsets[sources] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        targets = self.foot_targets[index]
+        candidate = times[origin] + self.foot_seconds[index]
+        before = times[targets].copy()
+        np.minimum.at(times, targets, candidate)
+        return np.unique(targets[times[targets] < before])
+
+    def one_to_all(self, origin, departure_sec, max_rounds=MAX_ROUNDS):
+        """
+        Earliest arrival at every stop leaving origin (stop code) at departure_sec.
+
+        Returns (arrival_sec, trips_used): int64 arrays over stops, INF and -1
+        where a stop can't be reached within max_rounds trips.
+        """
+        best = np.full(self.num_stops, INF, dtype=np.int64)
+        trips_used = np.full(self.num_stops, -1, dtype=np.int8)
+        best[origin] = departure_sec
+        marked = np.union1d([origin], self._walk(best, np.array([origin])))
+        trips_used[marked] = 0
+
+        for round_number in range(1, max_rounds + 1):
+            if len(marked) == 0:
+                break
+            counts = self.stop_pattern_offsets[marked + 1] - self.stop_pattern_offsets[marked]
+            index = np.repeat(self.stop_pattern_offsets[marked] - np.cumsum(counts) + counts, counts) \
+                + np.arange(counts.sum())
+            patterns = np.unique(self.stop_patterns[index])
+
+            reached = np.full(self.num_stops, INF, dtype=np.int64)
+            for p in patterns:
+                stops = self.pattern_stops[p]
+                departures = self.departures[p]
+                n_trips = len(departures)
+
+                # Earliest trip catchable at each stop, then the best trip
+                # on board at each stop from boardings further upstream
+                can_board = departures >= best[stops]
+                board = np.where(can_board.any(axis=0), can_board.argmax(axis=0), n_trips)
+                on_board = np.empty(len(stops), dtype=np.int64)
+                on_board[0] = n_trips
+                on_board[1:] = np.minimum.accumulate(board)[:-1]
+
+                riding = np.flatnonzero(on_board < n_trips)
+                if len(riding):
+                    np.minimum.at(reached, stops[riding], self.arrivals[p][on_board[riding], riding])
+
+            improved = np.flatnonzero(reached < best)
+            best[improved] = reached[improved]
+            trips_used[improved] = round_number
+
+            walked = self._walk(best, improved)
+            trips_used[walked] = round_number
+            marked = np.union1d(improved, walked)
+
+        return best, trips_used
+
+    def earliest_arrival(self, origin_id, target_id, departure_sec, max_rounds=MAX_ROUNDS):
+        """Earliest arrival at target_id leaving origin_id at departure_sec, or None if unreachable."""
+        arrival, trips_used = self.one_to_all(self.stop_code(origin_id), departure_sec, max_rounds)
+        target = self.stop_code(target_id)
+        if arrival[target] >= INF:
+            return None
+        return {
+            'arrival_sec': int(arrival[target]),
+            'arrival_time': seconds_to_gtfs_time([arrival[target]])[0],
+            'travel_sec': int(arrival[target] - departure_sec),
+            'trips': int(trips_used[target]),
+        }
+
+    def isochrone(self, origin_id, departure_sec, minutes=ISOCHRONE_MINUTES):
+        """Reachable stops with travel time and the smallest isochrone band they fall in."""
+        arrival, trips_used = self.one_to_all(self.stop_code(origin_id), departure_sec)
+        reachable = np.flatnonzero(arrival < INF)
+        travel_min = (arrival[reachable] - departure_sec) / 60
+        band = pd.cut(travel_min, bins=[-1] + list(minutes), labels=minutes)
+        result = pd.DataFrame({
+            'stop_id': self.stop_ids[reachable].to_numpy(),
+            'travel_min': travel_min.round(1),
+            'trips': trips_used[reachable],
+            'isochrone_min': band,
+        })
+        return result[result['isochrone_min'].notna()].sort_values('travel_min').reset_index(drop=True)
+
+
+# Set in each worker process by the pool initializer, so the timetable is
+# pickled once per worker rather than once per origin
+_worker_timetable = None
+
+
+def _init_worker(timetable):
+    global _worker_timetable
+    _worker_timetable = timetable
+
+
+def _travel_times(args):
+    origins, departure_sec, max_rounds = args
+    rows = np.full((len(origins), _worker_timetable.num_stops), -1, dtype=np.int32)
+    for i, origin in enumerate(origins):
+        arrival, _ = _worker_timetable.one_to_all(origin, departure_sec, max_rounds)
+        reachable = arrival < INF
+        rows[i, reachable] = arrival[reachable] - departure_sec
+    return rows
+
+
+def accessibility_matrix(timetable, departure_sec, origins=None, max_rounds=MAX_ROUNDS,
+                         max_workers=None, batch_size=32):
+    """
+    Travel seconds from every origin (default: all stops) to every stop,
+    -1 where unreachable. One-to-all runs are spread over a process pool in
+    batches of origins.
+
+    Returns an int32 (origins x stops) matrix.
+    """
+    if origins is None:
+        origins = np.arange(timetable.num_stops)
+    origins = np.asarray(origins)
+    batches = [(origins[i:i + batch_size], departure_sec, max_rounds)
+               for i in range(0, len(origins), batch_size)]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(timetable,)) as pool:
+        return np.vstack(list(pool.map(_travel_times, batches)))
+
+
+def load_footpaths(engine, max_walk_m=MAX_WALK_M, k=FOOTPATH_NEIGHBORS):
+    """Stop pairs within walking distance, from the stops KNN index."""
+    neighbors = nearest_stops(engine, k=k)
+    return neighbors[neighbors['distance_m'] <= max_walk_m][['stop_id', 'neighbor_stop_id', 'distance_m']]
+
+
+def load_timetable(service_date=None, engine=None, cache_dir=feed_cache.default_cache_dir):
+    """
+    Timetable of the trips running on service_date (default today), read from
+    the Parquet feed cache when present (only the active service_id
+    partitions), else from the database.
+    """
+    engine = engine or get_engine()
+    service_date = service_date or date.today()
+    service_calendar = load_service_calendar(engine, cache_dir)
+    service_ids = [str(s) for s in service_calendar.active_services(service_date)]
+
+    if feed_cache.cache_available(cache_dir):
+        stop_times = feed_cache.load_stop_times(
+            service_ids,
+            columns=['trip_id', 'stop_id', 'stop_sequence', 'arrival_sec', 'departure_sec'],
+            cache_dir=cache_dir,
+        )
+        stop_ids = feed_cache.load_table('stops', columns=['stop_id'], cache_dir=cache_dir)['stop_id']
+    else:
+        stop_times = pd.read_sql(text(SCHEDULE_QUERY), engine, params={'service_ids': service_ids})
+        stop_ids = pd.read_sql("SELECT stop_id FROM stops;", engine)['stop_id']
+
+    return Timetable.from_stop_times(stop_times, stop_ids.astype('string'), load_footpaths(engine))
+
+
+def default_service_date(engine=None, cache_dir=feed_cache.default_cache_dir):
+    """Today when the feed runs service today, else its representative weekday."""
+    service_calendar = load_service_calendar(engine or get_engine(), cache_dir)
+    today = date.today()
+    if len(service_calendar.active_services(today)):
+        return today
+    dates = representative_dates(service_calendar)
+    return dates.get('Weekday') or next(iter(dates.values()), today)
+
+
+def main(service_date=None):
+    departure_sec = 8 * 3600
+    if service_date is None and len(sys.argv) > 1:
+        service_date = date.fromisoformat(sys.argv[1])
+    service_date = service_date or default_service_date()
+    print(f"Building timetable for {service_date}...", end=" ")
+    start = time.perf_counter()
+    timetable = load_timetable(service_date)
+    print(f"✓ {timetable.num_stops:,} stops, {len(timetable.pattern_stops):,} patterns "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    print("Computing accessibility matrix (all stops, 08:00 departure)...")
+    start = time.perf_counter()
+    matrix = accessibility_matrix(timetable, departure_sec)
+    seconds = time.perf_counter() - start
+    print(f"✓ {matrix.shape[0]:,} origins in {seconds:.1f}s ({matrix.shape[0] / seconds:.1f} origins/sec)")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"accessibility_{service_date:%Y%m%d}_0800.npz"
+    np.savez_compressed(path, travel_sec=matrix, stop_ids=timetable.stop_ids.to_numpy(dtype=str))
+    print(f"✓ Saved: {path}")
+
+    within = (matrix >= 0) & (matrix <= 45 * 60)
+    print(f"Median stops reachable within 45 min: {int(np.median(within.sum(axis=1))):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Callable
+
+import matplotlib
+import pandas as pd
+import seaborn as sns
+
+from src.analysis.nearest_stops import isolated_stops
+from src.analysis.route_analysis import (
+    load_route_frequency, load_stop_distribution, plot_route_frequency, plot_stop_distribution,
+)
+from src.analysis.spatial_analysis import ISOLATION_THRESHOLD_M, plot_stop_isolation
+from src.analysis.temporal_analysis import (
+    load_day_type_trips, load_hourly_departures, load_route_peaks, output_dir,
+    plot_day_type, plot_hourly_service, plot_peak_hours,
+)
+from src.analysis.temporal_engine import load_temporal_aggregates
+from src.database.connection import get_engine
+from src.etl import feed_cache
+
+MANIFEST_NAME = 'report_manifest.json'
+
+# Charts render at dpi=300, so each one is CPU-bound for a second or more;
+# they are independent, one process per chart
+RENDER_WORKERS = min(6, os.cpu_count() or 1)
+
+
+class ReportInputs:
+    """
+    What the chart queries read from: the engine, the feed cache and the
+    one-pass stop_times aggregates, loaded on first use and shared by every
+    task that needs them.
+    """
+
+    def __init__(self, engine=None, cache_dir=feed_cache.default_cache_dir):
+        self.engine = engine or get_engine()
+        self.cache_dir = cache_dir
+
+    @cached_property
+    def aggregates(self):
+        return load_temporal_aggregates(self.engine, self.cache_dir)
+
+
+@dataclass(frozen=True)
+class ChartTask:
+    """One PNG under outputs/analysis: its query and its plot function."""
+    name: str
+    load: Callable[[ReportInputs], pd.DataFrame]
+    plot: Callable
+
+
+CHART_TASKS = [
+    ChartTask('route_frequency', lambda inputs: load_route_frequency(inputs.engine), plot_route_frequency),
+    ChartTask('stop_distribution', lambda inputs: load_stop_distribution(inputs.engine), plot_stop_distribution),
+    ChartTask('stop_isolation', lambda inputs: isolated_stops(inputs.engine, threshold_m=ISOLATION_THRESHOLD_M),
+              plot_stop_isolation),
+    ChartTask('hourly_service', lambda inputs: load_hourly_departures(inputs.aggregates), plot_hourly_service),
+    ChartTask('weekday_weekend', lambda inputs: load_day_type_trips(inputs.engine, inputs.cache_dir),
+              plot_day_type),
+    ChartTask('peak_hour_analysis',
+              lambda inputs: load_route_peaks(inputs.aggregates, inputs.engine, cache_dir=inputs.cache_dir),
+              plot_peak_hours),
+]
+
+
+def input_hash(task, df):
+    """
+    Hash of a chart's input rows, column names and plot function source,
+    so a chart is redrawn when its data or its drawing code changes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(inspect.getsource(task.plot).encode())
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def read_manifest(output_dir=output_dir):
+    path = output_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, output_dir=output_dir):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tmp = output_dir / f"{MANIFEST_NAME}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, output_dir / MANIFEST_NAME)
+
+
+def init_render_worker():
+    # Workers never show a window; Agg also avoids a display in forked children
+    matplotlib.use('Agg')
+    sns.set_style("whitegrid")
+
+
+def render_chart(plot, df, output_dir):
+    """Runs in a worker process; returns the render time."""
+    start = time.perf_counter()
+    plot(df, output_dir=output_dir)
+    return time.perf_counter() - start
+
+
+def run_report(tasks=CHART_TASKS, inputs=None, output_dir=output_dir, workers=RENDER_WORKERS, force=False):
+    """
+    Render every chart whose inputs changed since the last run.
+
+    Queries run here, one after another (they share the engine and the
+    temporal aggregates); only charts whose input hash differs from the
+    manifest, or whose PNG is missing, go to the process pool. Returns
+    {name: 'rendered' | 'unchanged' | 'empty'} and the render seconds of
+    the rendered ones.
+    """
+    inputs = inputs or ReportInputs()
+    manifest = read_manifest(output_dir)
+    status, pending = {}, {}
+    for task in tasks:
+        df = task.load(inputs)
+        if df.empty:
+            status[task.name] = 'empty'
+            continue
+        digest = input_hash(task, df)
+        png = output_dir / f"{task.name}.png"
+        if not force and png.exists() and manifest.get(task.name, {}).get('input_hash') == digest:
+            status[task.name] = 'unchanged'
+            continue
+        pending[task.name] = (task, df, digest)
+
+    seconds = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=init_render_worker) as pool:
+            futures = {name: pool.submit(render_chart, task.plot, df, output_dir)
+                       for name, (task, df, _) in pending.items()}
+            for name, future in futures.items():
+                seconds[name] = future.result()
+                status[name] = 'rendered'
+                manifest[name] = {'input_hash': pending[name][2], 'render_seconds': round(seconds[name], 2)}
+        write_manifest(manifest, output_dir)
+    return status, seconds
+
+
+def main():
+    start = time.perf_counter()
+    status, seconds = run_report()
+    print()
+    for task in CHART_TASKS:
+        name, state = task.name, status[task.name]
+        detail = f" in {seconds[name]:.1f}s" if name in seconds else ""
+        print(f"  {name:<20} {state}{detail}")
+    print()
+    rendered = sum(state == 'rendered' for state in status.values())
+    print(f"✓ {rendered} of {len(status)} charts rendered in {time.perf_counter() - start:.1f}s "
+          f"({RENDER_WORKERS} workers)")
+    print(f"All charts saved to: {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
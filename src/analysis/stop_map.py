@@ -0,0 +1,131 @@
+import json
+
+import folium
+import numpy as np
+import pandas as pd
+from folium import plugins
+
+HALIFAX_CENTER = [44.6488, -63.5752]  # Downtown Halifax
+
+# Connectivity classes by number of routes serving the stop:
+# none, 1, 2-3, 4-5, 6+
+CONNECTIVITY_BINS = [-np.inf, 0, 1, 3, 5, np.inf]
+CONNECTIVITY_COLORS = ['gray', 'red', 'orange', 'blue', 'green']
+CONNECTIVITY_ICONS = ['ban', 'stop', 'bus', 'exchange', 'star']
+
+LEGEND_HTML = '''
+<div style="position: fixed;
+     bottom: 50px; right: 50px; width: 200px; height: 180px;
+     background-color: white; border:2px solid grey; z-index:9999;
+     font-size:14px; padding: 10px">
+     <p style="margin-bottom:5px;"><b>Stop Connectivity</b></p>
+     <p style="margin:2px;"><i class="fa fa-star" style="color:green"></i> 6+ routes (Hub)</p>
+     <p style="margin:2px;"><i class="fa fa-exchange" style="color:blue"></i> 4-5 routes</p>
+     <p style="margin:2px;"><i class="fa fa-bus" style="color:orange"></i> 2-3 routes</p>
+     <p style="margin:2px;"><i class="fa fa-stop" style="color:red"></i> 1 route</p>
+     <p style="margin:2px;"><i class="fa fa-ban" style="color:gray"></i> No service</p>
+</div>
+'''
+
+# Runs in the browser once per stop. Icons and popups are built client-side
+# from a compact row: [lat, lon, class, name, stop_id, routes, trips].
+MARKER_CALLBACK = """
+function (row) {
+    var colors = %s;
+    var icons = %s;
+    var icon = L.AwesomeMarkers.icon({
+        icon: icons[row[2]], markerColor: colors[row[2]], prefix: 'fa'
+    });
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindTooltip(row[3]);
+    marker.bindPopup(
+        '<b>' + row[3] + '</b><br>' +
+        'Stop ID: ' + row[4] + '<br>' +
+        'Routes: ' + row[5] + '<br>' +
+        'Daily Trips: ' + row[6],
+        {maxWidth: 300}
+    );
+    return marker;
+};
+""" % (json.dumps(CONNECTIVITY_COLORS), json.dumps(CONNECTIVITY_ICONS))
+
+
+def connectivity_class(routes_serving_stop):
+    """Index into CONNECTIVITY_COLORS/ICONS for each stop (missing counts as no service)."""
+    routes = pd.Series(routes_serving_stop, copy=False).fillna(0).astype(float)
+    return pd.cut(routes, bins=CONNECTIVITY_BINS, labels=False).astype(int)
+
+
+def stop_marker_rows(df_stops):
+    """Compact per-stop rows for MARKER_CALLBACK, built column-wise (no per-row Python objects)."""
+    rows = pd.DataFrame({
+        'lat': df_stops['stop_lat'].astype(float).round(6),
+        'lon': df_stops['stop_lon'].astype(float).round(6),
+        'cls': connectivity_class(df_stops['routes_serving_stop']),
+        'name': df_stops['stop_name'].astype(str),
+        'stop_id': df_stops['stop_id'].astype(str),
+        'routes': df_stops['routes_serving_stop'].fillna(0).astype(int),
+        'trips': df_stops['total_trips'].fillna(0).astype(int),
+    })
+    return rows.values.tolist()
+
+
+def shapes_geojson(shapes):
+    """
+    One GeoJSON FeatureCollection of route shape polylines.
+
+    shapes needs shape_id, shape_pt_lat, shape_pt_lon and shape_pt_sequence;
+    points are ordered with one sort and grouped once.
+    """
+    shapes = shapes.sort_values(['shape_id', 'shape_pt_sequence'])
+    coords = np.column_stack([
+        shapes['shape_pt_lon'].astype(float).round(6).to_numpy(),
+        shapes['shape_pt_lat'].astype(float).round(6).to_numpy(),
+    ])
+    shape_ids = shapes['shape_id'].astype(str).to_numpy()
+    boundaries = np.flatnonzero(shape_ids[1:] != shape_ids[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(shape_ids)]])
+
+    features = [
+        {
+            'type': 'Feature',
+            'properties': {'shape_id': shape_ids[start]},
+            'geometry': {'type': 'LineString', 'coordinates': coords[start:end].tolist()},
+        }
+        for start, end in zip(starts, ends) if end - start > 1
+    ]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def build_stop_map(df_stops, shapes=None):
+    """
+    Folium map of stops coloured by connectivity, with optional route shapes.
+
+    All stops go into one FastMarkerCluster whose markers are created in the
+    browser, so the HTML holds one short array per stop instead of a Marker,
+    Popup and Icon object each, and build time/size stay flat per stop.
+
+    Parameters:
+    - df_stops: stop_id, stop_name, stop_lat, stop_lon, routes_serving_stop, total_trips
+    - shapes: optional shape points (see shapes_geojson) drawn as one GeoJSON layer
+    """
+    m = folium.Map(location=HALIFAX_CENTER, zoom_start=12, tiles='OpenStreetMap')
+
+    if shapes is not None and len(shapes) > 0:
+        folium.GeoJson(
+            shapes_geojson(shapes),
+            name='Route shapes',
+            style_function=lambda feature: {'color': '#3388ff', 'weight': 2, 'opacity': 0.5},
+        ).add_to(m)
+
+    plugins.FastMarkerCluster(
+        data=stop_marker_rows(df_stops),
+        callback=MARKER_CALLBACK,
+        name='Stops',
+    ).add_to(m)
+
+    m.get_root().html.add_child(folium.Element(LEGEND_HTML))
+    if shapes is not None and len(shapes) > 0:
+        folium.LayerControl().add_to(m)
+    return m
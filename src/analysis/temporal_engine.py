@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from src.etl import feed_cache
+
+# Inclusive hour ranges, matching the original BETWEEN 7 AND 9 / 16 AND 18
+DEFAULT_PEAK_WINDOWS = {
+    'morning_peak': (7, 9),
+    'evening_peak': (16, 18),
+}
+
+WEEKDAY_COLUMNS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+DAY_TYPES = ['Weekday', 'Saturday', 'Sunday']
+
+STOP_TIMES_QUERY = """
+SELECT
+    st.trip_id,
+    t.route_id,
+    t.service_id,
+    st.stop_sequence,
+    EXTRACT(EPOCH FROM st.departure_time)::integer AS departure_sec
+FROM stop_times st
+JOIN trips t ON st.trip_id = t.trip_id
+WHERE st.departure_time IS NOT NULL;
+"""
+
+
+class TemporalAggregates:
+    """
+    Departure counts by hour, route and service from one pass over stop_times.
+
+    stop_times is held as integer arrays (seconds since service-day midnight,
+    route/service/trip codes). One bincount builds a route x hour matrix for
+    all departures and one for trip starts (first stop of each trip), plus a
+    service x hour matrix of trip starts. Every report below is a slice or
+    column sum of those small matrices, so a new hour bucket or peak window
+    costs no further pass over the rows.
+
+    Hours are not wrapped: a 25:10:00 departure counts in hour 25, as
+    EXTRACT(HOUR FROM departure_time) does on the INTERVAL column.
+    """
+
+    def __init__(self, trip_codes, route_codes, service_codes, stop_sequence, departure_sec,
+                 route_ids, service_ids):
+        departure_sec = np.asarray(departure_sec, dtype=np.int32)
+        route_codes = np.asarray(route_codes, dtype=np.int32)
+        service_codes = np.asarray(service_codes, dtype=np.int32)
+        trip_codes = np.asarray(trip_codes, dtype=np.int32)
+        stop_sequence = np.asarray(stop_sequence, dtype=np.int32)
+
+        self.route_ids = np.asarray(route_ids, dtype=object)
+        self.service_ids = np.asarray(service_ids, dtype=object)
+        self.num_departures = len(departure_sec)
+
+        hours = departure_sec // 3600
+        self.num_hours = int(hours.max()) + 1 if len(hours) else 24
+        self.num_hours = max(self.num_hours, 24)
+        n_routes = len(self.route_ids)
+        n_services = len(self.service_ids)
+
+        # First stop of each trip: lowest stop_sequence within the trip
+        order = np.lexsort((stop_sequence, trip_codes))
+        sorted_trips = trip_codes[order]
+        is_start = np.ones(len(order), dtype=bool)
+        is_start[1:] = sorted_trips[1:] != sorted_trips[:-1]
+        starts = order[is_start]
+
+        self.route_hour = self._matrix(route_codes, hours, n_routes)
+        self.route_start_hour = self._matrix(route_codes[starts], hours[starts], n_routes)
+        self.service_start_hour = self._matrix(service_codes[starts], hours[starts], n_services)
+
+    def _matrix(self, codes, hours, n_codes):
+        flat = codes.astype(np.int64) * self.num_hours + hours
+        counts = np.bincount(flat, minlength=n_codes * self.num_hours)
+        return counts.reshape(n_codes, self.num_hours)
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Build from a frame with trip_id, route_id, service_id, stop_sequence
+        and departure_sec; rows without a departure time are dropped.
+        """
+        df = df[df['departure_sec'].notna()]
+        route_codes, route_ids = pd.factorize(df['route_id'].astype('string'))
+        service_codes, service_ids = pd.factorize(df['service_id'].astype('string'))
+        trip_codes, _ = pd.factorize(df['trip_id'].astype('string'))
+        return cls(
+            trip_codes, route_codes, service_codes,
+            df['stop_sequence'].fillna(0).to_numpy(dtype=np.int32),
+            df['departure_sec'].to_numpy(dtype=np.int32),
+            route_ids.to_numpy(dtype=object), service_ids.to_numpy(dtype=object),
+        )
+
+    def hourly(self, first_stop_only=False):
+        """Departures per hour of the service day: hour, num_departures."""
+        matrix = self.route_start_hour if first_stop_only else self.route_hour
+        counts = matrix.sum(axis=0)
+        hours = np.flatnonzero(counts)
+        return pd.DataFrame({'hour': hours, 'num_departures': counts[hours]})
+
+    def window_counts(self, windows=DEFAULT_PEAK_WINDOWS, first_stop_only=True):
+        """
+        Departures per route inside each named (start_hour, end_hour) window.
+
+        Windows are inclusive hour ranges; off_peak counts hours outside all
+        windows and total_departures every hour. With first_stop_only (the
+        default) each trip is counted once, at its first stop.
+        """
+        matrix = self.route_start_hour if first_stop_only else self.route_hour
+        in_window = np.zeros(self.num_hours, dtype=bool)
+        result = pd.DataFrame({'route_id': pd.array(self.route_ids, dtype='string')})
+        for name, (start_hour, end_hour) in windows.items():
+            columns = np.zeros(self.num_hours, dtype=bool)
+            columns[start_hour:end_hour + 1] = True
+            in_window |= columns
+            result[f"{name}_trips"] = matrix[:, columns].sum(axis=1)
+        result['off_peak_trips'] = matrix[:, ~in_window].sum(axis=1)
+        result['total_departures'] = matrix.sum(axis=1)
+        return result[result['total_departures'] > 0].reset_index(drop=True)
+
+    def trips_by_service(self):
+        """Number of trips per service_id."""
+        return pd.Series(self.service_start_hour.sum(axis=1), index=self.service_ids, name='num_trips')
+
+    def trips_by_day_type(self, service_day_types):
+        """
+        Trips per day type.
+
+        service_day_types maps service_id -> day type label (see
+        calendar_day_types); services without a label are left out.
+        """
+        trips = self.trips_by_service()
+        labels = pd.Series(self.service_ids, index=self.service_ids).map(service_day_types)
+        counts = trips.groupby(labels.to_numpy()).sum()
+        order = [day for day in DAY_TYPES if day in counts.index]
+        order += [day for day in counts.index if day not in order]
+        return pd.DataFrame({'day_type': order, 'num_trips': counts.loc[order].to_numpy()})
+
+
+def calendar_day_types(calendar):
+    """Classify each service as Weekday, Saturday or Sunday from its calendar flags."""
+    flags = calendar.set_index(calendar['service_id'].astype('string'))
+    weekday = (flags[WEEKDAY_COLUMNS].fillna(0).astype(int) == 1).any(axis=1)
+    saturday = flags['saturday'].fillna(0).astype(int) == 1
+    sunday = flags['sunday'].fillna(0).astype(int) == 1
+    day_type = pd.Series(pd.NA, index=flags.index, dtype='object')
+    day_type[sunday] = 'Sunday'
+    day_type[saturday] = 'Saturday'
+    day_type[weekday] = 'Weekday'
+    return day_type.dropna().to_dict()
+
+
+def load_stop_time_frame(engine=None, cache_dir=feed_cache.default_cache_dir):
+    """
+    The stop_times columns TemporalAggregates needs, in one read.
+
+    Uses the Parquet feed cache when it exists (times already stored as
+    integer seconds), otherwise a single query joining stop_times to trips.
+    """
+    if feed_cache.cache_available(cache_dir):
+        return feed_cache.load_stop_times(
+            columns=['trip_id', 'route_id', 'service_id', 'stop_sequence', 'departure_sec'],
+            cache_dir=cache_dir,
+        )
+    if engine is None:
+        raise ValueError("No feed cache found; pass an engine to read stop_times from the database")
+    return pd.read_sql(STOP_TIMES_QUERY, engine)
+
+
+def load_calendar(engine=None, cache_dir=feed_cache.default_cache_dir):
+    columns = ['service_id'] + WEEKDAY_COLUMNS + ['saturday', 'sunday']
+    if feed_cache.cache_available(cache_dir):
+        return feed_cache.load_table('calendar', columns=columns, cache_dir=cache_dir)
+    return pd.read_sql(f"SELECT {', '.join(columns)} FROM calendar;", engine)
+
+
+def load_temporal_aggregates(engine=None, cache_dir=feed_cache.default_cache_dir):
+    return TemporalAggregates.from_frame(load_stop_time_frame(engine, cache_dir))
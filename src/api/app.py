@@ -0,0 +1,245 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+import asyncpg
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+
+from src.api import queries
+from src.api.cache import ResponseCache
+from src.database.connection import load_config, pool_settings
+from src.models.batch_predict import feature_store_stamp, stop_predictions
+from src.models.delay_model import ModelCache
+from src.utils.gtfs_time import seconds_to_gtfs_time
+
+# How often the feed version is checked; a change empties the response cache.
+# Entries only expire by TTL when cached before the first version is known.
+VERSION_POLL_SECONDS = 10
+CACHE_TTL_SECONDS = 300
+CACHE_MAX_ENTRIES = 4096
+CLIENT_MAX_AGE = 30
+
+MAX_NEAREST = 50
+MAX_DEPARTURES = 100
+
+cache = ResponseCache(max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS)
+# Delay models stay loaded for the life of the process (reloaded after a retrain)
+model_cache = ModelCache()
+_in_flight = {}
+
+
+async def create_pool(config):
+    """asyncpg pool sized like the SQLAlchemy pool (pool: section of database.yml)."""
+    db = config['database']
+    settings = pool_settings(config)
+    server_settings = {'application_name': 'halifax-transit-api'}
+    if settings['statement_timeout_ms']:
+        server_settings['statement_timeout'] = str(int(settings['statement_timeout_ms']))
+    return await asyncpg.create_pool(
+        host=db['host'],
+        port=db['port'],
+        user=db['user'],
+        password=str(db['password']),
+        database=db['database'],
+        min_size=min(2, settings['pool_size']),
+        max_size=settings['pool_size'] + settings['max_overflow'],
+        max_inactive_connection_lifetime=settings['pool_recycle'],
+        server_settings=server_settings,
+    )
+
+
+async def refresh_version(pool):
+    async with pool.acquire() as conn:
+        version = await conn.fetchval(queries.FEED_VERSION)
+    if cache.set_version(version):
+        print(f"Feed version {version!r}: response cache cleared")
+
+
+async def watch_feed_version(pool):
+    while True:
+        await asyncio.sleep(VERSION_POLL_SECONDS)
+        try:
+            await refresh_version(pool)
+        except Exception as e:
+            print(f"✗ Feed version check failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.pool = await create_pool(load_config())
+    await refresh_version(app.state.pool)
+    watcher = asyncio.create_task(watch_feed_version(app.state.pool))
+    try:
+        yield
+    finally:
+        watcher.cancel()
+        await app.state.pool.close()
+
+
+app = FastAPI(title="Halifax Transit Analytics API", lifespan=lifespan)
+
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+async def cached_json(request, produce, key=None):
+    """
+    Serve produce()'s result as JSON through the response cache.
+
+    The body is serialized once per feed version and key (by default the
+    path and query string); concurrent misses for the same key wait on one
+    query. A matching If-None-Match gets a 304.
+    """
+    if key is None:
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    entry = cache.get(key)
+    if entry is None:
+        if key in _in_flight:
+            shared = _in_flight[key]
+            try:
+                entry = await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                # The request producing it was cancelled: produce it here
+                return await cached_json(request, produce, key)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            _in_flight[key] = future
+            version = cache.version
+            try:
+                data = await produce()
+                body = json.dumps(data, default=json_default, separators=(',', ':')).encode()
+                entry = cache.put(key, body, version)
+                future.set_result(entry)
+            except asyncio.CancelledError:
+                # Not an Exception: without this the waiters would hang
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Waiters re-raise it; don't leave it unretrieved
+                future.exception()
+                raise
+            finally:
+                del _in_flight[key]
+
+    headers = {'ETag': entry.etag, 'Cache-Control': f"public, max-age={CLIENT_MAX_AGE}"}
+    if request.headers.get('if-none-match') == entry.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type='application/json', headers=headers)
+
+
+async def fetch_all(query, *args):
+    async with app.state.pool.acquire() as conn:
+        return [dict(row) for row in await conn.fetch(query, *args)]
+
+
+async def fetch_one(query, *args):
+    async with app.state.pool.acquire() as conn:
+        row = await conn.fetchrow(query, *args)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return dict(row)
+
+
+@app.get("/health")
+async def health():
+    return {'status': 'ok', 'cache': cache.stats()}
+
+
+@app.get("/stats/network")
+async def network_stats(request: Request):
+    return await cached_json(request, lambda: fetch_one(queries.NETWORK_STATS))
+
+
+@app.get("/routes")
+async def route_summaries(request: Request, limit: int = Query(100, ge=1, le=500), offset: int = Query(0, ge=0)):
+    return await cached_json(request, lambda: fetch_all(queries.ROUTE_SUMMARIES, limit, offset))
+
+
+@app.get("/routes/{route_id}")
+async def route_summary(request: Request, route_id: str):
+    return await cached_json(request, lambda: fetch_one(queries.ROUTE_SUMMARY, route_id))
+
+
+@app.get("/routes/{route_id}/hourly")
+async def route_hourly_service(request: Request, route_id: str):
+    return await cached_json(request, lambda: fetch_all(queries.HOURLY_SERVICE_FOR_ROUTE, route_id))
+
+
+@app.get("/stops/nearest")
+async def nearest_stops(request: Request, lat: float = Query(..., ge=-90, le=90),
+                        lon: float = Query(..., ge=-180, le=180), k: int = Query(5, ge=1, le=MAX_NEAREST)):
+    # Rounded to ~1 m so nearby clicks share cache entries
+    lat, lon = round(lat, 5), round(lon, 5)
+    return await cached_json(request, lambda: fetch_all(queries.NEAREST_STOPS, lat, lon, k),
+                             key=('nearest', lat, lon, k))
+
+
+@app.get("/stops/{stop_id}")
+async def stop_connectivity(request: Request, stop_id: str):
+    return await cached_json(request, lambda: fetch_one(queries.STOP_CONNECTIVITY, stop_id))
+
+
+@app.get("/stops/{stop_id}/departures")
+async def departures(request: Request, stop_id: str, service_date: date = Query(None, alias='date'),
+                     after: str = Query("00:00:00", pattern=r"^\d{1,2}:\d{2}:\d{2}$"),
+                     limit: int = Query(20, ge=1, le=MAX_DEPARTURES)):
+    service_date = service_date or date.today()
+    hours, minutes, seconds = (int(part) for part in after.split(':'))
+    after_sec = hours * 3600 + minutes * 60 + seconds
+
+    async def produce():
+        rows = await fetch_all(queries.DEPARTURES, stop_id, service_date, float(after_sec), limit)
+        times = seconds_to_gtfs_time([row.pop('departure_sec') for row in rows])
+        for row, departure_time in zip(rows, times):
+            row['departure_time'] = departure_time
+        return {'stop_id': stop_id, 'date': service_date, 'departures': rows}
+
+    return await cached_json(request, produce, key=(request.url.path, service_date, after_sec, limit))
+
+
+@app.get("/stops/{stop_id}/predicted_delays")
+async def predicted_delays(request: Request, stop_id: str, service_date: date = Query(None, alias='date')):
+    """
+    Predicted delay per route and hour at a stop. The models are trained on
+    stop-level real-time data, so each value is the expected mean delay of
+    all departures at the stop in that hour, as seen from the route's group.
+    """
+    service_date = service_date or date.today()
+
+    # Two stats per request, in a worker thread like the scoring; the models
+    # are only re-read after a retrain. Predictions also change when the
+    # feature store is rebuilt, which the feed version doesn't track.
+    (models, model_version), store_version = await asyncio.to_thread(
+        lambda: (model_cache.current(), feature_store_stamp()))
+
+    async def produce():
+        # Scoring is CPU work on pandas/NumPy: keep it off the event loop
+        predictions = await asyncio.to_thread(stop_predictions, stop_id, service_date, models)
+        return {'stop_id': stop_id, 'date': service_date, 'model_version': model_version,
+                'delay_level': 'stop', 'predictions': predictions}
+
+    return await cached_json(request, produce, key=(request.url.path, service_date, model_version, store_version))
+
+
+@app.get("/service/hourly")
+async def hourly_service(request: Request):
+    return await cached_json(request, lambda: fetch_all(queries.HOURLY_SERVICE))
+
+
+def main():
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """A serialized response body with its ETag."""
+
+    __slots__ = ('body', 'etag', 'version', 'created')
+
+    def __init__(self, body, version):
+        self.body = body
+        self.version = version
+        self.etag = '"' + hashlib.blake2b((version or '').encode() + b'\0' + body, digest_size=12).hexdigest() + '"'
+        self.created = time.monotonic()
+
+    def expired(self, ttl_seconds):
+        # Entries of a known feed version live until set_version() clears
+        # them (the loader writes it only once the summary tables match);
+        # without a recorded version they age out
+        return self.version is None and time.monotonic() - self.created > ttl_seconds
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized responses, scoped to one feed version.
+
+    Keys are (path, sorted query params). set_version() drops everything when
+    the loaded feed changes, so a reload is visible on the next request;
+    entries therefore don't expire, except while no load has recorded a
+    feed_version yet, when they fall back to the TTL.
+    """
+
+    def __init__(self, max_entries=4096, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_version(self, version):
+        """Switch to version; returns True (and clears the cache) if it changed."""
+        with self._lock:
+            if version == self.version:
+                return False
+            self.version = version
+            self._entries.clear()
+            return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expired(self.ttl_seconds):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, version):
+        """
+        Cache body, produced while version was current. If set_version()
+        moved on meanwhile, the entry is returned but not stored, so an old
+        feed's body never lands under the new version.
+        """
+        entry = CachedResponse(body, version)
+        with self._lock:
+            if version != self.version:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,121 @@
+"""SQL behind the API endpoints (asyncpg, positional parameters)."""
+
+# Written by the loader after every refresh has committed; NULL (entries
+# age out after the TTL) until a load has recorded one
+FEED_VERSION = """
+SELECT (SELECT version FROM feed_version) AS version;
+"""
+
+NETWORK_STATS = """
+SELECT
+    (SELECT COUNT(*) FROM routes) as total_routes,
+    (SELECT COUNT(*) FROM stops) as total_stops,
+    (SELECT COUNT(*) FROM trips) as total_trips,
+    (SELECT SUM(stop_time_count) FROM stop_stats)::bigint as total_stop_times,
+    (SELECT ROUND(AVG(routes_serving_stop)::numeric, 2) FROM stop_stats)::float as avg_routes_per_stop,
+    (SELECT MAX(routes_serving_stop) FROM stop_stats) as max_routes_at_stop,
+    (SELECT COUNT(*) FROM stop_stats WHERE routes_serving_stop >= 5) as hub_stops,
+    (SELECT COUNT(*) FROM stop_stats WHERE routes_serving_stop = 1) as isolated_stops;
+"""
+
+# Read the summary tables behind the feature views directly: they are keyed
+# on route_id / stop_id, while the views carry an ORDER BY for the scripts.
+ROUTE_COLUMNS = """
+    route_id,
+    route_short_name,
+    route_long_name,
+    route_type,
+    total_trips,
+    service_patterns,
+    unique_stops,
+    ROUND(total_trips::numeric / NULLIF(service_patterns, 0), 2)::float as avg_trips_per_service
+"""
+
+ROUTE_SUMMARIES = f"""
+SELECT {ROUTE_COLUMNS}
+FROM route_stats
+ORDER BY route_short_name, route_id
+LIMIT $1 OFFSET $2;
+"""
+
+ROUTE_SUMMARY = f"""
+SELECT {ROUTE_COLUMNS}
+FROM route_stats
+WHERE route_id = $1;
+"""
+
+STOP_CONNECTIVITY = """
+SELECT
+    stop_id,
+    stop_name,
+    stop_lat::float as stop_lat,
+    stop_lon::float as stop_lon,
+    routes_serving_stop,
+    total_trips,
+    route_list
+FROM stop_stats
+WHERE stop_id = $1;
+"""
+
+NEAREST_STOPS = """
+SELECT
+    c.stop_id,
+    c.stop_name,
+    c.stop_lat,
+    c.stop_lon,
+    c.distance_m
+FROM (
+    SELECT
+        s.stop_id,
+        s.stop_name,
+        s.stop_lat::float as stop_lat,
+        s.stop_lon::float as stop_lon,
+        ST_Distance(s.geom::geography, p.geom::geography) AS distance_m
+    FROM stops s,
+         (SELECT ST_SetSRID(ST_MakePoint($2, $1), 4326) AS geom) p
+    WHERE s.geom IS NOT NULL
+    ORDER BY s.geom <-> p.geom
+    LIMIT $3 + 8
+) c
+ORDER BY c.distance_m
+LIMIT $3;
+"""
+
+# Departures from a stop on a service date: the trips whose service runs that
+# day (service_dates, calendar_dates already applied) after a time of day
+DEPARTURES = """
+SELECT
+    st.trip_id,
+    r.route_id,
+    r.route_short_name,
+    t.trip_headsign,
+    EXTRACT(EPOCH FROM st.departure_time)::integer AS departure_sec
+FROM stop_times st
+JOIN trips t ON st.trip_id = t.trip_id
+JOIN routes r ON t.route_id = r.route_id
+JOIN service_dates sd ON sd.service_id = t.service_id AND sd.date = $2
+WHERE st.stop_id = $1
+  AND st.departure_time >= make_interval(secs => $3)
+ORDER BY st.departure_time
+LIMIT $4;
+"""
+
+# Departures per hour come from route_hourly_stats (refreshed with
+# route_stats), never from a stop_times scan
+HOURLY_SERVICE = """
+SELECT
+    hour,
+    SUM(num_departures)::bigint as num_departures
+FROM route_hourly_stats
+GROUP BY hour
+ORDER BY hour;
+"""
+
+HOURLY_SERVICE_FOR_ROUTE = """
+SELECT
+    hour,
+    num_departures
+FROM route_hourly_stats
+WHERE route_id = $1
+ORDER BY hour;
+"""
@@ -0,0 +1,103 @@
+import threading
+from pathlib import Path
+from urllib.parse import quote_plus
+
+import yaml
+from sqlalchemy import create_engine
+
+from src.database.instrumentation import configure_instrumentation
+
+project_root = Path(__file__).parent.parent.parent
+config_path = project_root / "config" / "database.yml"
+
+# Used when config/database.yml has no `pool:` section (or leaves a key out)
+DEFAULT_POOL_SETTINGS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+    'statement_timeout_ms': None,
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def load_config(path=config_path):
+    """
+    Read config/database.yml.
+
+    Expected layout:
+
+        database:
+          host: ..., port: ..., database: ..., user: ..., password: ...
+        pool:                      # optional
+          pool_size: 5
+          max_overflow: 10
+          pool_pre_ping: true
+          statement_timeout_ms: 60000
+        instrumentation:           # optional (see src/database/instrumentation.py)
+          enabled: false
+          explain_threshold_ms: 500
+          explain_timeout_ms: 30000
+    """
+    with open(path, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def build_connection_string(db_config):
+    encoded_password = quote_plus(str(db_config['password']))
+    return (
+        f"postgresql://{db_config['user']}:{encoded_password}"
+        f"@{db_config['host']}:{db_config['port']}/{db_config['database']}"
+    )
+
+
+def pool_settings(config):
+    settings = dict(DEFAULT_POOL_SETTINGS)
+    settings.update(config.get('pool') or {})
+    return settings
+
+
+def create_pooled_engine(config, **overrides):
+    """Create a new engine from a parsed config; overrides win over the `pool:` section."""
+    settings = pool_settings(config)
+    settings.update(overrides)
+
+    connect_args = {}
+    statement_timeout_ms = settings.pop('statement_timeout_ms')
+    if statement_timeout_ms:
+        connect_args['options'] = f"-c statement_timeout={int(statement_timeout_ms)}"
+
+    engine = create_engine(
+        build_connection_string(config['database']),
+        connect_args=connect_args,
+        **settings
+    )
+    return configure_instrumentation(engine, config)
+
+
+def get_engine():
+    """
+    The shared, pooled engine for this process, created on first use.
+
+    Importing a module never opens a connection; the config is read and the
+    pool built the first time an engine is actually needed, and every caller
+    in the process shares that pool afterwards.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_pooled_engine(load_config())
+    return _engine
+
+
+def dispose_engine():
+    """Close all pooled connections (e.g. before forking worker processes)."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
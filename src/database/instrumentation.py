@@ -0,0 +1,442 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import event
+
+project_root = Path(__file__).parent.parent.parent
+log_dir = project_root / 'outputs' / 'instrumentation'
+
+# Used when config/database.yml has no `instrumentation:` section (or leaves
+# a key out); setting HALIFAX_INSTRUMENT=1 turns it on without editing the file
+DEFAULT_INSTRUMENTATION_SETTINGS = {
+    'enabled': False,
+    'explain_threshold_ms': 500,
+    'explain_timeout_ms': 30000,
+    'max_statement_chars': 2000,
+}
+ENABLE_ENV = 'HALIFAX_INSTRUMENT'
+
+# Result rows sampled to estimate the bytes a SELECT returned
+BYTES_SAMPLE_ROWS = 100
+
+# Sequential scans of these tables are what makes the feature views slow
+WATCHED_RELATIONS = ['stop_times', 'trips']
+
+# EXPLAIN ANALYZE runs the statement again, so only plain reads qualify:
+# no writes, and no calls to functions that might write (SELECT
+# refresh_route_stats() is a "read" that rewrites route_stats). Statements
+# calling anything outside READ_ONLY_FUNCTIONS get a plain EXPLAIN instead.
+EXPLAINABLE = re.compile(r'^\s*(select|with)\b', re.IGNORECASE)
+WRITES = re.compile(r'\b(insert|update|delete|merge|into)\b', re.IGNORECASE)
+CALLS = re.compile(r'\b([a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)?)\s*\(', re.IGNORECASE)
+READ_ONLY_FUNCTIONS = {
+    'count', 'sum', 'avg', 'min', 'max', 'array_agg', 'string_agg', 'bool_or', 'bool_and',
+    'percentile_cont', 'percentile_disc', 'row_number', 'rank', 'dense_rank', 'lag', 'lead',
+    'coalesce', 'nullif', 'greatest', 'least', 'round', 'floor', 'ceil', 'abs', 'sqrt', 'power',
+    'lower', 'upper', 'length', 'substring', 'concat', 'cast', 'extract', 'date_trunc', 'make_interval',
+    'to_char', 'to_date', 'now', 'generate_series', 'unnest', 'array_length',
+}
+# SQL syntax that is followed by a parenthesis without being a call
+SQL_KEYWORDS = {
+    'select', 'from', 'where', 'and', 'or', 'not', 'in', 'exists', 'any', 'all', 'as', 'on', 'join',
+    'using', 'over', 'filter', 'values', 'lateral', 'with', 'union', 'intersect', 'except', 'by',
+    'partition', 'when', 'then', 'else', 'case', 'distinct', 'is', 'like', 'between', 'within', 'group',
+    'numeric', 'decimal', 'varchar', 'char', 'timestamp',
+}
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def instrumentation_settings(config):
+    settings = dict(DEFAULT_INSTRUMENTATION_SETTINGS)
+    settings.update(config.get('instrumentation') or {})
+    if os.environ.get(ENABLE_ENV, '') not in ('', '0'):
+        settings['enabled'] = True
+    return settings
+
+
+def statement_fingerprint(statement):
+    """Short hash of a statement with literals and whitespace normalized, to group repeated queries."""
+    normalized = re.sub(r"'(?:[^']|'')*'", '?', statement)
+    normalized = re.sub(r'\b\d+(?:\.\d+)?\b', '?', normalized)
+    normalized = ' '.join(normalized.split()).lower()
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+def is_explainable(statement):
+    return bool(EXPLAINABLE.match(statement)) and not WRITES.search(statement)
+
+
+def calls_only_read_only_functions(statement):
+    """True when every function the statement calls is a known read-only built-in (or PostGIS st_*)."""
+    without_literals = re.sub(r"'(?:[^']|'')*'", "''", statement)
+    for name in CALLS.findall(without_literals):
+        name = name.lower().split('.')[-1]
+        if name in SQL_KEYWORDS or name in READ_ONLY_FUNCTIONS or name.startswith('st_'):
+            continue
+        return False
+    return True
+
+
+def estimate_result_bytes(cursor, rows):
+    """
+    Approximate text-format size of a SELECT's result: the mean size of the
+    first BYTES_SAMPLE_ROWS rows times the row count.
+
+    psycopg2 buffers client-side results, so the sample is read and the
+    cursor scrolled back to the start before the caller fetches anything.
+    Server-side cursors are left alone (None).
+    """
+    if cursor.description is None or not rows:
+        return 0
+    if not hasattr(cursor, 'scroll') or getattr(cursor, 'name', None) is not None:
+        return None
+    sample = cursor.fetchmany(BYTES_SAMPLE_ROWS)
+    cursor.scroll(0, mode='absolute')
+    if not sample:
+        return 0
+    sample_bytes = sum(len(str(value)) for row in sample for value in row if value is not None)
+    return int(sample_bytes / len(sample) * rows)
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def plan_summary(explain_json):
+    """
+    Timing, buffer counts and sequential scans of an EXPLAIN (FORMAT JSON)
+    result; without ANALYZE the timings are None and rows are estimates.
+    """
+    root = explain_json[0]
+    plan = root['Plan']
+    seq_scans = [
+        {
+            'relation': node.get('Relation Name'),
+            'rows': node.get('Actual Rows', node.get('Plan Rows', 0)) * node.get('Actual Loops', 1),
+            'filter': node.get('Filter'),
+            'parallel': node.get('Parallel Aware', False),
+        }
+        for node in plan_nodes(plan) if node['Node Type'] == 'Seq Scan'
+    ]
+    return {
+        'analyzed': 'Execution Time' in root,
+        'planning_ms': root.get('Planning Time'),
+        'execution_ms': root.get('Execution Time'),
+        'shared_hit_blocks': plan.get('Shared Hit Blocks'),
+        'shared_read_blocks': plan.get('Shared Read Blocks'),
+        'seq_scans': seq_scans,
+        'plan': plan,
+    }
+
+
+class QueryRecorder:
+    """
+    Per-statement and per-step timings of one process, appended as JSON
+    lines to outputs/instrumentation/run-<timestamp>-<pid>.jsonl.
+
+    Statements are timed through the engine's cursor events; the first time
+    a read statement runs for longer than explain_threshold_ms its plan is
+    captured on a separate pooled connection and added to its record:
+    EXPLAIN (ANALYZE, BUFFERS) when it calls only read-only functions, a
+    plain EXPLAIN (nothing executed) otherwise. The explain connection has
+    its own statement_timeout (explain_timeout_ms).
+    """
+
+    def __init__(self, log_path, explain_threshold_ms=500, max_statement_chars=2000, explain_timeout_ms=30000):
+        self.log_path = Path(log_path)
+        self.explain_threshold_ms = explain_threshold_ms
+        self.explain_timeout_ms = explain_timeout_ms
+        self.max_statement_chars = max_statement_chars
+        self.records = []
+        self._explained = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = None
+        self._pid = None
+
+    def write(self, record):
+        record = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'pid': os.getpid(), **record}
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            # Forked loader processes reopen the log and append to it
+            if self._file is None or self._pid != os.getpid():
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.log_path, 'a', buffering=1)
+                self._pid = os.getpid()
+            self._file.write(line)
+            self.records.append(record)
+
+    def _steps(self):
+        if not hasattr(self._local, 'steps'):
+            self._local.steps = []
+        return self._local.steps
+
+    @contextmanager
+    def step(self, name, parent=None):
+        """
+        Time a pipeline step, with the statements run inside it on this thread.
+
+        The step stack is per thread, so a step run on a worker thread has no
+        parent of its own; parent names the step it belongs to, and
+        summarize() adds its statements to that step's totals.
+        """
+        totals = {'name': name, 'queries': 0, 'query_ms': 0.0, 'rows': 0}
+        steps = self._steps()
+        detached = not steps and parent is not None
+        if steps:
+            parent = steps[-1]['name']
+        steps.append(totals)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as exc:
+            error = repr(exc)
+            raise
+        finally:
+            steps.pop()
+            self.write({'type': 'step', 'step': name, 'parent': parent, 'detached': detached,
+                        'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+                        'queries': totals['queries'], 'query_ms': round(totals['query_ms'], 2),
+                        'rows': totals['rows'], 'error': error})
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._instrumentation_start = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_instrumentation_start', None)
+        if start is None:
+            return
+        duration_ms = (time.perf_counter() - start) * 1000
+        rows = cursor.rowcount if cursor.rowcount >= 0 else None
+        fingerprint = statement_fingerprint(statement)
+        steps = self._steps()
+        for totals in steps:
+            totals['queries'] += 1
+            totals['query_ms'] += duration_ms
+            totals['rows'] += rows or 0
+
+        record = {
+            'type': 'query',
+            'fingerprint': fingerprint,
+            'statement': statement[:self.max_statement_chars],
+            'step': steps[-1]['name'] if steps else None,
+            'duration_ms': round(duration_ms, 2),
+            'rows': rows,
+            'statement_bytes': len(statement.encode()) + len(str(parameters or '')),
+            'result_bytes': None if executemany else estimate_result_bytes(cursor, rows),
+            'executemany': executemany,
+        }
+        if (self.explain_threshold_ms is not None and duration_ms >= self.explain_threshold_ms
+                and not executemany and is_explainable(statement)):
+            with self._lock:
+                first = fingerprint not in self._explained
+                self._explained.add(fingerprint)
+            if first:
+                record['explain'] = self.explain(conn.engine, statement, parameters)
+        self.write(record)
+
+    def explain(self, engine, statement, parameters):
+        # A separate connection keeps a failing EXPLAIN from aborting the
+        # caller's transaction; raw DBAPI cursors don't fire these events
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if calls_only_read_only_functions(statement) else "FORMAT JSON"
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            if self.explain_timeout_ms:
+                cursor.execute(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+            # parameters as SQLAlchemy sent them: an empty dict still makes
+            # psycopg2 unescape the statement's %% literals
+            cursor.execute(f"EXPLAIN ({options}) " + statement, parameters)
+            result = cursor.fetchone()[0]
+            cursor.close()
+            raw.rollback()
+            return plan_summary(json.loads(result) if isinstance(result, str) else result)
+        except Exception as exc:
+            raw.rollback()
+            return {'error': repr(exc)}
+        finally:
+            raw.close()
+
+
+def get_recorder(settings=None):
+    """The process-wide recorder, created on first use (None if instrumentation was never enabled)."""
+    global _recorder
+    if _recorder is None and settings is not None:
+        with _recorder_lock:
+            if _recorder is None:
+                stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+                _recorder = QueryRecorder(
+                    log_dir / f"run-{stamp}-{os.getpid()}.jsonl",
+                    explain_threshold_ms=settings['explain_threshold_ms'],
+                    max_statement_chars=settings['max_statement_chars'],
+                    explain_timeout_ms=settings['explain_timeout_ms'],
+                )
+    return _recorder
+
+
+def instrument_engine(engine, recorder):
+    event.listen(engine, 'before_cursor_execute', recorder.before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', recorder.after_cursor_execute)
+    return engine
+
+
+def configure_instrumentation(engine, config):
+    """Attach the recorder to a new engine when the config (or HALIFAX_INSTRUMENT) enables it."""
+    settings = instrumentation_settings(config)
+    if settings['enabled']:
+        instrument_engine(engine, get_recorder(settings))
+    return engine
+
+
+def timed_step(name, parent=None):
+    """recorder.step(name, parent) when instrumentation is on, otherwise a no-op."""
+    recorder = get_recorder()
+    return recorder.step(name, parent) if recorder else nullcontext()
+
+
+def read_log(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def latest_log(directory=log_dir):
+    logs = sorted(Path(directory).glob('run-*.jsonl'), key=lambda p: p.stat().st_mtime)
+    return logs[-1] if logs else None
+
+
+def summarize(records):
+    """
+    Statements grouped by fingerprint (slowest total first), step timings,
+    and the sequential scans of WATCHED_RELATIONS found in captured plans.
+
+    Steps run on worker threads (detached) are added to their parent's
+    totals, which count only the parent's own thread; worker_steps says how
+    many were added.
+    """
+    statements = {}
+    steps = []
+    flagged = []
+    for record in records:
+        if record['type'] == 'step':
+            steps.append({key: record.get(key) for key in
+                          ('step', 'parent', 'detached', 'duration_ms', 'queries', 'query_ms', 'rows')})
+            continue
+        entry = statements.setdefault(record['fingerprint'], {
+            'fingerprint': record['fingerprint'], 'statement': record['statement'],
+            'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'result_bytes': 0,
+        })
+        entry['calls'] += 1
+        entry['total_ms'] += record['duration_ms']
+        entry['max_ms'] = max(entry['max_ms'], record['duration_ms'])
+        entry['rows'] += record['rows'] or 0
+        entry['result_bytes'] += record['result_bytes'] or 0
+        for scan in (record.get('explain') or {}).get('seq_scans', []):
+            if scan['relation'] in WATCHED_RELATIONS:
+                flagged.append({'fingerprint': record['fingerprint'], 'step': record['step'],
+                                'statement': record['statement'], **scan})
+
+    for entry in statements.values():
+        entry['mean_ms'] = entry['total_ms'] / entry['calls']
+
+    detached = {}
+    for step in steps:
+        if step['detached']:
+            totals = detached.setdefault(step['parent'], {'queries': 0, 'query_ms': 0.0, 'rows': 0, 'worker_steps': 0})
+            for key in ('queries', 'query_ms', 'rows'):
+                totals[key] += step[key]
+            totals['worker_steps'] += 1
+    for step in steps:
+        step['worker_steps'] = 0
+        if not step['detached'] and step['step'] in detached:
+            for key, value in detached[step['step']].items():
+                step[key] += value
+
+    return {
+        'statements': sorted(statements.values(), key=lambda e: e['total_ms'], reverse=True),
+        'steps': steps,
+        'seq_scans': flagged,
+    }
+
+
+def one_line(statement, width=70):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= width else statement[:width - 3] + '...'
+
+
+def print_summary(summary, top_n=10):
+    statements = summary['statements']
+    total_ms = sum(e['total_ms'] for e in statements)
+    print(f"{sum(e['calls'] for e in statements):,} statements, {len(statements)} distinct, "
+          f"{total_ms / 1000:.2f}s in the database")
+    print()
+
+    if summary['steps']:
+        print(f"{'Step':<32}{'Time (s)':>10}{'Queries':>9}{'Query (s)':>11}")
+        print("-" * 62)
+        for step in summary['steps']:
+            name = step['step'] if step['parent'] is None else f"  {step['step']}"
+            print(f"{name[:31]:<32}{step['duration_ms'] / 1000:>10.2f}{step['queries']:>9,}"
+                  f"{step['query_ms'] / 1000:>11.2f}")
+        workers = sum(step['worker_steps'] for step in summary['steps'])
+        if workers:
+            print(f"(query totals include {workers} steps run on worker threads, counted under their parent)")
+        print()
+
+    print(f"Slowest statements (top {top_n} by total time):")
+    print(f"{'Calls':>6}{'Total (s)':>11}{'Max (ms)':>10}{'Rows':>11}{'Bytes':>12}  Statement")
+    for entry in statements[:top_n]:
+        print(f"{entry['calls']:>6,}{entry['total_ms'] / 1000:>11.2f}{entry['max_ms']:>10.0f}"
+              f"{entry['rows']:>11,}{entry['result_bytes']:>12,}  {one_line(entry['statement'])}")
+    print()
+
+    if summary['seq_scans']:
+        for scan in summary['seq_scans']:
+            print(f"✗ Seq Scan on {scan['relation']} ({scan['rows']:,} rows) in: {one_line(scan['statement'])}")
+    else:
+        print(f"✓ No sequential scans of {', '.join(WATCHED_RELATIONS)} in the captured plans")
+
+
+def print_run_summary():
+    """Summary of this process's recorder, if instrumentation is on."""
+    recorder = get_recorder()
+    if recorder is None:
+        return
+    print("Query instrumentation:")
+    print_summary(summarize(recorder.records))
+    print(f"✓ Log: {recorder.log_path}")
+
+
+def main():
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else latest_log()
+    if path is None:
+        print(f"✗ No instrumentation logs in {log_dir} (set {ENABLE_ENV}=1 and run a pipeline)")
+        return
+
+    summary = summarize(read_log(path))
+    summary_path = path.with_suffix('.summary.json')
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2, default=str)
+
+    print(f"Log: {path}")
+    print()
+    print_summary(summary)
+    print()
+    print(f"✓ Summary: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.etl.copy_loader import read_csv_header, copy_dataframe
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+DATE_COLUMNS = ['start_date', 'end_date', 'date', 'feed_start_date', 'feed_end_date']
+
+# Explicit dtypes for every GTFS column we load, so pandas never has to infer
+# types (and never upcasts ID columns like 220.0.1 or 4115249 to floats).
+# Dates and HH:MM:SS times stay strings here; dates are parsed per chunk and
+# PostgreSQL casts times to INTERVAL.
+GTFS_DTYPES = {
+    # identifiers
+    'agency_id': 'string', 'route_id': 'string', 'service_id': 'string',
+    'stop_id': 'string', 'trip_id': 'string', 'shape_id': 'string',
+    'block_id': 'string', 'zone_id': 'string', 'parent_station': 'string',
+    'stop_code': 'string',
+    # free text
+    'agency_name': 'string', 'agency_url': 'string', 'agency_timezone': 'string',
+    'agency_lang': 'string', 'route_short_name': 'string', 'route_long_name': 'string',
+    'route_color': 'string', 'route_text_color': 'string', 'stop_name': 'string',
+    'stop_desc': 'string', 'stop_url': 'string', 'trip_headsign': 'string',
+    'trip_short_name': 'string', 'stop_headsign': 'string',
+    'feed_publisher_name': 'string', 'feed_publisher_url': 'string',
+    'feed_lang': 'string', 'feed_version': 'string',
+    # times and dates
+    'arrival_time': 'string', 'departure_time': 'string',
+    'start_date': 'string', 'end_date': 'string', 'date': 'string',
+    'feed_start_date': 'string', 'feed_end_date': 'string',
+    # integers (nullable)
+    'monday': 'Int8', 'tuesday': 'Int8', 'wednesday': 'Int8', 'thursday': 'Int8',
+    'friday': 'Int8', 'saturday': 'Int8', 'sunday': 'Int8',
+    'exception_type': 'Int8', 'route_type': 'Int16', 'location_type': 'Int8',
+    'direction_id': 'Int8', 'wheelchair_accessible': 'Int8', 'bikes_allowed': 'Int8',
+    'pickup_type': 'Int8', 'drop_off_type': 'Int8', 'timepoint': 'Int8',
+    'stop_sequence': 'Int32', 'shape_pt_sequence': 'Int32',
+    # floats
+    'stop_lat': 'float64', 'stop_lon': 'float64',
+    'shape_pt_lat': 'float64', 'shape_pt_lon': 'float64',
+    'shape_dist_traveled': 'float64',
+}
+
+
+def iter_gtfs_chunks(file_path, columns, chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Yield DataFrame chunks of a GTFS file, reading only the given columns.
+
+    Columns without an entry in GTFS_DTYPES are read as strings.
+    """
+    dtypes = {col: GTFS_DTYPES.get(col, 'string') for col in columns}
+    return pd.read_csv(
+        file_path,
+        usecols=columns,
+        dtype=dtypes,
+        chunksize=chunksize,
+        encoding='utf-8-sig',
+        skipinitialspace=True,
+    )
+
+
+def transform_chunk(chunk):
+    """Convert YYYYMMDD date columns of one chunk to datetimes, in place."""
+    for col in DATE_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = pd.to_datetime(chunk[col], format='%Y%m%d', errors='coerce')
+    return chunk
+
+
+def parse_gtfs_csv(file_path, db_columns):
+    """
+    Read a whole GTFS file with explicit dtypes and converted date columns.
+
+    Kept free of database access, for building the Parquet feed cache.
+    """
+    columns = [col for col in read_csv_header(file_path) if col in db_columns]
+    dtypes = {col: GTFS_DTYPES.get(col, 'string') for col in columns}
+    df = pd.read_csv(file_path, usecols=columns, dtype=dtypes, encoding='utf-8-sig',
+                     skipinitialspace=True)
+    return transform_chunk(df)
+
+
+def load_gtfs_file_chunked(engine, file_path, table_name, db_columns, chunksize=DEFAULT_CHUNK_SIZE,
+                           fk_index=None, validate=False):
+    """
+    Stream a GTFS file into PostgreSQL one chunk at a time.
+
+    Each chunk is read with explicit dtypes, transformed and COPYed before
+    the next one is read, so memory use is bounded by chunksize rather than
+    by the file size. All chunks go in one transaction.
+
+    Parameters:
+    - db_columns: columns of the target table; other CSV columns are never read
+    - fk_index: ForeignKeyIndex; each chunk's keys are registered in it
+    - validate: drop rows breaking a foreign key, checked against fk_index
+    """
+    file_path = Path(file_path)
+    columns = [col for col in read_csv_header(file_path) if col in db_columns]
+
+    rows_read = 0
+    rows_loaded = 0
+    chunks = 0
+    fk_report = {}
+
+    start = time.perf_counter()
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        for chunk in iter_gtfs_chunks(file_path, columns, chunksize):
+            rows_read += len(chunk)
+            chunk = transform_chunk(chunk)
+            if fk_index is not None and validate:
+                chunk, report = fk_index.filter(table_name, chunk)
+                for col, n in report.items():
+                    fk_report[col] = fk_report.get(col, 0) + n
+            if fk_index is not None:
+                fk_index.add_keys(table_name, chunk)
+            rows_loaded += copy_dataframe(cursor, chunk, table_name)
+            chunks += 1
+        raw_conn.commit()
+        cursor.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'table': table_name,
+        'rows_read': rows_read,
+        'rows_loaded': rows_loaded,
+        'columns': len(columns),
+        'chunks': chunks,
+        'fk_report': fk_report,
+        'seconds': elapsed,
+        'rows_per_sec': rows_loaded / elapsed if elapsed > 0 else float('inf'),
+    }
+
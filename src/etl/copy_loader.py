@@ -0,0 +1,166 @@
+import io
+import csv
+import time
+from pathlib import Path
+
+
+def read_csv_header(file_path):
+    """Return the column names from the first line of a GTFS CSV file."""
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader(f))
+    return [col.strip() for col in header]
+
+
+def get_column_types(cursor, table_name):
+    """
+    Return {column_name: sql_type} for a table, in table column order.
+
+    The types come from format_type() so they can be used directly in a CAST,
+    e.g. 'character varying(20)', 'numeric(10,8)', 'interval'.
+    """
+    cursor.execute(
+        """
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+        """,
+        (table_name,)
+    )
+    return {name: sql_type for name, sql_type in cursor.fetchall()}
+
+
+def stage_csv(cursor, file_path, staging_table, columns=None):
+    """
+    Stream a CSV file into a TEXT-only staging table with COPY ... FROM STDIN.
+
+    Every column is staged as TEXT so the raw GTFS values (YYYYMMDD dates,
+    25:10:00 times, blank integers) reach PostgreSQL untouched and are cast
+    in a single INSERT ... SELECT afterwards.
+
+    Parameters:
+    - columns: header of the file; read from the file when not given
+    """
+    if columns is None:
+        columns = read_csv_header(file_path)
+
+    column_defs = ", ".join(f'"{col}" TEXT' for col in columns)
+    cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    cursor.execute(f"CREATE TEMP TABLE {staging_table} ({column_defs})")
+
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        cursor.copy_expert(
+            f"COPY {staging_table} ({column_list}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+            f
+        )
+    return cursor.rowcount
+
+
+def cast_expression(column, sql_type):
+    """SQL expression that turns a staged TEXT value into the target column type."""
+    return f"CAST(NULLIF(TRIM(\"{column}\"), '') AS {sql_type})"
+
+
+def fk_condition(fk_column, fk_table, fk_ref_column):
+    """WHERE clause keeping staged rows (alias s) whose fk_column is blank or exists in fk_table."""
+    return (
+        f"(NULLIF(TRIM(s.\"{fk_column}\"), '') IS NULL OR EXISTS "
+        f"(SELECT 1 FROM {fk_table} f WHERE f.\"{fk_ref_column}\" = TRIM(s.\"{fk_column}\")))"
+    )
+
+
+def insert_from_staging(cursor, staging_table, table_name, columns, column_types, foreign_keys=None):
+    """
+    Cast and move staged rows into the target table.
+
+    Parameters:
+    - foreign_keys: [(column, ref_table, ref_column), ...]; rows whose value
+      has no match in the referenced table are skipped (blank values pass)
+    """
+    columns_to_insert = [col for col in columns if col in column_types]
+    target_list = ", ".join(f'"{col}"' for col in columns_to_insert)
+    select_list = ", ".join(cast_expression(col, column_types[col]) for col in columns_to_insert)
+
+    query = f"INSERT INTO {table_name} ({target_list}) SELECT {select_list} FROM {staging_table} s"
+    conditions = [
+        fk_condition(fk_column, fk_table, fk_ref_column)
+        for fk_column, fk_table, fk_ref_column in (foreign_keys or [])
+        if fk_column in columns_to_insert
+    ]
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+
+    cursor.execute(query)
+    return cursor.rowcount, columns_to_insert
+
+
+def copy_gtfs_file(engine, file_path, table_name, foreign_keys=None):
+    """
+    Load one GTFS file with COPY into a staging table, then INSERT ... SELECT.
+
+    Returns a dict with rows read, rows loaded, seconds and rows/sec so the
+    caller can report throughput per table.
+    """
+    file_path = Path(file_path)
+    staging_table = f"staging_{table_name}"
+    columns = read_csv_header(file_path)
+
+    start = time.perf_counter()
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        column_types = get_column_types(cursor, table_name)
+        rows_read = stage_csv(cursor, file_path, staging_table, columns)
+        rows_loaded, columns_to_insert = insert_from_staging(
+            cursor, staging_table, table_name, columns, column_types, foreign_keys
+        )
+        cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        raw_conn.commit()
+        cursor.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'table': table_name,
+        'rows_read': rows_read,
+        'rows_loaded': rows_loaded,
+        'columns': len(columns_to_insert),
+        'seconds': elapsed,
+        'rows_per_sec': rows_loaded / elapsed if elapsed > 0 else float('inf'),
+    }
+
+
+def print_throughput_report(results):
+    """Print a rows/sec summary for a list of copy_gtfs_file results."""
+    if not results:
+        return
+
+    print(f"{'Table':<16}{'Rows':>12}{'Seconds':>10}{'Rows/sec':>14}")
+    print("-" * 52)
+    for r in results:
+        print(f"{r['table']:<16}{r['rows_loaded']:>12,}{r['seconds']:>10.2f}{r['rows_per_sec']:>14,.0f}")
+    total_rows = sum(r['rows_loaded'] for r in results)
+    total_seconds = sum(r['seconds'] for r in results)
+    print("-" * 52)
+    print(f"{'Total':<16}{total_rows:>12,}{total_seconds:>10.2f}"
+          f"{(total_rows / total_seconds if total_seconds > 0 else 0):>14,.0f}")
+
+
+def copy_dataframe(cursor, df, table_name):
+    """
+    COPY an already-typed DataFrame straight into table_name.
+
+    NaN/NaT/<NA> are written as empty unquoted fields, which COPY reads as NULL.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    column_list = ", ".join(f'"{col}"' for col in df.columns)
+    cursor.copy_expert(f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return len(df)
@@ -0,0 +1,38 @@
+import time
+
+from sqlalchemy import text
+
+
+def refresh_feature_tables(engine, route_ids=None, stop_ids=None):
+    """
+    Refresh route_stats and stop_stats (the tables behind the feature views).
+
+    With route_ids/stop_ids only those rows are recomputed; None means all.
+    An empty collection skips that table. Each table is refreshed in its own
+    transaction: readers keep seeing the previous rows until it commits, so
+    the views stay queryable during the refresh.
+
+    Returns {table: (rows_refreshed, seconds)}.
+    """
+    refreshed = {}
+    transactional = engine.execution_options(isolation_level="READ COMMITTED")
+
+    for table_name, function, ids in (
+        ('route_stats', 'refresh_route_stats', route_ids),
+        ('stop_stats', 'refresh_stop_stats', stop_ids),
+    ):
+        if ids is not None and len(ids) == 0:
+            continue
+
+        start = time.perf_counter()
+        with transactional.begin() as conn:
+            if ids is None:
+                rows = conn.execute(text(f"SELECT {function}()")).scalar()
+            else:
+                rows = conn.execute(
+                    text(f"SELECT {function}(CAST(:ids AS TEXT[]))"),
+                    {'ids': sorted(str(i) for i in ids)}
+                ).scalar()
+        refreshed[table_name] = (rows, time.perf_counter() - start)
+
+    return refreshed
@@ -0,0 +1,183 @@
+import json
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.etl.chunked_loader import DEFAULT_CHUNK_SIZE, iter_gtfs_chunks, parse_gtfs_csv
+from src.etl.copy_loader import read_csv_header
+from src.etl.incremental import file_fingerprint
+from src.utils.gtfs_time import gtfs_time_to_seconds
+
+project_root = Path(__file__).parent.parent.parent
+default_data_dir = project_root / 'data' / 'raw' / 'gtfs_static'
+default_cache_dir = project_root / 'data' / 'processed' / 'gtfs_cache'
+
+MANIFEST_NAME = 'manifest.json'
+
+CACHED_FILES = [
+    ('agency.txt', 'agency'),
+    ('calendar.txt', 'calendar'),
+    ('calendar_dates.txt', 'calendar_dates'),
+    ('routes.txt', 'routes'),
+    ('stops.txt', 'stops'),
+    ('shapes.txt', 'shapes'),
+    ('trips.txt', 'trips'),
+    ('stop_times.txt', 'stop_times'),
+    ('feed_info.txt', 'feed_info'),
+]
+
+# Low-cardinality string columns stored dictionary-encoded: a few bytes per row
+# on disk and in memory instead of one string per row.
+DICTIONARY_COLUMNS = {
+    'agency_id', 'route_id', 'service_id', 'shape_id', 'trip_id', 'stop_id',
+    'block_id', 'trip_headsign', 'stop_headsign', 'zone_id',
+}
+
+TIME_COLUMNS = {'arrival_time': 'arrival_sec', 'departure_time': 'departure_sec'}
+
+
+def prepare_for_cache(df):
+    """Encode a parsed GTFS frame for Parquet: categorical IDs, times as Int32 seconds."""
+    for col, seconds_col in TIME_COLUMNS.items():
+        if col in df.columns:
+            df[seconds_col] = gtfs_time_to_seconds(df[col])
+            df = df.drop(columns=col)
+    for col in DICTIONARY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def write_stop_times(file_path, trips, output_dir, chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Write stop_times as a Parquet dataset partitioned by service_id.
+
+    service_id (and route_id, for convenience) come from trips. The file is
+    read in chunks, so memory stays bounded for large feeds.
+    """
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+
+    trip_lookup = trips[['trip_id', 'route_id', 'service_id']].astype('string').set_index('trip_id')
+    columns = read_csv_header(file_path)
+    rows = 0
+    for i, chunk in enumerate(iter_gtfs_chunks(file_path, columns, chunksize)):
+        chunk = chunk.join(trip_lookup, on='trip_id')
+        chunk = chunk[chunk['service_id'].notna()]
+        chunk = prepare_for_cache(chunk)
+        chunk['service_id'] = chunk['service_id'].astype('string')
+        pq.write_to_dataset(
+            pa.Table.from_pandas(chunk, preserve_index=False),
+            output_dir,
+            partition_cols=['service_id'],
+            basename_template=f"part-{i:05d}-{{i}}.parquet",
+        )
+        rows += len(chunk)
+    return rows
+
+
+def write_feed_cache(data_dir=default_data_dir, cache_dir=default_cache_dir, force=False):
+    """
+    Write the GTFS feed as typed Parquet files under data/processed.
+
+    Each table becomes <table>.parquet; stop_times becomes a stop_times/
+    dataset partitioned by service_id. A manifest stores the source file
+    fingerprints, so an unchanged feed is skipped unless force is set.
+
+    Returns {table: rows_written}, or {} if the cache was already current.
+    """
+    data_dir = Path(data_dir)
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    fingerprints = {
+        filename: file_fingerprint(data_dir / filename)
+        for filename, _ in CACHED_FILES if (data_dir / filename).exists()
+    }
+    manifest = read_manifest(cache_dir)
+    if not force and manifest.get('fingerprints') == fingerprints:
+        return {}
+
+    written = {}
+    trips = None
+    for filename, table_name in CACHED_FILES:
+        file_path = data_dir / filename
+        if not file_path.exists():
+            continue
+
+        if table_name == 'stop_times':
+            if trips is None:
+                continue
+            written[table_name] = write_stop_times(file_path, trips, cache_dir / 'stop_times')
+            continue
+
+        df = parse_gtfs_csv(file_path, read_csv_header(file_path))
+        if table_name == 'trips':
+            trips = df.copy()
+        df = prepare_for_cache(df)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), cache_dir / f"{table_name}.parquet")
+        written[table_name] = len(df)
+
+    feed_version = None
+    if (cache_dir / 'feed_info.parquet').exists():
+        feed_info = pq.read_table(cache_dir / 'feed_info.parquet').to_pandas()
+        if 'feed_version' in feed_info.columns and len(feed_info):
+            feed_version = str(feed_info['feed_version'].iloc[0])
+
+    with open(cache_dir / MANIFEST_NAME, 'w') as f:
+        json.dump({
+            'feed_version': feed_version,
+            'written_at': datetime.now().isoformat(timespec='seconds'),
+            'rows': written,
+            'fingerprints': fingerprints,
+        }, f, indent=2)
+
+    return written
+
+
+def read_manifest(cache_dir=default_cache_dir):
+    path = Path(cache_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def cache_available(cache_dir=default_cache_dir):
+    return (Path(cache_dir) / MANIFEST_NAME).exists()
+
+
+def read_table(table_name, columns=None, filters=None, cache_dir=default_cache_dir):
+    """
+    Read a cached table as a pyarrow Table, memory-mapped.
+
+    Parameters:
+    - columns: only these columns are read from disk
+    - filters: pyarrow filters, e.g. [('route_id', 'in', ['1', '10A'])];
+      on stop_times, service_id filters skip whole partitions
+    """
+    cache_dir = Path(cache_dir)
+    if table_name == 'stop_times':
+        partitioning = ds.partitioning(pa.schema([('service_id', pa.string())]), flavor='hive')
+        dataset = ds.dataset(cache_dir / 'stop_times', format='parquet', partitioning=partitioning)
+        filter_expression = pq.filters_to_expression(filters) if filters else None
+        return dataset.to_table(columns=columns, filter=filter_expression)
+
+    return pq.read_table(cache_dir / f"{table_name}.parquet", columns=columns, filters=filters,
+                         memory_map=True)
+
+
+def load_table(table_name, columns=None, filters=None, cache_dir=default_cache_dir):
+    """Same as read_table, as a pandas DataFrame (categorical IDs, Int32 time seconds)."""
+    return read_table(table_name, columns, filters, cache_dir).to_pandas()
+
+
+def load_stop_times(service_ids=None, columns=None, cache_dir=default_cache_dir):
+    """stop_times for the given service_ids only (all services when None)."""
+    filters = [('service_id', 'in', list(service_ids))] if service_ids is not None else None
+    return load_table('stop_times', columns, filters, cache_dir)
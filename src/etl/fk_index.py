@@ -0,0 +1,132 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.etl.schema_parser import parse_schema
+
+# References GTFS relies on that schema.sql can't declare as real foreign keys
+# (shapes is keyed on shape_id + shape_pt_sequence). These are only counted
+# and reported: a trip without a shape is still a valid trip.
+SOFT_FOREIGN_KEYS = {
+    'trips': [('shape_id', 'shapes', 'shape_id')],
+}
+
+
+def hash_keys(values):
+    """
+    Hash key values to uint64 so key sets are compact, fixed-width arrays.
+
+    Values are compared as strings, so '6001' from one file matches 6001
+    parsed as an integer from another.
+    """
+    series = pd.Series(values, copy=False)
+    if series.dtype != 'string':
+        series = series.astype('string')
+    return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+
+class ForeignKeyIndex:
+    """
+    Key sets of the tables loaded so far in this run, for FK validation in memory.
+
+    Parent tables register their key columns as they are parsed; child tables
+    are then checked against every foreign key declared in schema.sql with
+    one vectorized lookup per foreign key, instead of a SELECT per table.
+    Keys are stored as sorted unique 64-bit hashes (8 bytes per key, no
+    Python objects), so even all stop_times trip_ids stay small.
+    """
+
+    def __init__(self, schema=None):
+        if schema is None:
+            schema = parse_schema()
+        self.foreign_keys = {
+            table: list(info['foreign_keys']) for table, info in schema.items()
+        }
+        self.soft_foreign_keys = SOFT_FOREIGN_KEYS
+
+        self.referenced = set()
+        for fks in list(self.foreign_keys.values()) + list(self.soft_foreign_keys.values()):
+            for _, ref_table, ref_column in fks:
+                self.referenced.add((ref_table, ref_column))
+
+        self._pending = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def add_keys(self, table_name, df):
+        """Register the referenced key columns of (a chunk of) a parsed table."""
+        with self._lock:
+            for ref_table, ref_column in self.referenced:
+                if ref_table == table_name and ref_column in df.columns:
+                    column = df[ref_column]
+                    hashed = hash_keys(column[column.notna()])
+                    self._pending.setdefault((ref_table, ref_column), []).append(hashed)
+                    self._keys.pop((ref_table, ref_column), None)
+
+    def keys(self, table_name, column):
+        """Sorted unique hashes for table.column, or None if the table wasn't registered."""
+        key = (table_name, column)
+        with self._lock:
+            if key not in self._keys:
+                if key not in self._pending:
+                    return None
+                self._keys[key] = np.unique(np.concatenate(self._pending[key]))
+                self._pending[key] = [self._keys[key]]
+            return self._keys[key]
+
+    def contains(self, table_name, column, values):
+        """Boolean mask: which values exist in table.column. Missing values count as valid."""
+        keys = self.keys(table_name, column)
+        values = pd.Series(values, copy=False)
+        mask = values.isna().to_numpy()
+        if keys is None or len(keys) == 0:
+            return mask | (keys is None)
+
+        hashed = hash_keys(values)
+        positions = np.searchsorted(keys, hashed)
+        positions[positions == len(keys)] = 0
+        return mask | (keys[positions] == hashed)
+
+    def filter(self, table_name, df):
+        """
+        Drop rows that break any foreign key of table_name.
+
+        Returns (filtered_df, {fk_column: rows_dropped}) plus unmatched soft
+        references under 'soft:<column>' (reported, not dropped).
+        """
+        report = {}
+        keep = np.ones(len(df), dtype=bool)
+        for fk_column, ref_table, ref_column in self.foreign_keys.get(table_name, []):
+            if fk_column not in df.columns or self.keys(ref_table, ref_column) is None:
+                continue
+            valid = self.contains(ref_table, ref_column, df[fk_column])
+            dropped = int((keep & ~valid).sum())
+            if dropped:
+                report[fk_column] = dropped
+            keep &= valid
+
+        for fk_column, ref_table, ref_column in self.soft_foreign_keys.get(table_name, []):
+            if fk_column not in df.columns or self.keys(ref_table, ref_column) is None:
+                continue
+            unmatched = int((~self.contains(ref_table, ref_column, df[fk_column])).sum())
+            if unmatched:
+                report[f"soft:{fk_column}"] = unmatched
+
+        if not keep.all():
+            df = df[keep]
+        return df, report
+
+
+def format_fk_report(report):
+    """'Filtered 12 invalid rows (trip_id: 10, stop_id: 2).' style summary, '' if clean."""
+    hard = {k: v for k, v in report.items() if not k.startswith('soft:')}
+    soft = {k[5:]: v for k, v in report.items() if k.startswith('soft:')}
+    parts = []
+    if hard:
+        detail = ", ".join(f"{col}: {n}" for col, n in hard.items())
+        parts.append(f"Filtered {sum(hard.values())} invalid rows ({detail}).")
+    if soft:
+        detail = ", ".join(f"{col}: {n}" for col, n in soft.items())
+        parts.append(f"Unmatched optional references ({detail}).")
+    return " ".join(parts)
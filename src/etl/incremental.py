@@ -0,0 +1,340 @@
+import hashlib
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+from src.etl.copy_loader import read_csv_header, get_column_types, stage_csv, cast_expression, fk_condition
+from src.etl.schema_parser import parse_schema
+from src.etl.scheduler import build_dependency_graph, topological_order
+
+STATE_TABLE = 'gtfs_load_state'
+VERSION_TABLE = 'feed_version'
+
+
+def file_fingerprint(file_path, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_stored_fingerprints(conn):
+    result = conn.execute(text(f"SELECT table_name, file_hash FROM {STATE_TABLE}"))
+    return {row[0]: row[1] for row in result}
+
+
+def save_fingerprint(conn, table_name, file_name, file_hash):
+    conn.execute(
+        text(f"""
+            INSERT INTO {STATE_TABLE} (table_name, file_name, file_hash, loaded_at)
+            VALUES (:table_name, :file_name, :file_hash, NOW())
+            ON CONFLICT (table_name) DO UPDATE
+            SET file_name = EXCLUDED.file_name,
+                file_hash = EXCLUDED.file_hash,
+                loaded_at = EXCLUDED.loaded_at
+        """),
+        {'table_name': table_name, 'file_name': file_name, 'file_hash': file_hash}
+    )
+
+
+def file_state(data_dir, load_plan, tables=None):
+    """{table: (file_name, file_hash)} of the files in load_plan that exist, or only those of tables."""
+    state = {}
+    for filename, table_name, *_ in load_plan:
+        file_path = Path(data_dir) / filename
+        if (tables is None or table_name in tables) and file_path.exists():
+            state[table_name] = (filename, file_fingerprint(file_path))
+    return state
+
+
+def record_file_state(engine, state, forget=()):
+    """
+    Store file fingerprints ({table: (file_name, file_hash)}) in
+    gtfs_load_state and write a new feed_version, in one transaction.
+
+    This is the last step of a load, after every refresh has committed:
+    readers key their caches on feed_version, so it must not change while
+    the derived tables still hold the previous feed. Tables in forget (a
+    full reload that failed and left them empty) lose their stored
+    fingerprint, so the next incremental run counts them as changed.
+    """
+    with engine.begin() as conn:
+        for table_name in forget:
+            conn.execute(text(f"DELETE FROM {STATE_TABLE} WHERE table_name = :table_name"),
+                         {'table_name': table_name})
+        for table_name, (file_name, file_hash) in state.items():
+            save_fingerprint(conn, table_name, file_name, file_hash)
+        conn.execute(text(f"""
+            INSERT INTO {VERSION_TABLE} (id, version, loaded_at)
+            SELECT TRUE, COALESCE((SELECT feed_version FROM feed_info LIMIT 1), '') || ':' || NOW()::text, NOW()
+            ON CONFLICT (id) DO UPDATE
+            SET version = EXCLUDED.version,
+                loaded_at = EXCLUDED.loaded_at
+        """))
+
+
+def key_match(left, right, key_columns):
+    return " AND ".join(f'{left}."{col}" = {right}."{col}"' for col in key_columns)
+
+
+def row_hash(alias, columns):
+    """md5 fingerprint of a row; identical values in identical types give identical hashes."""
+    column_list = ", ".join(f'{alias}."{col}"' for col in columns)
+    return f"md5(ROW({column_list})::text)"
+
+
+def stage_incoming(cursor, file_path, table_name, foreign_keys, loaded_tables):
+    """
+    Stage a GTFS file and build incoming_<table>: typed rows plus a row_hash.
+
+    Rows with a foreign key value missing from a referenced table are
+    dropped, like the FK filter of the full reload.
+    """
+    staging_table = f"staging_{table_name}"
+    incoming_table = f"incoming_{table_name}"
+
+    csv_columns = read_csv_header(file_path)
+    column_types = get_column_types(cursor, table_name)
+    columns = [col for col in csv_columns if col in column_types]
+
+    stage_csv(cursor, file_path, staging_table, csv_columns)
+
+    select_list = ", ".join(f'{cast_expression(col, column_types[col])} AS "{col}"' for col in columns)
+    conditions = [fk_condition(col, ref_table, ref_column) for col, ref_table, ref_column in foreign_keys
+                  if col in columns and ref_table in loaded_tables]
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    cursor.execute(f"DROP TABLE IF EXISTS {incoming_table}")
+    cursor.execute(f"CREATE TEMP TABLE {incoming_table} AS SELECT {select_list} FROM {staging_table} s{where}")
+    cursor.execute(f"ALTER TABLE {incoming_table} ADD COLUMN row_hash TEXT")
+    cursor.execute(f"UPDATE {incoming_table} i SET row_hash = {row_hash('i', columns)}")
+    cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    return incoming_table, columns
+
+
+def collect_affected(cursor, table_name, incoming_table, columns, primary_key, affected):
+    """
+    Record the route_ids and stop_ids touched by a table's changes, before applying them.
+
+    Changed rows are those without an identical row (same key and row_hash)
+    on the other side, old and new versions alike, so a trip moving from one
+    route to another marks both routes, and a renamed route marks the stops
+    it serves. Used to refresh only the affected rows of route_stats /
+    stop_stats.
+    """
+    if table_name not in ('routes', 'stops', 'trips', 'stop_times'):
+        return
+
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    target_list = ", ".join(f't."{col}"' for col in columns)
+    if primary_key:
+        new_rows = (
+            f"SELECT {column_list} FROM {incoming_table} i WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {table_name} t WHERE {key_match('t', 'i', primary_key)} "
+            f"AND {row_hash('t', columns)} = i.row_hash)"
+        )
+        old_rows = (
+            f"SELECT {target_list} FROM {table_name} t "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {incoming_table} i WHERE {key_match('t', 'i', primary_key)} "
+            f"AND {row_hash('t', columns)} = i.row_hash)"
+        )
+    else:
+        new_rows = f"SELECT {column_list} FROM {incoming_table}"
+        old_rows = f"SELECT {column_list} FROM {table_name}"
+
+    cursor.execute("DROP TABLE IF EXISTS changed_rows")
+    cursor.execute(f"CREATE TEMP TABLE changed_rows AS {new_rows} UNION ALL {old_rows}")
+
+    queries = []
+    if 'route_id' in columns:
+        queries.append(('route_ids', "SELECT DISTINCT route_id FROM changed_rows"))
+    if 'stop_id' in columns:
+        queries.append(('stop_ids', "SELECT DISTINCT stop_id FROM changed_rows"))
+    if table_name == 'routes':
+        # stop_stats.route_list carries route_short_name
+        queries.append(('stop_ids', "SELECT DISTINCT st.stop_id FROM stop_times st "
+                                    "JOIN trips t ON t.trip_id = st.trip_id "
+                                    "JOIN changed_rows c ON c.route_id = t.route_id"))
+    if table_name == 'trips':
+        queries.append(('stop_ids', "SELECT DISTINCT st.stop_id FROM stop_times st "
+                                    "JOIN changed_rows c ON c.trip_id = st.trip_id"))
+    if table_name == 'stop_times':
+        queries.append(('route_ids', "SELECT DISTINCT t.route_id FROM trips t "
+                                     "JOIN changed_rows c ON c.trip_id = t.trip_id"))
+
+    for key, query in queries:
+        cursor.execute(query)
+        affected[key].update(row[0] for row in cursor.fetchall() if row[0] is not None)
+    cursor.execute("DROP TABLE IF EXISTS changed_rows")
+
+
+def upsert_changed_rows(cursor, table_name, incoming_table, columns, primary_key):
+    """Apply updates (changed row_hash) and inserts (new keys). Returns (inserted, updated)."""
+    column_list = ", ".join(f'"{col}"' for col in columns)
+
+    if not primary_key:
+        # No key to diff on (feed_info): replace the rows wholesale.
+        cursor.execute(f"DELETE FROM {table_name}")
+        cursor.execute(f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM {incoming_table}")
+        return cursor.rowcount, 0
+
+    cursor.execute(f"CREATE INDEX ON {incoming_table} ({', '.join(primary_key)})")
+    cursor.execute(f"ANALYZE {incoming_table}")
+
+    value_columns = [col for col in columns if col not in primary_key]
+    updated = 0
+    if value_columns:
+        assignments = ", ".join(f'"{col}" = i."{col}"' for col in value_columns)
+        cursor.execute(
+            f"UPDATE {table_name} t SET {assignments} FROM {incoming_table} i "
+            f"WHERE {key_match('t', 'i', primary_key)} AND {row_hash('t', columns)} <> i.row_hash"
+        )
+        updated = cursor.rowcount
+
+    cursor.execute(
+        f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM {incoming_table} i "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table_name} t WHERE {key_match('t', 'i', primary_key)})"
+    )
+    return cursor.rowcount, updated
+
+
+def find_removed_rows(cursor, table_name, primary_key, foreign_keys, staged, removed):
+    """
+    Build the condition matching a table's rows to delete, and copy those
+    rows to removed_<table> for the tables referencing it.
+
+    A row goes when it left the feed, or when its parent goes (a removed
+    service takes its trips, and their stop_times, with it). Runs
+    parents-first; returns the condition, or None when no row goes.
+    """
+    conditions = []
+    if table_name in staged and primary_key:
+        conditions.append(f"NOT EXISTS (SELECT 1 FROM {staged[table_name]} i "
+                          f"WHERE {key_match('t', 'i', primary_key)})")
+    for fk_column, ref_table, ref_column in foreign_keys:
+        if ref_table in removed:
+            conditions.append(f'EXISTS (SELECT 1 FROM {removed[ref_table]} r '
+                              f'WHERE r."{ref_column}" = t."{fk_column}")')
+    if not conditions:
+        return None
+
+    condition = " OR ".join(f"({c})" for c in conditions)
+    removed_table = f"removed_{table_name}"
+    cursor.execute(f"DROP TABLE IF EXISTS {removed_table}")
+    cursor.execute(f"CREATE TEMP TABLE {removed_table} AS SELECT t.* FROM {table_name} t WHERE {condition}")
+    if cursor.rowcount == 0:
+        cursor.execute(f"DROP TABLE {removed_table}")
+        return None
+    removed[table_name] = removed_table
+    return condition
+
+
+def delete_removed_rows(cursor, table_name, condition):
+    """Delete the rows find_removed_rows matched; runs children-first, so no foreign key is violated."""
+    cursor.execute(f"DELETE FROM {table_name} t WHERE {condition}")
+    return cursor.rowcount
+
+
+def incremental_reload(engine, data_dir, load_plan):
+    """
+    Apply only what changed in the GTFS feed since the last load, in one transaction.
+
+    Files whose SHA-256 matches gtfs_load_state are skipped. Changed files are
+    staged with COPY and diffed against the table by primary key (from
+    schema.sql) and an md5 row fingerprint, then only the inserts, updates and
+    deletes are applied. Readers keep seeing the previous feed until commit.
+
+    Returns (summary, affected, state): summary is {table: {'inserted',
+    'updated', 'deleted', 'seconds'}} for the changed tables, affected is
+    {'route_ids': set, 'stop_ids': set} for refreshing the feature tables,
+    and state the fingerprints of the changed files, for record_file_state
+    once the refreshes are done.
+    """
+    data_dir = Path(data_dir)
+    schema = parse_schema()
+    plan_tables = [entry[1] for entry in load_plan]
+    order = topological_order(build_dependency_graph(plan_tables, schema))
+    files = {entry[1]: data_dir / entry[0] for entry in load_plan}
+
+    fingerprints = {t: file_fingerprint(p) for t, p in files.items() if p.exists()}
+
+    transactional = engine.execution_options(isolation_level="READ COMMITTED")
+    with transactional.begin() as conn:
+        stored = get_stored_fingerprints(conn)
+        changed = [t for t in order if t in fingerprints and fingerprints[t] != stored.get(t)]
+        affected = {'route_ids': set(), 'stop_ids': set()}
+        if not changed:
+            return {}, affected, {}
+
+        cursor = conn.connection.cursor()
+        summary = {}
+        staged = {}
+
+        # Parents before children: every upserted row can see its parent.
+        for table_name in changed:
+            start = time.perf_counter()
+            table_schema = schema[table_name]
+            incoming_table, columns = stage_incoming(
+                cursor, files[table_name], table_name, table_schema['foreign_keys'], plan_tables
+            )
+            staged[table_name] = incoming_table
+            collect_affected(cursor, table_name, incoming_table, columns, table_schema['primary_key'], affected)
+            inserted, updated = upsert_changed_rows(
+                cursor, table_name, incoming_table, columns, table_schema['primary_key']
+            )
+            summary[table_name] = {
+                'inserted': inserted, 'updated': updated, 'deleted': 0,
+                'seconds': time.perf_counter() - start,
+            }
+
+        # Parents before children: find the rows that left the feed, and
+        # the rows depending on them. Then delete children before parents.
+        removed = {}
+        conditions = {}
+        for table_name in order:
+            table_schema = schema[table_name]
+            condition = find_removed_rows(
+                cursor, table_name, table_schema['primary_key'], table_schema['foreign_keys'], staged, removed
+            )
+            if condition:
+                conditions[table_name] = condition
+
+        # Cascaded deletes (trips of a removed service) touch the feature tables too
+        for removed_table in removed.values():
+            cursor.execute(f"SELECT * FROM {removed_table} LIMIT 0")
+            removed_columns = [col[0] for col in cursor.description]
+            for key, column in (('route_ids', 'route_id'), ('stop_ids', 'stop_id')):
+                if column in removed_columns:
+                    cursor.execute(f'SELECT DISTINCT "{column}" FROM {removed_table}')
+                    affected[key].update(row[0] for row in cursor.fetchall() if row[0] is not None)
+
+        for table_name in reversed(order):
+            if table_name not in conditions:
+                continue
+            start = time.perf_counter()
+            deleted = delete_removed_rows(cursor, table_name, conditions[table_name])
+            entry = summary.setdefault(table_name, {'inserted': 0, 'updated': 0, 'deleted': 0, 'seconds': 0.0})
+            entry['deleted'] += deleted
+            entry['seconds'] += time.perf_counter() - start
+
+        for temp_table in [*staged.values(), *removed.values()]:
+            cursor.execute(f"DROP TABLE IF EXISTS {temp_table}")
+        cursor.close()
+
+    state = {t: (files[t].name, fingerprints[t]) for t in changed}
+    return summary, affected, state
+
+
+def print_incremental_report(summary, load_plan):
+    """Print inserted/updated/deleted counts per table, and which tables were skipped."""
+    print(f"{'Table':<16}{'Inserted':>10}{'Updated':>10}{'Deleted':>10}{'Seconds':>10}")
+    print("-" * 56)
+    for _, table_name, *_ in load_plan:
+        if table_name in summary:
+            s = summary[table_name]
+            print(f"{table_name:<16}{s['inserted']:>10,}{s['updated']:>10,}{s['deleted']:>10,}{s['seconds']:>10.2f}")
+        else:
+            print(f"{table_name:<16}{'unchanged, skipped':>40}")
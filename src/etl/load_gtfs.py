@@ -1,24 +1,49 @@
 import pandas as pd
-from sqlalchemy import create_engine, text
-import yaml
+from dataclasses import dataclass
+from sqlalchemy import text
 from pathlib import Path
-from urllib.parse import quote_plus
+
+from src.database.connection import get_engine
+from src.database.instrumentation import print_run_summary, timed_step
+from src.etl.copy_loader import copy_gtfs_file, print_throughput_report
+from src.etl.chunked_loader import load_gtfs_file_chunked, DEFAULT_CHUNK_SIZE
+from src.etl.feature_refresh import refresh_feature_tables
+from src.etl.feed_cache import write_feed_cache
+from src.etl.fk_index import ForeignKeyIndex, format_fk_report
+from src.etl.incremental import incremental_reload, file_state, record_file_state, print_incremental_report
+from src.etl.service_calendar import refresh_service_dates
+from src.etl.shape_geometry import refresh_shape_geometry
+from src.etl.scheduler import build_dependency_graph, run_dependency_graph, print_schedule_report
+from src.etl.schema_parser import parse_schema
 
 project_root = Path(__file__).parent.parent.parent
 data_dir = project_root / 'data' / 'raw' / 'gtfs_static'
-config_path = project_root / "config" / "database.yml"
 
-with open(config_path, 'r') as file:
-    config = yaml.safe_load(file)
-db_config = config['database']
+# 'copy' streams each CSV through COPY ... FROM STDIN into a staging table,
+# 'chunked' reads each CSV in CHUNK_SIZE-row pieces with explicit dtypes and
+# COPYs every chunk before reading the next (flat memory for huge feeds),
+# 'to_sql' is the original pandas path (row-batched INSERTs),
+# 'incremental' skips the TRUNCATE and applies only the rows that changed
+# since the last load, for files whose fingerprint changed, in one transaction.
+LOAD_MODE = 'copy'
+CHUNK_SIZE = DEFAULT_CHUNK_SIZE
+
+# Load tables that don't reference each other at the same time, following the
+# foreign keys in sql/schema.sql. LOAD_WORKERS tables run concurrently, each on
+# its own pooled connection (keep it within the pool size in database.yml).
+# Only 'copy' and 'chunked' load in parallel ('chunked' streams each table in
+# its own worker thread); 'to_sql' needs PARALLEL_LOAD = False.
+PARALLEL_LOAD = True
+LOAD_WORKERS = 4
 
-encoded_password = quote_plus(db_config['password'])
+# Also write the feed as typed Parquet to data/processed/gtfs_cache, so the
+# analyses can read it without going through the database.
+WRITE_FEED_CACHE = True
 
-connection_string = (
-    f"postgresql://{db_config['user']}:{encoded_password}"
-    f"@{db_config['host']}:{db_config['port']}/{db_config['database']}"
-)
-engine = create_engine(connection_string, isolation_level="AUTOCOMMIT")
+# Tables each derived stage is built from; an incremental reload reruns a
+# stage only when one of them changed
+SERVICE_DATE_SOURCES = {'calendar', 'calendar_dates', 'trips'}
+SHAPE_GEOMETRY_SOURCES = {'shapes', 'trips', 'stop_times'}
 
 tables_to_clear = [
     'stop_times', 'calendar_dates', 'trips', 
@@ -26,13 +51,50 @@ tables_to_clear = [
     'feed_info', 'agency'
 ]
 
-with engine.connect() as conn:
-    for table in tables_to_clear:
-        conn.execute(text(f"TRUNCATE TABLE {table} CASCADE"))
-        conn.commit()
-        print(f"  ✓ Cleared {table}")
 
-def load_gtfs_file(filename, table_name):
+@dataclass
+class LoadContext:
+    """What every loader needs for one run"""
+    engine: object
+    schema: dict               # parsed sql/schema.sql (foreign keys)
+    fk_index: ForeignKeyIndex  # key sets of the tables parsed so far in this run
+    table_columns: dict        # {table: [columns]} from information_schema
+
+
+def get_all_table_columns(engine):
+    """Columns of every public table, from a single information_schema query"""
+    with engine.connect() as conn:
+        result = conn.execute(
+            text("SELECT table_name, column_name FROM information_schema.columns "
+                 "WHERE table_schema = 'public' ORDER BY ordinal_position")
+        )
+        columns = {}
+        for table_name, column_name in result:
+            columns.setdefault(table_name, []).append(column_name)
+        return columns
+
+
+def create_load_context():
+    # The loaders commit per table (and COPY manages its own transactions)
+    engine = get_engine().execution_options(isolation_level="AUTOCOMMIT")
+    schema = parse_schema()
+    return LoadContext(
+        engine=engine,
+        schema=schema,
+        fk_index=ForeignKeyIndex(schema),
+        table_columns=get_all_table_columns(engine),
+    )
+
+
+def clear_tables(engine):
+    with engine.connect() as conn:
+        for table in tables_to_clear:
+            conn.execute(text(f"TRUNCATE TABLE {table} CASCADE"))
+            conn.commit()
+            print(f"  ✓ Cleared {table}")
+
+
+def load_gtfs_file(ctx, filename, table_name):
     file_path = data_dir / filename
     
     try:
@@ -46,27 +108,24 @@ def load_gtfs_file(filename, table_name):
             if col in df.columns:
                 df[col] = pd.to_datetime(df[col], format='%Y%m%d', errors='coerce')
         
-        # Get the columns that exist in the database table
-        with engine.connect() as conn:
-            result = conn.execute(
-                text(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{table_name}'")
-            )
-            db_columns = [row[0] for row in result]
-        
         # Only keep columns that exist in both the CSV and the database
+        db_columns = ctx.table_columns.get(table_name, [])
         columns_to_insert = [col for col in df.columns if col in db_columns]
         df_filtered = df[columns_to_insert]
         
         # Load into PostgreSQL
         df_filtered.to_sql(
             table_name,
-            engine,
+            ctx.engine,
             if_exists='append',
             index=False,
             chunksize=1000
         )
+        ctx.fk_index.add_keys(table_name, df_filtered)
         
         print(f"✓ Loaded {len(columns_to_insert)} columns into {table_name}.")
+        print()
+        return True
     
     except FileNotFoundError:
         print(f"✗ File not found: {file_path}")
@@ -75,15 +134,14 @@ def load_gtfs_file(filename, table_name):
         print(f"✗ Error: {e}")
     
     print()
+    return False
 
-def load_gtfs_file_with_validation(filename, table_name, fk_column=None, fk_table=None, fk_ref_column=None):
+def load_gtfs_file_with_validation(ctx, filename, table_name):
     """
-    Load GTFS file with optional foreign key validation
-    
-    Parameters:
-    - fk_column: column in this table that references another table
-    - fk_table: the table being referenced
-    - fk_ref_column: the column in the referenced table
+    Load GTFS file, dropping rows that break any foreign key in schema.sql
+
+    Referenced keys come from fk_index (the tables parsed earlier in this
+    run), so no SELECT is needed to validate.
     """
     file_path = data_dir / filename
     
@@ -103,40 +161,30 @@ def load_gtfs_file_with_validation(filename, table_name, fk_column=None, fk_tabl
             if col in df.columns:
                 df[col] = df[col].astype(str)
         
-        # Validate foreign keys if specified
-        if fk_column and fk_table and fk_ref_column:
-            with engine.connect() as conn:
-                result = conn.execute(text(f"SELECT {fk_ref_column} FROM {fk_table}"))
-                valid_values = set(row[0] for row in result)
-            
-            initial_count = len(df)
-            df = df[df[fk_column].isin(valid_values)]
-            filtered_count = initial_count - len(df)
-            
-            if filtered_count > 0:
-                print(f"Filtered {filtered_count} invalid rows.", end=" ")
-        
-        # Get database columns
-        with engine.connect() as conn:
-            result = conn.execute(
-                text(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{table_name}'")
-            )
-            db_columns = [row[0] for row in result]
+        # Validate every declared foreign key against the in-memory index
+        df, fk_report = ctx.fk_index.filter(table_name, df)
+        message = format_fk_report(fk_report)
+        if message:
+            print(message, end=" ")
         
         # Filter columns
+        db_columns = ctx.table_columns.get(table_name, [])
         columns_to_insert = [col for col in df.columns if col in db_columns]
         df_filtered = df[columns_to_insert]
         
         # Load into PostgreSQL
         df_filtered.to_sql(
             table_name,
-            engine,
+            ctx.engine,
             if_exists='append',
             index=False,
             chunksize=1000
         )
+        ctx.fk_index.add_keys(table_name, df_filtered)
         
         print(f"✓ Loaded {len(df_filtered)} rows, {len(columns_to_insert)} columns into {table_name}.")
+        print()
+        return True
     
     except FileNotFoundError:
         print(f"✗ File not found: {file_path}")
@@ -145,20 +193,265 @@ def load_gtfs_file_with_validation(filename, table_name, fk_column=None, fk_tabl
         print(f"✗ Error: {e}")
     
     print()
+    return False
+
+def load_gtfs_file_copy(ctx, filename, table_name, validate=False):
+    """
+    Load GTFS file through COPY into a staging table, then INSERT ... SELECT
+
+    With validate, rows breaking a foreign key in schema.sql are skipped in
+    the same INSERT ... SELECT (PostgreSQL does the parsing here, so the
+    check runs in the database rather than against fk_index).
+    """
+    file_path = data_dir / filename
+
+    try:
+        print(f"Loading {filename}...", end=" ")
+        foreign_keys = ctx.schema[table_name]['foreign_keys'] if validate else None
+        result = copy_gtfs_file(ctx.engine, file_path, table_name, foreign_keys)
+        print(f"Read {result['rows_read']} rows from CSV.", end=" ")
+
+        filtered_count = result['rows_read'] - result['rows_loaded']
+        if filtered_count > 0:
+            print(f"Filtered {filtered_count} invalid rows.", end=" ")
+
+        print(f"✓ Loaded {result['rows_loaded']} rows, {result['columns']} columns into {table_name} "
+              f"({result['rows_per_sec']:,.0f} rows/sec).")
+        print()
+        return result
+
+    except FileNotFoundError:
+        print(f"✗ File not found: {file_path}")
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+
+    print()
+    return None
+
+
+def load_gtfs_file_streaming(ctx, filename, table_name, validate=False):
+    """
+    Load GTFS file in fixed-size chunks with bounded memory
+
+    Date conversion and foreign key filtering are applied to each chunk,
+    and each chunk is written before the next one is read.
+    """
+    file_path = data_dir / filename
+
+    try:
+        print(f"Loading {filename}...", end=" ")
+        result = load_gtfs_file_chunked(ctx.engine, file_path, table_name,
+                                        ctx.table_columns.get(table_name, []),
+                                        CHUNK_SIZE, ctx.fk_index, validate)
+        print(f"Read {result['rows_read']} rows in {result['chunks']} chunks.", end=" ")
+
+        message = format_fk_report(result['fk_report'])
+        if message:
+            print(message, end=" ")
+
+        print(f"✓ Loaded {result['rows_loaded']} rows, {result['columns']} columns into {table_name} "
+              f"({result['rows_per_sec']:,.0f} rows/sec).")
+        print()
+        return result
+
+    except FileNotFoundError:
+        print(f"✗ File not found: {file_path}")
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+
+    print()
+    return None
+
+
+# (filename, table_name, validate foreign keys) in load order
+load_plan = [
+    ('agency.txt', 'agency', False),
+    ('calendar.txt', 'calendar', False),  # ← MUST be here (not calendar_dates!)
+    ('routes.txt', 'routes', False),
+    ('stops.txt', 'stops', False),
+    ('shapes.txt', 'shapes', False),
+    ('trips.txt', 'trips', True),
+    ('stop_times.txt', 'stop_times', True),
+    ('calendar_dates.txt', 'calendar_dates', True),
+    ('feed_info.txt', 'feed_info', False),
+]
+
+
+def load_table_task(ctx, filename, table_name, validate=False):
+    """
+    Load one table for the parallel scheduler and print a one-line summary
+
+    'copy' lets PostgreSQL parse the file; 'chunked' streams it through
+    load_gtfs_file_chunked in this worker thread, so memory stays bounded by
+    CHUNK_SIZE per table being loaded.
+    """
+    file_path = data_dir / filename
+    if not file_path.exists():
+        print(f"✗ File not found: {file_path}")
+        return None
+
+    fk_message = ""
+    # Runs on a scheduler thread: name the step it belongs to
+    with timed_step(f"load {table_name}", parent="load tables"):
+        if LOAD_MODE == 'copy':
+            foreign_keys = ctx.schema[table_name]['foreign_keys'] if validate else None
+            result = copy_gtfs_file(ctx.engine, file_path, table_name, foreign_keys)
+            filtered_count = result['rows_read'] - result['rows_loaded']
+            if filtered_count > 0:
+                fk_message = f" Filtered {filtered_count} invalid rows."
+        else:
+            result = load_gtfs_file_chunked(ctx.engine, file_path, table_name,
+                                            ctx.table_columns.get(table_name, []),
+                                            CHUNK_SIZE, ctx.fk_index, validate)
+            if result['fk_report']:
+                fk_message = " " + format_fk_report(result['fk_report'])
+
+    print(f"✓ Loaded {result['rows_loaded']} rows into {table_name} "
+          f"({result['rows_per_sec']:,.0f} rows/sec).{fk_message}")
+    return result
+
+
+def run_sequential(ctx):
+    """Load the tables one by one; returns (throughput results, tables loaded)."""
+    throughput = []
+    loaded = set()
+    for filename, table_name, validate in load_plan:
+        with timed_step(f"load {table_name}"):
+            if LOAD_MODE == 'copy':
+                result = load_gtfs_file_copy(ctx, filename, table_name, validate)
+                if result:
+                    throughput.append(result)
+            elif LOAD_MODE == 'chunked':
+                result = load_gtfs_file_streaming(ctx, filename, table_name, validate)
+                if result:
+                    throughput.append(result)
+            elif validate:
+                result = load_gtfs_file_with_validation(ctx, filename, table_name)
+            else:
+                result = load_gtfs_file(ctx, filename, table_name)
+        if result:
+            loaded.add(table_name)
+    return throughput, loaded
+
+
+def run_parallel(ctx):
+    """Load the tables following the FK graph; returns (throughput results, tables loaded)."""
+    if LOAD_MODE not in ('copy', 'chunked'):
+        raise ValueError(f"LOAD_MODE {LOAD_MODE!r} has no parallel loader; "
+                         f"use 'copy' or 'chunked', or set PARALLEL_LOAD = False")
+
+    throughput = []
+    loaded = set()
+    plan_by_table = {entry[1]: entry for entry in load_plan}
+    graph = build_dependency_graph(list(plan_by_table), ctx.schema)
+
+    tasks = {
+        table_name: (lambda entry=entry: load_table_task(ctx, *entry))
+        for table_name, entry in plan_by_table.items()
+    }
+    timings = run_dependency_graph(graph, tasks, max_workers=LOAD_WORKERS)
+
+    for table_name, t in timings.items():
+        if t['error'] is not None:
+            print(f"✗ Error loading {table_name}: {t['error']}")
+        elif t['result']:
+            throughput.append(t['result'])
+            loaded.add(table_name)
+    print()
+    print("Load schedule:")
+    print_schedule_report(graph, timings)
+    print()
+    return throughput, loaded
+
+
+def main():
+    ctx = create_load_context()
+
+    throughput = []
+    affected = None
+    changed = None   # tables changed by an incremental reload; None = all
+    failed = []
+    if LOAD_MODE == 'incremental':
+        print("Incremental reload...")
+        with timed_step("incremental reload"):
+            summary, affected, state = incremental_reload(ctx.engine, data_dir, load_plan)
+        changed = set(summary)
+        if summary:
+            print_incremental_report(summary, load_plan)
+        else:
+            print("✓ Feed unchanged since last load, nothing to do.")
+        print()
+    else:
+        with timed_step("clear tables"):
+            clear_tables(ctx.engine)
+        with timed_step("load tables"):
+            throughput, loaded = run_parallel(ctx) if PARALLEL_LOAD else run_sequential(ctx)
+        # Only tables that actually loaded get a fingerprint; the rest are
+        # reloaded by the next incremental run instead of being skipped
+        state = file_state(data_dir, load_plan, loaded)
+        failed = [table for _, table, _ in load_plan if table not in loaded]
+        if failed:
+            print(f"✗ Not loaded, left out of the load state: {', '.join(failed)}")
+            print()
+
+    # Refresh the summary tables behind the feature views (feature_queries.sql):
+    # everything after a full load, only the touched routes/stops otherwise.
+    print("Refreshing feature tables...", end=" ")
+    with timed_step("refresh feature tables"):
+        if affected is not None:
+            refreshed = refresh_feature_tables(ctx.engine, affected['route_ids'], affected['stop_ids'])
+        else:
+            refreshed = refresh_feature_tables(ctx.engine)
+    if refreshed:
+        print("✓ " + ", ".join(f"{table}: {rows:,} rows in {seconds:.2f}s"
+                               for table, (rows, seconds) in refreshed.items()))
+    else:
+        print("✓ Nothing affected.")
+    print()
+
+    if changed is None or changed & SERVICE_DATE_SOURCES:
+        print("Expanding service calendar...", end=" ")
+        with timed_step("expand service calendar"):
+            rows, seconds = refresh_service_dates(ctx.engine)
+        print(f"✓ {rows:,} service days in {seconds:.2f}s")
+        print()
+
+    if changed is None or changed & SHAPE_GEOMETRY_SOURCES:
+        print("Building shape geometry...", end=" ")
+        with timed_step("build shape geometry"):
+            shapes, offsets, seconds = refresh_shape_geometry(ctx.engine)
+        print(f"✓ {shapes:,} shapes, {offsets:,} stop offsets in {seconds:.2f}s")
+        print()
+
+    if WRITE_FEED_CACHE:
+        print("Writing Parquet feed cache...", end=" ")
+        with timed_step("write feed cache"):
+            written = write_feed_cache(data_dir)
+        if written:
+            print(f"✓ Cached {len(written)} tables ({written.get('stop_times', 0):,} stop_times rows).")
+        else:
+            print("✓ Cache already up to date.")
+        print()
+
+    # Last, once every refresh has committed: the new feed_version is what
+    # the API and dashboard caches key on, so it must not appear earlier
+    if state or failed:
+        with timed_step("record file state"):
+            record_file_state(ctx.engine, state, forget=failed)
+
+    if throughput:
+        print("Load throughput:")
+        print_throughput_report(throughput)
+        print()
+
+    print_run_summary()
+
+    print("=" * 50)
+    print("✓ All data committed successfully!")
+    print("=" * 50)
+
 
-load_gtfs_file('agency.txt', 'agency')
-load_gtfs_file('calendar.txt', 'calendar')  # ← MUST be here (not calendar_dates!)
-load_gtfs_file('routes.txt', 'routes')
-load_gtfs_file('stops.txt', 'stops')
-load_gtfs_file('shapes.txt', 'shapes')
-load_gtfs_file_with_validation('trips.txt', 'trips', fk_column='service_id', fk_table='calendar', fk_ref_column='service_id')
-load_gtfs_file_with_validation('stop_times.txt', 'stop_times', fk_column='trip_id', fk_table='trips', fk_ref_column='trip_id')
-load_gtfs_file_with_validation('calendar_dates.txt', 'calendar_dates', fk_column='service_id', fk_table='calendar', fk_ref_column='service_id')
-load_gtfs_file('feed_info.txt', 'feed_info')
-
-print("=" * 50)
-print("Committing data to database...")
-with engine.connect() as conn:
-    conn.commit()
-print("✓ All data committed successfully!")
-print("=" * 50)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from src.database.connection import get_engine
+
+PARTITIONED_TABLES = ['vehicle_positions', 'trip_updates']
+
+# Days of raw rows kept per table; older partitions are dropped (trip_updates
+# partitions are rolled up into trip_delay_summary first)
+RETENTION_DAYS = {
+    'vehicle_positions': 7,
+    'trip_updates': 14,
+}
+
+# Partitions created ahead of today, so the ingester never writes into the
+# default partition around midnight
+DAYS_AHEAD = 3
+
+PARTITION_PATTERN = re.compile(r'_p(\d{8})$')
+
+ROLLUP_QUERY = """
+INSERT INTO trip_delay_summary (
+    service_date, trip_id, route_id, stops_reported, updates_received,
+    avg_arrival_delay, max_arrival_delay, min_arrival_delay, final_arrival_delay,
+    first_update, last_update
+)
+WITH final_predictions AS (
+    -- The last prediction received for each stop is the closest to what happened
+    SELECT DISTINCT ON (trip_id, stop_id)
+        trip_id, route_id, stop_id, arrival_delay, timestamp
+    FROM {partition}
+    WHERE trip_id IS NOT NULL
+    ORDER BY trip_id, stop_id, timestamp DESC
+),
+per_trip AS (
+    SELECT
+        trip_id,
+        COUNT(*) as updates_received,
+        MIN(timestamp) as first_update,
+        MAX(timestamp) as last_update
+    FROM {partition}
+    WHERE trip_id IS NOT NULL
+    GROUP BY trip_id
+)
+SELECT
+    CAST(:service_date AS DATE),
+    fp.trip_id,
+    MAX(fp.route_id),
+    COUNT(*),
+    MAX(pt.updates_received),
+    ROUND(AVG(fp.arrival_delay)::numeric, 2),
+    MAX(fp.arrival_delay),
+    MIN(fp.arrival_delay),
+    (ARRAY_AGG(fp.arrival_delay ORDER BY fp.timestamp DESC))[1],
+    MAX(pt.first_update),
+    MAX(pt.last_update)
+FROM final_predictions fp
+JOIN per_trip pt ON fp.trip_id = pt.trip_id
+GROUP BY fp.trip_id
+ON CONFLICT (service_date, trip_id) DO UPDATE SET
+    route_id = EXCLUDED.route_id,
+    stops_reported = EXCLUDED.stops_reported,
+    updates_received = EXCLUDED.updates_received,
+    avg_arrival_delay = EXCLUDED.avg_arrival_delay,
+    max_arrival_delay = EXCLUDED.max_arrival_delay,
+    min_arrival_delay = EXCLUDED.min_arrival_delay,
+    final_arrival_delay = EXCLUDED.final_arrival_delay,
+    first_update = EXCLUDED.first_update,
+    last_update = EXCLUDED.last_update;
+"""
+
+
+def partition_name(table_name, day):
+    return f"{table_name}_p{day:%Y%m%d}"
+
+
+def list_partitions(conn, table_name):
+    """Daily partitions of table_name as {date: partition_name} (default partition excluded)."""
+    rows = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table_name
+    """), {'table_name': table_name}).scalars()
+
+    partitions = {}
+    for name in rows:
+        match = PARTITION_PATTERN.search(name)
+        if match:
+            partitions[datetime.strptime(match.group(1), '%Y%m%d').date()] = name
+    return partitions
+
+
+def ensure_partitions(engine, days_ahead=DAYS_AHEAD, today=None):
+    """
+    Create the daily partitions from yesterday through today + days_ahead.
+
+    Returns the names of partitions created. A day whose rows already sit in
+    the default partition can't be attached; it is reported and skipped.
+    """
+    today = today or date.today()
+    created = []
+    for table_name in PARTITIONED_TABLES:
+        with engine.begin() as conn:
+            existing = list_partitions(conn, table_name)
+        for offset in range(-1, days_ahead + 1):
+            day = today + timedelta(days=offset)
+            if day in existing:
+                continue
+            name = partition_name(table_name, day)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} "
+                        f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+                    ))
+                created.append(name)
+            except Exception as e:
+                print(f"✗ Could not create {name}: {e}")
+    return created
+
+
+def rollup_partition(conn, partition, day):
+    """Summarize one trip_updates partition into trip_delay_summary. Returns trips written."""
+    result = conn.execute(text(ROLLUP_QUERY.format(partition=partition)), {'service_date': day})
+    return result.rowcount
+
+
+def drop_expired_partitions(engine, retention_days=RETENTION_DAYS, today=None):
+    """
+    Drop daily partitions older than each table's retention.
+
+    trip_updates partitions are rolled up into trip_delay_summary in the same
+    transaction as the DROP, so a failed rollup keeps the raw rows.
+
+    Returns [(partition, trips_rolled_up or None)].
+    """
+    today = today or date.today()
+    dropped = []
+    for table_name in PARTITIONED_TABLES:
+        cutoff = today - timedelta(days=retention_days[table_name])
+        with engine.begin() as conn:
+            partitions = list_partitions(conn, table_name)
+        for day, name in sorted(partitions.items()):
+            if day >= cutoff:
+                continue
+            with engine.begin() as conn:
+                rolled_up = None
+                if table_name == 'trip_updates':
+                    rolled_up = rollup_partition(conn, name, day)
+                conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append((name, rolled_up))
+    return dropped
+
+
+def rollup_recent(engine, days=1, today=None):
+    """
+    (Re)build trip_delay_summary for the last completed days, so summaries
+    are available long before the raw partitions expire. Idempotent.
+    """
+    today = today or date.today()
+    rolled_up = {}
+    with engine.begin() as conn:
+        partitions = list_partitions(conn, 'trip_updates')
+    for offset in range(1, days + 1):
+        day = today - timedelta(days=offset)
+        if day in partitions:
+            with engine.begin() as conn:
+                rolled_up[partitions[day]] = rollup_partition(conn, partitions[day], day)
+    return rolled_up
+
+
+def run_maintenance(engine=None, today=None):
+    """Create upcoming partitions, roll up yesterday, drop expired partitions."""
+    engine = engine or get_engine()
+    start = time.perf_counter()
+    created = ensure_partitions(engine, today=today)
+    rolled_up = rollup_recent(engine, today=today)
+    dropped = drop_expired_partitions(engine, today=today)
+    return {
+        'created': created,
+        'rolled_up': rolled_up,
+        'dropped': dropped,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def main():
+    print("Maintaining real-time partitions...")
+    summary = run_maintenance()
+    for name in summary['created']:
+        print(f"  ✓ Created {name}")
+    for name, trips in summary['rolled_up'].items():
+        print(f"  ✓ Rolled up {name}: {trips:,} trips")
+    for name, trips in summary['dropped']:
+        suffix = f" (rolled up {trips:,} trips)" if trips is not None else ""
+        print(f"  ✓ Dropped {name}{suffix}")
+    print(f"Done in {summary['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
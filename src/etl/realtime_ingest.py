@@ -0,0 +1,404 @@
+import asyncio
+import time
+import urllib.request
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from google.transit import gtfs_realtime_pb2
+
+from src.database.connection import get_engine
+from src.etl.copy_loader import copy_dataframe
+from src.etl.partitions import ensure_partitions
+
+project_root = Path(__file__).parent.parent.parent
+feed_dir = project_root / 'data' / 'raw' / 'gtfs_realtime'
+
+# Where snapshots come from: a URL (the live feed, or a local stand-in such as
+# `python -m http.server` serving a saved VehiclePositions.pb), or, when
+# FEED_URL is None, every new *.pb file dropped into feed_dir.
+FEED_URL = None
+POLL_INTERVAL = 5.0
+
+# Rows are COPYed in micro-batches of up to BATCH_SIZE rows, or whatever has
+# arrived after BATCH_TIMEOUT seconds. Queues are bounded: when the database
+# falls behind, decoding waits, and then fetching waits, instead of memory
+# growing without limit.
+BATCH_SIZE = 5000
+BATCH_TIMEOUT = 0.5
+SNAPSHOT_QUEUE_SIZE = 8
+ROW_QUEUE_SIZE = 64
+
+POSITION_COLUMNS = [
+    'vehicle_id', 'trip_id', 'route_id', 'position_lat', 'position_lon',
+    'bearing', 'speed', 'timestamp', 'geom',
+]
+TRIP_UPDATE_COLUMNS = [
+    'trip_id', 'route_id', 'stop_id', 'arrival_delay', 'departure_delay', 'timestamp',
+]
+
+
+class StageMetrics:
+    """Count, throughput and latency percentiles for one pipeline stage."""
+
+    def __init__(self, window=10_000):
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds, items=1):
+        self.calls += 1
+        self.items += items
+        self.seconds += seconds
+        self.latencies.append(seconds)
+
+    def summary(self):
+        latencies = np.array(self.latencies) * 1000
+        return {
+            'calls': self.calls,
+            'items': self.items,
+            'items_per_sec': self.items / self.seconds if self.seconds else 0.0,
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            'p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            'max_ms': float(latencies.max()) if len(latencies) else 0.0,
+        }
+
+
+class IngestMetrics:
+    """
+    Per-stage metrics for the ingestion pipeline.
+
+    Stages: fetch (snapshot bytes), decode (protobuf -> rows), dedupe,
+    write (COPY + commit) and end_to_end (snapshot fetched -> rows committed).
+    """
+
+    STAGES = ['fetch', 'decode', 'dedupe', 'write', 'end_to_end']
+
+    def __init__(self):
+        self.stages = {stage: StageMetrics() for stage in self.STAGES}
+        self.started = time.perf_counter()
+        self.rows_written = {'vehicle_positions': 0, 'trip_updates': 0}
+        self.rows_skipped = 0
+
+    def record(self, stage, seconds, items=1):
+        self.stages[stage].record(seconds, items)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        lines = [f"{'stage':<12} {'calls':>8} {'items':>10} {'items/s':>10} "
+                 f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"]
+        for stage, metrics in self.stages.items():
+            s = metrics.summary()
+            lines.append(f"{stage:<12} {s['calls']:>8,} {s['items']:>10,} {s['items_per_sec']:>10,.0f} "
+                         f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['max_ms']:>8.1f}")
+        total = sum(self.rows_written.values())
+        lines.append(f"{total:,} rows written in {elapsed:.1f}s "
+                     f"({total / elapsed if elapsed else 0:,.0f} rows/sec), "
+                     f"{self.rows_skipped:,} unchanged positions skipped")
+        return "\n".join(lines)
+
+
+def decode_feed(payload):
+    """
+    Decode one GTFS-RT FeedMessage into (vehicle_positions, trip_updates) frames.
+
+    geom is built here as EWKT, so the database doesn't run a trigger per row.
+    """
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(payload)
+    header_timestamp = feed.header.timestamp
+
+    positions = {col: [] for col in POSITION_COLUMNS[:-1]}
+    updates = {col: [] for col in TRIP_UPDATE_COLUMNS}
+    for entity in feed.entity:
+        if entity.HasField('vehicle') and entity.vehicle.HasField('position'):
+            vehicle = entity.vehicle
+            positions['vehicle_id'].append(vehicle.vehicle.id or entity.id)
+            positions['trip_id'].append(vehicle.trip.trip_id or None)
+            positions['route_id'].append(vehicle.trip.route_id or None)
+            positions['position_lat'].append(vehicle.position.latitude)
+            positions['position_lon'].append(vehicle.position.longitude)
+            positions['bearing'].append(vehicle.position.bearing if vehicle.position.HasField('bearing') else None)
+            positions['speed'].append(vehicle.position.speed if vehicle.position.HasField('speed') else None)
+            positions['timestamp'].append(vehicle.timestamp or header_timestamp)
+
+        if entity.HasField('trip_update'):
+            trip_update = entity.trip_update
+            timestamp = trip_update.timestamp or header_timestamp
+            for stop_time_update in trip_update.stop_time_update:
+                updates['trip_id'].append(trip_update.trip.trip_id or None)
+                updates['route_id'].append(trip_update.trip.route_id or None)
+                updates['stop_id'].append(stop_time_update.stop_id or None)
+                updates['arrival_delay'].append(
+                    stop_time_update.arrival.delay if stop_time_update.HasField('arrival') else None)
+                updates['departure_delay'].append(
+                    stop_time_update.departure.delay if stop_time_update.HasField('departure') else None)
+                updates['timestamp'].append(timestamp)
+
+    df_positions = pd.DataFrame(positions)
+    if len(df_positions):
+        df_positions['bearing'] = df_positions['bearing'].astype('Float64')
+        df_positions['speed'] = df_positions['speed'].astype('Float64')
+        df_positions['timestamp'] = pd.to_datetime(df_positions['timestamp'], unit='s')
+        df_positions['geom'] = (
+            "SRID=4326;POINT(" + df_positions['position_lon'].round(7).astype(str) + " "
+            + df_positions['position_lat'].round(7).astype(str) + ")"
+        )
+    else:
+        df_positions = pd.DataFrame(columns=POSITION_COLUMNS)
+
+    df_updates = pd.DataFrame(updates)
+    if len(df_updates):
+        df_updates['arrival_delay'] = df_updates['arrival_delay'].astype('Int32')
+        df_updates['departure_delay'] = df_updates['departure_delay'].astype('Int32')
+        df_updates['timestamp'] = pd.to_datetime(df_updates['timestamp'], unit='s')
+
+    return df_positions, df_updates
+
+
+class PositionDeduplicator:
+    """
+    Drop vehicle positions that aren't newer than the vehicle's last report.
+
+    Feeds are polled faster than vehicles report, so most snapshots repeat
+    the previous fix, and a snapshot can hold an older fix of a vehicle
+    next to its latest one. A row is kept when the vehicle is new or its
+    timestamp is later than the latest timestamp kept for the vehicle.
+    """
+
+    def __init__(self):
+        self.last = pd.Series(dtype='datetime64[ns]', name='timestamp')
+
+    def filter(self, df):
+        if len(df) == 0:
+            return df
+        df = df.drop_duplicates(subset=['vehicle_id', 'timestamp', 'position_lat', 'position_lon'])
+        previous = self.last.reindex(df['vehicle_id']).to_numpy()
+        timestamps = df['timestamp'].to_numpy()
+        newer = pd.isna(previous) | (timestamps > previous)
+        changed = df[newer]
+
+        latest = changed.groupby('vehicle_id')['timestamp'].max()
+        self.last = pd.concat([self.last[~self.last.index.isin(latest.index)], latest])
+        return changed
+
+
+class TripUpdateDeduplicator:
+    """
+    Drop stop-time updates whose (trip, stop, delays, timestamp) was already written.
+
+    Row hashes live in one sorted uint64 array, probed with searchsorted,
+    and are grouped by the batch that added them; past max_keys the oldest
+    batches are evicted, so the next poll only rewrites what was forgotten.
+    """
+
+    def __init__(self, max_keys=1_000_000):
+        self.max_keys = max_keys
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.generations = deque()
+
+    def seen(self, keys):
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return found
+
+    def filter(self, df):
+        if len(df) == 0:
+            return df
+        keys = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        keep = ~pd.Index(keys).duplicated() & ~self.seen(keys)
+
+        new_keys = np.sort(keys[keep])
+        if len(new_keys) == 0:
+            return df[keep]
+        self.keys = np.insert(self.keys, np.searchsorted(self.keys, new_keys), new_keys)
+        self.generations.append(new_keys)
+        while len(self.keys) > self.max_keys and len(self.generations) > 1:
+            evicted = self.generations.popleft()
+            self.keys = np.delete(self.keys, np.searchsorted(self.keys, evicted))
+        return df[keep]
+
+
+def write_batch(engine, table_name, df):
+    """COPY one micro-batch and commit it. Returns rows written."""
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        copy_dataframe(cursor, df, table_name)
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(df)
+
+
+async def directory_source(path=feed_dir, poll_interval=POLL_INTERVAL, once=False):
+    """Yield (name, bytes) for each new *.pb file in path, oldest first."""
+    path = Path(path)
+    seen = set()
+    while True:
+        new_files = sorted(
+            (p for p in path.glob('*.pb') if p.name not in seen),
+            key=lambda p: p.stat().st_mtime
+        )
+        for file_path in new_files:
+            seen.add(file_path.name)
+            yield file_path.name, await asyncio.to_thread(file_path.read_bytes)
+        if once:
+            return
+        await asyncio.sleep(poll_interval)
+
+
+async def http_source(url, poll_interval=POLL_INTERVAL, once=False):
+    """Yield (url, bytes) every poll_interval seconds from a GTFS-RT endpoint."""
+    def fetch():
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return response.read()
+
+    while True:
+        started = time.perf_counter()
+        yield url, await asyncio.to_thread(fetch)
+        if once:
+            return
+        await asyncio.sleep(max(0.0, poll_interval - (time.perf_counter() - started)))
+
+
+async def produce_snapshots(source, snapshots, metrics):
+    fetch_started = time.perf_counter()
+    async for name, payload in source:
+        metrics.record('fetch', time.perf_counter() - fetch_started)
+        # Blocks while the decoder is behind (back-pressure on the source)
+        await snapshots.put((time.perf_counter(), name, payload))
+        fetch_started = time.perf_counter()
+    await snapshots.put(None)
+
+
+async def decode_snapshots(snapshots, rows, metrics):
+    position_dedupe = PositionDeduplicator()
+    update_dedupe = TripUpdateDeduplicator()
+    while True:
+        item = await snapshots.get()
+        if item is None:
+            await rows.put(None)
+            return
+        received, name, payload = item
+
+        started = time.perf_counter()
+        try:
+            df_positions, df_updates = await asyncio.to_thread(decode_feed, payload)
+        except Exception as e:
+            print(f"✗ Could not decode {name}: {e}")
+            continue
+        metrics.record('decode', time.perf_counter() - started, len(df_positions) + len(df_updates))
+
+        started = time.perf_counter()
+        total = len(df_positions)
+        df_positions = position_dedupe.filter(df_positions)
+        df_updates = update_dedupe.filter(df_updates)
+        metrics.rows_skipped += total - len(df_positions)
+        metrics.record('dedupe', time.perf_counter() - started, total)
+
+        # Blocks while the writer is behind
+        if len(df_positions):
+            await rows.put(('vehicle_positions', received, df_positions[POSITION_COLUMNS]))
+        if len(df_updates):
+            await rows.put(('trip_updates', received, df_updates[TRIP_UPDATE_COLUMNS]))
+
+
+async def write_rows(engine, rows, metrics, batch_size=BATCH_SIZE, batch_timeout=BATCH_TIMEOUT):
+    """Gather rows per table into micro-batches and COPY them."""
+    pending = {'vehicle_positions': [], 'trip_updates': []}
+    oldest = {}
+
+    async def flush(table_name):
+        frames = pending[table_name]
+        if not frames:
+            return
+        df = pd.concat(frames, ignore_index=True)
+        pending[table_name] = []
+        started = time.perf_counter()
+        written = await asyncio.to_thread(write_batch, engine, table_name, df)
+        finished = time.perf_counter()
+        metrics.record('write', finished - started, written)
+        metrics.record('end_to_end', finished - oldest.pop(table_name), written)
+        metrics.rows_written[table_name] += written
+
+    finished = False
+    while not finished:
+        try:
+            item = await asyncio.wait_for(rows.get(), timeout=batch_timeout)
+        except asyncio.TimeoutError:
+            item = ()
+
+        if item is None:
+            finished = True
+        elif item:
+            table_name, received, df = item
+            pending[table_name].append(df)
+            oldest.setdefault(table_name, received)
+
+        for table_name, frames in pending.items():
+            buffered = sum(len(frame) for frame in frames)
+            if finished or buffered >= batch_size or (
+                    buffered and time.perf_counter() - oldest[table_name] >= batch_timeout):
+                await flush(table_name)
+
+
+async def ingest(source, engine=None, metrics=None, report_every=60.0):
+    """
+    Run the pipeline until the source is exhausted (or forever, for a live feed).
+
+    fetch -> [snapshot queue] -> decode + dedupe -> [row queue] -> COPY batches
+    """
+    engine = engine or get_engine()
+    metrics = metrics or IngestMetrics()
+    snapshots = asyncio.Queue(maxsize=SNAPSHOT_QUEUE_SIZE)
+    rows = asyncio.Queue(maxsize=ROW_QUEUE_SIZE)
+
+    async def report_periodically():
+        while True:
+            await asyncio.sleep(report_every)
+            print(metrics.report())
+            print()
+
+    reporter = asyncio.create_task(report_periodically())
+    try:
+        await asyncio.gather(
+            produce_snapshots(source, snapshots, metrics),
+            decode_snapshots(snapshots, rows, metrics),
+            write_rows(engine, rows, metrics),
+        )
+    finally:
+        reporter.cancel()
+    return metrics
+
+
+def main():
+    if FEED_URL:
+        print(f"Ingesting GTFS-Realtime from {FEED_URL} every {POLL_INTERVAL:.0f}s...")
+        source = http_source(FEED_URL)
+    else:
+        print(f"Ingesting GTFS-Realtime snapshots from {feed_dir}...")
+        feed_dir.mkdir(parents=True, exist_ok=True)
+        source = directory_source(feed_dir)
+
+    # Today's and the next few days' partitions; rerun partitions.py daily
+    ensure_partitions(get_engine())
+
+    metrics = IngestMetrics()
+    try:
+        asyncio.run(ingest(source, metrics=metrics))
+    except KeyboardInterrupt:
+        pass
+    print()
+    print(metrics.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from src.etl.schema_parser import parse_schema
+
+
+def build_dependency_graph(tables, schema=None):
+    """
+    Build {table: set(tables it references)} from the foreign keys in schema.sql.
+
+    Only tables in `tables` are kept, and self references are ignored, so the
+    result can be scheduled directly.
+    """
+    if schema is None:
+        schema = parse_schema()
+
+    graph = {}
+    for table in tables:
+        foreign_keys = schema.get(table, {}).get('foreign_keys', [])
+        graph[table] = {
+            ref_table for _, ref_table, _ in foreign_keys
+            if ref_table in tables and ref_table != table
+        }
+    return graph
+
+
+def topological_order(graph):
+    """Return the tables in an order where every table follows its dependencies."""
+    order = []
+    done = set()
+    remaining = dict(graph)
+    while remaining:
+        ready = [t for t, deps in remaining.items() if deps <= done]
+        if not ready:
+            raise ValueError(f"Circular foreign key dependency between: {sorted(remaining)}")
+        for table in ready:
+            order.append(table)
+            done.add(table)
+            del remaining[table]
+    return order
+
+
+def run_dependency_graph(graph, tasks, max_workers=4):
+    """
+    Run one task per table, starting each as soon as all its dependencies finish.
+
+    Parameters:
+    - graph: {table: set(dependencies)} from build_dependency_graph
+    - tasks: {table: callable()}; the return value is kept in the results
+    - max_workers: tables loaded at the same time (keep <= the engine pool size)
+
+    A failed task is recorded and its dependents still run, matching the
+    sequential loader, which prints the error and moves on.
+
+    Returns {table: {'start', 'end', 'seconds', 'result', 'error'}} with times
+    relative to the start of the run.
+    """
+    topological_order(graph)  # fail fast on cycles
+
+    timings = {}
+    lock = threading.Lock()
+    run_start = time.perf_counter()
+
+    def run(table):
+        start = time.perf_counter() - run_start
+        result, error = None, None
+        try:
+            result = tasks[table]()
+        except Exception as e:
+            error = e
+        end = time.perf_counter() - run_start
+        with lock:
+            timings[table] = {
+                'start': start, 'end': end, 'seconds': end - start,
+                'result': result, 'error': error,
+            }
+        return table
+
+    done = set()
+    pending = set(graph)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            ready = [t for t in graph if t in pending and graph[t] <= done]
+            for table in ready:
+                pending.remove(table)
+                running[executor.submit(run, table)] = table
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done.add(running.pop(future))
+
+    return timings
+
+
+def critical_path(graph, timings):
+    """
+    Longest chain of dependent loads, measured by task duration.
+
+    Returns (tables_on_path, seconds). No schedule can finish faster than this
+    chain, so it shows which tables the reload wall-clock is waiting on.
+    """
+    finish = {}
+    previous = {}
+    for table in topological_order(graph):
+        best_dep = max(graph[table], key=lambda t: finish[t], default=None)
+        base = finish[best_dep] if best_dep else 0.0
+        finish[table] = base + timings.get(table, {}).get('seconds', 0.0)
+        previous[table] = best_dep
+
+    if not finish:
+        return [], 0.0
+
+    last = max(finish, key=finish.get)
+    path = []
+    while last:
+        path.append(last)
+        last = previous[last]
+    path.reverse()
+    return path, finish[path[-1]]
+
+
+def print_schedule_report(graph, timings):
+    """Print per-table timings, wall-clock vs. summed time, and the critical path."""
+    print(f"{'Table':<16}{'Start':>8}{'End':>8}{'Seconds':>10}  Waits on")
+    print("-" * 60)
+    for table in sorted(timings, key=lambda t: timings[t]['start']):
+        t = timings[table]
+        status = "" if t['error'] is None else "  ✗"
+        deps = ", ".join(sorted(graph[table])) or "-"
+        print(f"{table:<16}{t['start']:>8.2f}{t['end']:>8.2f}{t['seconds']:>10.2f}  {deps}{status}")
+    print("-" * 60)
+
+    wall_clock = max((t['end'] for t in timings.values()), default=0.0)
+    serial = sum(t['seconds'] for t in timings.values())
+    path, path_seconds = critical_path(graph, timings)
+    print(f"Wall-clock:    {wall_clock:.2f}s (sequential would be ~{serial:.2f}s)")
+    print(f"Critical path: {' → '.join(path)} ({path_seconds:.2f}s)")
@@ -0,0 +1,84 @@
+import re
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+schema_path = project_root / 'sql' / 'schema.sql'
+
+CREATE_TABLE_PATTERN = re.compile(
+    r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s*\((.*?)\)\s*(?:PARTITION\s+BY[^;]*)?;",
+    re.IGNORECASE | re.DOTALL
+)
+REFERENCES_PATTERN = re.compile(r"REFERENCES\s+(\w+)\s*\(\s*(\w+)\s*\)", re.IGNORECASE)
+CONSTRAINT_KEYWORDS = ('PRIMARY', 'FOREIGN', 'UNIQUE', 'CHECK', 'CONSTRAINT')
+
+
+def split_top_level(body):
+    """Split a CREATE TABLE body on commas that are not inside parentheses."""
+    parts = []
+    depth = 0
+    current = []
+    for char in body:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if ''.join(current).strip():
+        parts.append(''.join(current).strip())
+    return parts
+
+
+def parse_column_list(text):
+    return [col.strip() for col in text.split(',') if col.strip()]
+
+
+def parse_schema(path=schema_path):
+    """
+    Parse the CREATE TABLE statements in schema.sql.
+
+    Returns {table: {'columns': [...], 'primary_key': [...],
+    'foreign_keys': [(column, ref_table, ref_column), ...]}} in the order
+    the tables are declared.
+    """
+    sql = Path(path).read_text()
+    sql = re.sub(r"--[^\n]*", "", sql)
+
+    tables = {}
+    for match in CREATE_TABLE_PATTERN.finditer(sql):
+        table_name = match.group(1).lower()
+        columns = []
+        primary_key = []
+        foreign_keys = []
+
+        for definition in split_top_level(match.group(2)):
+            first_word = definition.split()[0].upper()
+
+            if first_word in CONSTRAINT_KEYWORDS:
+                pk = re.search(r"PRIMARY\s+KEY\s*\(([^)]*)\)", definition, re.IGNORECASE)
+                if pk:
+                    primary_key = parse_column_list(pk.group(1))
+                fk = re.search(r"FOREIGN\s+KEY\s*\(\s*(\w+)\s*\)", definition, re.IGNORECASE)
+                ref = REFERENCES_PATTERN.search(definition)
+                if fk and ref:
+                    foreign_keys.append((fk.group(1), ref.group(1).lower(), ref.group(2)))
+                continue
+
+            column = definition.split()[0]
+            columns.append(column)
+            if re.search(r"\bPRIMARY\s+KEY\b", definition, re.IGNORECASE):
+                primary_key = [column]
+            ref = REFERENCES_PATTERN.search(definition)
+            if ref:
+                foreign_keys.append((column, ref.group(1).lower(), ref.group(2)))
+
+        tables[table_name] = {
+            'columns': columns,
+            'primary_key': primary_key,
+            'foreign_keys': foreign_keys,
+        }
+
+    return tables
@@ -0,0 +1,222 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.etl import feed_cache
+from src.etl.copy_loader import copy_dataframe
+
+SERVICE_DATES_TABLE = 'service_dates'
+
+DAY_COLUMNS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+DAY_TYPES = ['Weekday', 'Saturday', 'Sunday']
+
+# calendar_dates.exception_type
+SERVICE_ADDED = 1
+SERVICE_REMOVED = 2
+
+
+def day_type_labels(dates):
+    """Weekday / Saturday / Sunday for each date."""
+    dayofweek = pd.DatetimeIndex(dates).dayofweek
+    return np.select([dayofweek < 5, dayofweek == 5], ['Weekday', 'Saturday'], default='Sunday')
+
+
+class ServiceCalendar:
+    """
+    Which services (and trips) run on which dates, for the whole feed period.
+
+    calendar and calendar_dates are expanded once into a service x day bit
+    matrix (np.packbits: one bit per service per day, so a year of a few
+    hundred services is a few KB). Weekday flags set the base pattern between
+    start_date and end_date; calendar_dates then adds (type 1) or removes
+    (type 2) single days, which is how holidays are expressed in GTFS.
+
+    Trips are kept grouped by service (CSR offsets), so the trips running on a
+    date are a concatenation of a few slices, and trips per date across the
+    whole period is one matrix-vector product.
+    """
+
+    def __init__(self, calendar, calendar_dates=None, trips=None):
+        calendar = calendar.copy()
+        calendar['service_id'] = calendar['service_id'].astype('string')
+        calendar['start_date'] = pd.to_datetime(calendar['start_date'])
+        calendar['end_date'] = pd.to_datetime(calendar['end_date'])
+
+        if calendar_dates is None:
+            calendar_dates = pd.DataFrame({'service_id': [], 'date': [], 'exception_type': []})
+        calendar_dates = calendar_dates.copy()
+        calendar_dates['service_id'] = calendar_dates['service_id'].astype('string')
+        calendar_dates['date'] = pd.to_datetime(calendar_dates['date'])
+
+        self.service_ids = pd.Index(
+            pd.concat([calendar['service_id'], calendar_dates['service_id']]).dropna().unique(),
+            dtype='string'
+        )
+        all_dates = pd.concat([calendar['start_date'], calendar['end_date'], calendar_dates['date']]).dropna()
+        if len(all_dates):
+            self.dates = pd.date_range(all_dates.min(), all_dates.max(), freq='D')
+        else:
+            self.dates = pd.DatetimeIndex([])
+
+        n_days = len(self.dates)
+        active = np.zeros((len(self.service_ids), n_days), dtype=bool)
+
+        # Base weekly pattern: day d is active if its weekday flag is set and
+        # it lies within [start_date, end_date]
+        if n_days and len(calendar):
+            codes = self.service_ids.get_indexer(calendar['service_id'])
+            flags = calendar[DAY_COLUMNS].fillna(0).astype(int).to_numpy() == 1
+            weekday = self.dates.dayofweek.to_numpy()
+            day_numbers = np.arange(n_days)
+            first = self._day_numbers(calendar['start_date'])
+            last = self._day_numbers(calendar['end_date'])
+            in_range = (day_numbers >= first[:, None]) & (day_numbers <= last[:, None])
+            active[codes] = flags[:, weekday] & in_range
+
+        # Exceptions: added days then removed days
+        if n_days and len(calendar_dates):
+            codes = self.service_ids.get_indexer(calendar_dates['service_id'])
+            days = self._day_numbers(calendar_dates['date'])
+            exception_type = calendar_dates['exception_type'].astype(int).to_numpy()
+            added = exception_type == SERVICE_ADDED
+            removed = exception_type == SERVICE_REMOVED
+            active[codes[added], days[added]] = True
+            active[codes[removed], days[removed]] = False
+
+        self.num_days = n_days
+        self.bitmap = np.packbits(active, axis=1)
+
+        self.trip_ids = np.array([], dtype=object)
+        self.trip_offsets = np.zeros(len(self.service_ids) + 1, dtype=np.int64)
+        if trips is not None:
+            self._index_trips(trips)
+
+    def _day_numbers(self, dates):
+        return ((pd.to_datetime(dates) - self.dates[0]) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+
+    def _index_trips(self, trips):
+        service_codes = self.service_ids.get_indexer(trips['service_id'].astype('string'))
+        known = service_codes >= 0
+        service_codes = service_codes[known]
+        trip_ids = trips['trip_id'].astype('string').to_numpy(dtype=object)[known]
+
+        order = np.argsort(service_codes, kind='stable')
+        self.trip_ids = trip_ids[order]
+        counts = np.bincount(service_codes, minlength=len(self.service_ids))
+        self.trip_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def active(self):
+        """The unpacked service x day boolean matrix."""
+        return np.unpackbits(self.bitmap, axis=1, count=self.num_days).astype(bool)
+
+    def day_index(self, date):
+        """Column of date in the bitmap, or None outside the feed period."""
+        position = self.dates.get_indexer([pd.Timestamp(date).normalize()])[0]
+        return None if position < 0 else position
+
+    def active_on(self, date):
+        """Boolean mask over service_ids: which services run on date."""
+        day = self.day_index(date)
+        if day is None:
+            return np.zeros(len(self.service_ids), dtype=bool)
+        byte, bit = divmod(day, 8)
+        return (self.bitmap[:, byte] >> (7 - bit)) & 1 == 1
+
+    def active_services(self, date):
+        return self.service_ids[self.active_on(date)].to_numpy()
+
+    def is_active(self, service_id, date):
+        code = self.service_ids.get_indexer([service_id])[0]
+        return code >= 0 and bool(self.active_on(date)[code])
+
+    def active_trip_ids(self, date):
+        """trip_ids running on date (trips must have been passed in)."""
+        codes = np.flatnonzero(self.active_on(date))
+        if len(codes) == 0:
+            return np.array([], dtype=object)
+        return np.concatenate([
+            self.trip_ids[self.trip_offsets[c]:self.trip_offsets[c + 1]] for c in codes
+        ])
+
+    def trips_per_service(self):
+        return np.diff(self.trip_offsets)
+
+    def daily_counts(self):
+        """Active services and trips for every date of the feed period."""
+        active = self.active
+        return pd.DataFrame({
+            'date': self.dates,
+            'num_services': active.sum(axis=0),
+            'num_trips': self.trips_per_service() @ active,
+        })
+
+    def trips_by_day_type(self):
+        """
+        Typical scheduled trips per day type: the median daily trip count over
+        all dates of that type. Holidays running reduced or Sunday service are
+        counted on their actual date, and the median keeps a handful of them
+        from shifting a day type's figure.
+        """
+        daily = self.daily_counts()
+        daily = daily[daily['num_trips'] > 0]
+        grouped = daily.groupby(day_type_labels(daily['date']))['num_trips']
+        summary = pd.DataFrame({
+            'num_trips': grouped.median().round().astype(int),
+            'num_dates': grouped.size(),
+        })
+        summary = summary.reindex([day for day in DAY_TYPES if day in summary.index])
+        return summary.rename_axis('day_type').reset_index()
+
+    def service_dates(self):
+        """Long (service_id, date) rows for every active service day."""
+        services, days = np.nonzero(self.active)
+        return pd.DataFrame({
+            'service_id': self.service_ids[services].to_numpy(),
+            'date': self.dates[days].date,
+        })
+
+
+def load_service_calendar(engine=None, cache_dir=feed_cache.default_cache_dir):
+    """
+    ServiceCalendar with trips, from the Parquet feed cache when present
+    (and cache_dir isn't None), else from the database.
+    """
+    if cache_dir is not None and feed_cache.cache_available(cache_dir):
+        calendar = feed_cache.load_table('calendar', cache_dir=cache_dir)
+        try:
+            calendar_dates = feed_cache.load_table('calendar_dates', cache_dir=cache_dir)
+        except FileNotFoundError:
+            calendar_dates = None
+        trips = feed_cache.load_table('trips', columns=['trip_id', 'service_id'], cache_dir=cache_dir)
+    else:
+        calendar = pd.read_sql(
+            f"SELECT service_id, {', '.join(DAY_COLUMNS)}, start_date, end_date FROM calendar;", engine
+        )
+        calendar_dates = pd.read_sql("SELECT service_id, date, exception_type FROM calendar_dates;", engine)
+        trips = pd.read_sql("SELECT trip_id, service_id FROM trips;", engine)
+    return ServiceCalendar(calendar, calendar_dates, trips)
+
+
+def save_service_dates(engine, service_calendar):
+    """
+    Replace the service_dates table with the expanded calendar, in one
+    transaction. Returns (rows, seconds).
+    """
+    start = time.perf_counter()
+    rows = service_calendar.service_dates()
+    with engine.execution_options(isolation_level="READ COMMITTED").begin() as conn:
+        conn.execute(text(f"DELETE FROM {SERVICE_DATES_TABLE}"))
+        cursor = conn.connection.cursor()
+        try:
+            copy_dataframe(cursor, rows, SERVICE_DATES_TABLE)
+        finally:
+            cursor.close()
+    return len(rows), time.perf_counter() - start
+
+
+def refresh_service_dates(engine):
+    """Rebuild service_dates from the tables just loaded. Returns (rows, seconds)."""
+    return save_service_dates(engine, load_service_calendar(engine, cache_dir=None))
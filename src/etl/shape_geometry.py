@@ -0,0 +1,330 @@
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.analysis.nearest_stops import METERS_PER_DEGREE
+from src.database.connection import get_engine
+from src.etl import feed_cache
+from src.etl.copy_loader import copy_dataframe
+
+GEOMETRY_TABLE = 'shape_geometries'
+OFFSETS_TABLE = 'stop_shape_offsets'
+
+# Douglas-Peucker tolerances in meters; 0 keeps every shape point
+SIMPLIFY_TOLERANCES_M = [0, 2, 10, 50]
+
+# Segments within this much of a stop's closest segment are candidates for
+# it; on a loop or an out-and-back shape both passes usually are, and the
+# stop order decides between them
+SNAP_SLACK_M = 25
+
+# Cost of a stop placed before the previous stop's offset (only taken when
+# no in-order assignment exists, e.g. a stop list that doubles back)
+OUT_OF_ORDER_COST_M = 1e6
+
+SHAPES_QUERY = """
+SELECT shape_id, shape_pt_lat, shape_pt_lon, shape_pt_sequence
+FROM shapes
+ORDER BY shape_id, shape_pt_sequence;
+"""
+
+# One trip per distinct (shape, stop list): its stops in sequence order
+STOP_PATTERNS_QUERY = """
+WITH patterns AS (
+    SELECT
+        st.trip_id,
+        t.shape_id,
+        STRING_AGG(st.stop_id, ' ' ORDER BY st.stop_sequence) AS stop_list
+    FROM stop_times st
+    JOIN trips t ON st.trip_id = t.trip_id
+    WHERE t.shape_id IS NOT NULL
+    GROUP BY st.trip_id, t.shape_id
+),
+representative AS (
+    SELECT DISTINCT ON (shape_id, stop_list) trip_id, shape_id
+    FROM patterns
+    ORDER BY shape_id, stop_list, trip_id
+)
+SELECT r.shape_id, r.trip_id AS pattern_id, st.stop_sequence, st.stop_id
+FROM representative r
+JOIN stop_times st ON st.trip_id = r.trip_id;
+"""
+
+EWKB_LINESTRING = 0x20000002  # LineString with the SRID flag set
+SRID = 4326
+
+
+def load_shape_points(engine=None, cache_dir=feed_cache.default_cache_dir):
+    if cache_dir is not None and feed_cache.cache_available(cache_dir):
+        points = feed_cache.load_table(
+            'shapes', columns=['shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence'],
+            cache_dir=cache_dir,
+        )
+        points = points.sort_values(['shape_id', 'shape_pt_sequence'], kind='stable')
+    else:
+        points = pd.read_sql(SHAPES_QUERY, engine)
+    return points.astype({'shape_id': 'string', 'shape_pt_lat': float, 'shape_pt_lon': float})
+
+
+def load_stop_patterns(engine=None, cache_dir=feed_cache.default_cache_dir):
+    """
+    The stops of each distinct stop pattern run on a shape (shape_id,
+    pattern_id, stop_sequence, stop_id), with stop coordinates. pattern_id
+    is the trip_id of one trip with that pattern.
+    """
+    if cache_dir is not None and feed_cache.cache_available(cache_dir):
+        stop_times = feed_cache.load_stop_times(columns=['trip_id', 'stop_sequence', 'stop_id'], cache_dir=cache_dir)
+        trips = feed_cache.load_table('trips', columns=['trip_id', 'shape_id'], cache_dir=cache_dir)
+        stop_times = stop_times.astype({'trip_id': 'string', 'stop_id': 'string'})
+        trips = trips.astype({'trip_id': 'string', 'shape_id': 'string'}).dropna(subset=['shape_id'])
+        stop_times = stop_times.merge(trips, on='trip_id').sort_values(['trip_id', 'stop_sequence'])
+        stop_lists = stop_times.groupby('trip_id', sort=False)['stop_id'].agg(' '.join)
+        trips = trips.assign(stop_list=trips['trip_id'].map(stop_lists)).dropna(subset=['stop_list'])
+        representative = trips.sort_values('trip_id').drop_duplicates(['shape_id', 'stop_list'])['trip_id']
+        patterns = stop_times[stop_times['trip_id'].isin(representative)].rename(columns={'trip_id': 'pattern_id'})[
+            ['shape_id', 'pattern_id', 'stop_sequence', 'stop_id']]
+        stops = feed_cache.load_table('stops', columns=['stop_id', 'stop_lat', 'stop_lon'], cache_dir=cache_dir)
+    else:
+        patterns = pd.read_sql(STOP_PATTERNS_QUERY, engine)
+        stops = pd.read_sql("SELECT stop_id, stop_lat, stop_lon FROM stops;", engine)
+    stops = stops.astype({'stop_id': 'string', 'stop_lat': float, 'stop_lon': float})
+    patterns = patterns.astype({'shape_id': 'string', 'pattern_id': 'string', 'stop_id': 'string'})
+    return patterns.merge(stops, on='stop_id').sort_values(['shape_id', 'pattern_id', 'stop_sequence'],
+                                                           ignore_index=True)
+
+
+def shape_groups(points):
+    """(shape_ids, start offsets, end offsets) of each shape's rows in the sorted points."""
+    codes, shape_ids = pd.factorize(points['shape_id'], sort=False)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)]
+    return np.asarray(shape_ids, dtype=object), starts, ends
+
+
+def project_meters(lat, lon, origin_lat):
+    """Local equirectangular x/y in meters (origin_lat per point sets the east-west scale)."""
+    return lon * METERS_PER_DEGREE * np.cos(np.radians(origin_lat)), lat * METERS_PER_DEGREE
+
+
+def dp_importance(x, y, min_tolerance):
+    """
+    Douglas-Peucker importance of every point of one polyline.
+
+    A point's importance is its distance from the chord when its range is
+    split, capped by its parent split's importance, so the simplification at
+    any tolerance t is simply the points with importance > t. Endpoints are
+    always kept (inf). Ranges whose farthest point is within min_tolerance
+    are not split further: none of their points is kept at any tolerance
+    asked for.
+    """
+    n = len(x)
+    importance = np.zeros(n)
+    importance[0] = importance[-1] = np.inf
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        start, end, parent = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        chord = np.hypot(dx, dy)
+        if chord > 0:
+            distance = np.abs(px * dy - py * dx) / chord
+        else:
+            distance = np.hypot(px, py)
+        i = int(np.argmax(distance))
+        if distance[i] <= min_tolerance:
+            continue
+        split = start + 1 + i
+        importance[split] = min(distance[i], parent)
+        stack.append((start, split, importance[split]))
+        stack.append((split, end, importance[split]))
+    return importance
+
+
+def ewkb_linestring(lon, lat):
+    """Hex EWKB of a LineString (COPY reads it straight into a geometry column)."""
+    header = struct.pack('<BIII', 1, EWKB_LINESTRING, SRID, len(lon))
+    return (header + np.column_stack([lon, lat]).astype('<f8').tobytes()).hex()
+
+
+def build_shape_geometries(points, tolerances=SIMPLIFY_TOLERANCES_M):
+    """
+    One row per shape and tolerance: shape_id, tolerance_m, num_points,
+    length_m and geom (hex EWKB LineString).
+
+    Points are projected for all shapes at once; one Douglas-Peucker pass
+    per shape serves every tolerance.
+    """
+    shape_ids, starts, ends = shape_groups(points)
+    lat = points['shape_pt_lat'].to_numpy(dtype=float)
+    lon = points['shape_pt_lon'].to_numpy(dtype=float)
+    counts = ends - starts
+    origin_lat = np.repeat(np.add.reduceat(lat, starts) / counts, counts) if len(starts) else lat
+    x, y = project_meters(lat, lon, origin_lat)
+
+    positive = [t for t in tolerances if t > 0]
+    min_tolerance = min(positive) if positive else np.inf
+    rows = []
+    for shape_id, start, end in zip(shape_ids, starts, ends):
+        if end - start < 2:
+            continue
+        sx, sy = x[start:end], y[start:end]
+        importance = dp_importance(sx, sy, min_tolerance) if positive else None
+        for tolerance in tolerances:
+            keep = np.ones(end - start, dtype=bool) if tolerance == 0 else importance > tolerance
+            length = float(np.hypot(np.diff(sx[keep]), np.diff(sy[keep])).sum())
+            rows.append((shape_id, tolerance, int(keep.sum()), round(length, 1),
+                         ewkb_linestring(lon[start:end][keep], lat[start:end][keep])))
+    return pd.DataFrame(rows, columns=['shape_id', 'tolerance_m', 'num_points', 'length_m', 'geom'])
+
+
+def snap_stops_to_shape(x, y, stop_x, stop_y):
+    """
+    Linear-referencing offset (meters along the shape) and snap distance of
+    each stop, stops given in sequence order.
+
+    Every stop is projected onto every segment at once (stops x segments
+    arrays). Each stop's candidates are the segments within SNAP_SLACK_M of
+    its closest one; a dynamic program over the stops then picks one
+    candidate per stop, with offsets never going backwards, that minimises
+    the total snap distance. A return-leg stop a few meters from the
+    outbound pass still lands on the return pass.
+    """
+    ax, ay = x[:-1], y[:-1]
+    dx, dy = np.diff(x), np.diff(y)
+    segment_length = np.hypot(dx, dy)
+    along = np.r_[0.0, np.cumsum(segment_length)[:-1]]
+
+    squared = np.where(segment_length > 0, segment_length ** 2, 1.0)
+    t = ((stop_x[:, None] - ax) * dx + (stop_y[:, None] - ay) * dy) / squared
+    t = np.clip(t, 0.0, 1.0)
+    distance = np.hypot(ax + t * dx - stop_x[:, None], ay + t * dy - stop_y[:, None])
+    offset = along + t * segment_length
+
+    if len(stop_x) == 0:
+        return np.empty(0), np.empty(0)
+
+    # Candidate segments of each stop, in order along the shape
+    candidates = []
+    for i in range(len(stop_x)):
+        near = np.flatnonzero(distance[i] <= distance[i].min() + SNAP_SLACK_M)
+        candidates.append(near[np.argsort(offset[i, near], kind='stable')])
+
+    cost = distance[0, candidates[0]]
+    backpointers = []
+    for i in range(1, len(stop_x)):
+        previous_offset = offset[i - 1, candidates[i - 1]]
+        best = np.minimum.accumulate(cost)
+        index = np.arange(len(cost))
+        best_index = np.maximum.accumulate(np.where(cost == best, index, 0))
+
+        # Predecessors at or before this candidate (1 m of slack for rounding)
+        current_offset = offset[i, candidates[i]]
+        count = np.searchsorted(previous_offset, current_offset + 1.0, side='right')
+        in_order = count > 0
+        last = np.maximum(count - 1, 0)
+        previous_cost = np.where(in_order, best[last], cost.min() + OUT_OF_ORDER_COST_M)
+        backpointers.append(np.where(in_order, best_index[last], int(np.argmin(cost))))
+        cost = distance[i, candidates[i]] + previous_cost
+
+    chosen = np.empty(len(stop_x), dtype=np.int64)
+    k = int(np.argmin(cost))
+    for i in range(len(stop_x) - 1, -1, -1):
+        chosen[i] = candidates[i][k]
+        if i > 0:
+            k = int(backpointers[i - 1][k])
+    stops = np.arange(len(stop_x))
+    return offset[stops, chosen], distance[stops, chosen]
+
+
+def build_stop_offsets(points, patterns):
+    """
+    shape_id, stop_sequence, stop_id, offset_m and snap_distance_m.
+
+    Each stop pattern is snapped on its own (in stop order); a stop at the
+    same sequence in several patterns of a shape keeps its first offset.
+    """
+    shape_ids, starts, ends = shape_groups(points)
+    lat = points['shape_pt_lat'].to_numpy(dtype=float)
+    lon = points['shape_pt_lon'].to_numpy(dtype=float)
+    pattern_groups = {shape_id: rows for shape_id, rows in patterns.groupby('shape_id', sort=False).indices.items()}
+
+    frames = []
+    for shape_id, start, end in zip(shape_ids, starts, ends):
+        rows = pattern_groups.get(shape_id)
+        if rows is None or end - start < 2:
+            continue
+        origin_lat = lat[start:end].mean()
+        x, y = project_meters(lat[start:end], lon[start:end], origin_lat)
+        for _, stops in patterns.iloc[rows].groupby('pattern_id', sort=False):
+            stop_x, stop_y = project_meters(stops['stop_lat'].to_numpy(), stops['stop_lon'].to_numpy(), origin_lat)
+            offsets, snap_distance = snap_stops_to_shape(x, y, stop_x, stop_y)
+            frames.append(pd.DataFrame({
+                'shape_id': shape_id,
+                'stop_sequence': stops['stop_sequence'].to_numpy(),
+                'stop_id': stops['stop_id'].to_numpy(),
+                'offset_m': offsets.round(1),
+                'snap_distance_m': snap_distance.round(1),
+            }))
+    if not frames:
+        return pd.DataFrame(columns=['shape_id', 'stop_sequence', 'stop_id', 'offset_m', 'snap_distance_m'])
+    offsets = pd.concat(frames, ignore_index=True)
+    return offsets.drop_duplicates(['shape_id', 'stop_sequence', 'stop_id'], ignore_index=True)
+
+
+def save_shape_tables(engine, geometries, offsets):
+    """Replace shape_geometries and stop_shape_offsets in one transaction."""
+    with engine.execution_options(isolation_level="READ COMMITTED").begin() as conn:
+        conn.execute(text(f"DELETE FROM {GEOMETRY_TABLE}"))
+        conn.execute(text(f"DELETE FROM {OFFSETS_TABLE}"))
+        cursor = conn.connection.cursor()
+        try:
+            copy_dataframe(cursor, geometries, GEOMETRY_TABLE)
+            copy_dataframe(cursor, offsets, OFFSETS_TABLE)
+        finally:
+            cursor.close()
+
+
+def refresh_shape_geometry(engine, cache_dir=None):
+    """
+    Rebuild the shape LineStrings and stop offsets from the loaded feed.
+
+    Returns (shapes, stop offsets, seconds).
+    """
+    start = time.perf_counter()
+    points = load_shape_points(engine, cache_dir)
+    if points.empty:
+        return 0, 0, time.perf_counter() - start
+    geometries = build_shape_geometries(points)
+    offsets = build_stop_offsets(points, load_stop_patterns(engine, cache_dir))
+    save_shape_tables(engine, geometries, offsets)
+    return geometries['shape_id'].nunique(), len(offsets), time.perf_counter() - start
+
+
+def main():
+    engine = get_engine()
+    shapes, offsets, seconds = refresh_shape_geometry(engine, feed_cache.default_cache_dir)
+    print(f"✓ Built {shapes:,} shapes at {len(SIMPLIFY_TOLERANCES_M)} tolerances and "
+          f"{offsets:,} stop offsets in {seconds:.1f}s")
+    print()
+
+    summary = pd.read_sql(f"""
+        SELECT tolerance_m, SUM(num_points) AS points, ROUND(AVG(length_m)::numeric, 0) AS avg_length_m
+        FROM {GEOMETRY_TABLE}
+        GROUP BY tolerance_m
+        ORDER BY tolerance_m;
+    """, engine)
+    print("Points per tolerance:")
+    print(summary.to_string(index=False))
+    print()
+
+    far = pd.read_sql(f"SELECT COUNT(*) AS n FROM {OFFSETS_TABLE} WHERE snap_distance_m > 100;", engine)
+    print(f"Stops more than 100 m from their shape: {int(far['n'].iloc[0]):,}")
+
+
+if __name__ == "__main__":
+    main()
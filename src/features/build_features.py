@@ -0,0 +1,332 @@
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.analysis.headways import STOP_TIMES_QUERY, load_departures, representative_dates
+from src.analysis.nearest_stops import METERS_PER_DEGREE
+from src.database.connection import get_engine
+from src.etl import feed_cache
+from src.etl.service_calendar import DAY_TYPES, day_type_labels, load_service_calendar
+from src.features.feature_store import FeatureStore, fingerprint
+
+# Bump when a feature definition changes: every partition is then rebuilt
+FEATURE_VERSION = 1
+
+KEY_COLUMNS = ['route_id', 'stop_id', 'hour', 'day_type']
+
+DENSITY_RADIUS_M = 400
+
+# Real-time history kept in the store, and how many earlier same-day-type
+# service days the rolling delay features average over
+DELAY_LOOKBACK_DAYS = 56
+LAG_WINDOW = 7
+
+# (feature set, OTP table, id column, feature prefix)
+DELAY_SOURCES = [
+    ('route_delay', 'route_otp', 'route_id', 'route'),
+    ('stop_delay', 'stop_otp', 'stop_id', 'stop'),
+]
+
+OTP_COUNTS = ['observations', 'on_time', 'early', 'late', 'total_delay_sec']
+
+
+def current_feed_version(engine=None, cache_dir=feed_cache.default_cache_dir):
+    """The loaded feed's identity: source file fingerprints, or the feed_version of the last load."""
+    manifest = feed_cache.read_manifest(cache_dir)
+    if manifest:
+        return fingerprint(manifest.get('fingerprints'))
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT COALESCE((SELECT version FROM feed_version), '')
+        """)).scalar()
+
+
+def load_stops(engine=None, cache_dir=feed_cache.default_cache_dir):
+    columns = ['stop_id', 'stop_lat', 'stop_lon']
+    if feed_cache.cache_available(cache_dir):
+        stops = feed_cache.load_table('stops', columns=columns, cache_dir=cache_dir)
+    else:
+        stops = pd.read_sql(f"SELECT {', '.join(columns)} FROM stops;", engine)
+    return stops.astype({'stop_id': 'string', 'stop_lat': float, 'stop_lon': float})
+
+
+def stop_density(stops, radius_m=DENSITY_RADIUS_M):
+    """
+    Other stops within radius_m of each stop, and the nearest one's distance.
+
+    Stops are binned into radius_m grid cells on a local equirectangular
+    projection, so only the 3 x 3 neighbouring cells are compared (no n²
+    distance matrix). nearest_stop_m is NaN when no stop is within radius_m.
+    """
+    stops = stops.dropna(subset=['stop_lat', 'stop_lon']).reset_index(drop=True)
+    lat = stops['stop_lat'].to_numpy(dtype=float)
+    lon = stops['stop_lon'].to_numpy(dtype=float)
+    n = len(stops)
+    y = lat * METERS_PER_DEGREE
+    x = lon * METERS_PER_DEGREE * np.cos(np.radians(lat.mean() if n else 0.0))
+
+    cell_x = np.floor(x / radius_m).astype(np.int64)
+    cell_y = np.floor(y / radius_m).astype(np.int64)
+    cell_x -= cell_x.min() - 1 if n else 0
+    cell_y -= cell_y.min() - 1 if n else 0
+    height = cell_y.max() + 2 if n else 1
+    cell = cell_x * height + cell_y
+    order = np.argsort(cell, kind='stable')
+    sorted_cells = cell[order]
+
+    neighbours = np.zeros(n, dtype=np.int64)
+    nearest = np.full(n, np.inf)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = cell + dx * height + dy
+            start = np.searchsorted(sorted_cells, target, side='left')
+            lengths = np.searchsorted(sorted_cells, target, side='right') - start
+            source = np.repeat(np.arange(n), lengths)
+            within_cell = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            candidate = order[np.repeat(start, lengths) + within_cell]
+
+            other = source != candidate
+            source, candidate = source[other], candidate[other]
+            distance = np.hypot(x[source] - x[candidate], y[source] - y[candidate])
+            neighbours += np.bincount(source[distance <= radius_m], minlength=n)
+            np.minimum.at(nearest, source, distance)
+
+    return pd.DataFrame({
+        'stop_id': stops['stop_id'],
+        f"stops_within_{radius_m}m": neighbours,
+        'nearest_stop_m': np.where(nearest <= radius_m, nearest, np.nan).round(1),
+    })
+
+
+def schedule_features(departures, density):
+    """
+    Scheduled-service features per (route, stop, hour) for one service day.
+
+    departures: load_departures() rows of that day. Headways are the gaps
+    between consecutive departures of a route and direction at a stop (a
+    grouped diff over the time-sorted frame), attributed to the hour of the
+    later departure. Hours are service hours mod 24, matching route_otp and
+    stop_otp.
+    """
+    departures = departures.sort_values(['route_id', 'direction_id', 'stop_id', 'departure_sec'])
+    departures['hour'] = (departures['departure_sec'] // 3600 % 24).astype(np.int16)
+    departures['gap_sec'] = departures.groupby(
+        ['route_id', 'direction_id', 'stop_id'], sort=False, observed=True)['departure_sec'].diff()
+
+    by_trip = departures.groupby('trip_id', sort=False, observed=True)['stop_sequence']
+    stop_count = by_trip.transform('size')
+    departures['stop_fraction'] = (by_trip.rank(method='first') - 1) / (stop_count - 1).clip(lower=1)
+
+    grouped = departures.groupby(['route_id', 'stop_id', 'hour'], sort=False, observed=True)
+    features = grouped.agg(
+        scheduled_trips=('departure_sec', 'size'),
+        headway_median_sec=('gap_sec', 'median'),
+        headway_max_sec=('gap_sec', 'max'),
+        stop_fraction=('stop_fraction', 'mean'),
+    ).reset_index().astype({'scheduled_trips': np.int32})
+
+    features['stop_trips_hour'] = features.groupby(['stop_id', 'hour'], observed=True)[
+        'scheduled_trips'].transform('sum')
+    routes_at_stop = departures.groupby('stop_id', observed=True)['route_id'].nunique()
+    features['routes_serving_stop'] = features['stop_id'].map(routes_at_stop).astype(np.int32)
+    route_trips = departures.groupby('route_id', observed=True)['trip_id'].nunique()
+    features['route_trips_day'] = features['route_id'].map(route_trips).astype(np.int32)
+    features['stop_fraction'] = features['stop_fraction'].round(3)
+
+    return features.merge(density, on='stop_id', how='left')
+
+
+def build_schedule_partitions(store, engine=None, cache_dir=feed_cache.default_cache_dir, force=False):
+    """
+    Rebuild the schedule partitions (one per day type) whose inputs changed.
+
+    Each is computed from that day type's representative date; the
+    fingerprint covers the feed version, that date and FEATURE_VERSION, so a
+    reload with an unchanged feed rebuilds nothing. Returns {day_type: rows
+    written, or None if the partition was current}.
+    """
+    engine = engine or get_engine()
+    version = current_feed_version(engine, cache_dir)
+    service_calendar = load_service_calendar(engine, cache_dir)
+    dates = representative_dates(service_calendar)
+
+    pending = {}
+    status = {}
+    for day_type, service_date in dates.items():
+        partition_fingerprint = fingerprint(FEATURE_VERSION, version, service_date, DENSITY_RADIUS_M)
+        if not force and store.is_current('schedule', day_type, partition_fingerprint):
+            status[day_type] = None
+        else:
+            pending[day_type] = (service_date, partition_fingerprint)
+    if not pending:
+        return status
+
+    feed_departures = None
+    if not feed_cache.cache_available(cache_dir):
+        feed_departures = pd.read_sql(STOP_TIMES_QUERY, engine)
+    density = stop_density(load_stops(engine, cache_dir))
+
+    for day_type, (service_date, partition_fingerprint) in pending.items():
+        departures = load_departures(service_date, service_calendar, feed_departures, cache_dir)
+        features = schedule_features(departures, density)
+        features.insert(3, 'day_type', day_type)
+        store.write('schedule', day_type, partition_fingerprint, features)
+        status[day_type] = len(features)
+    return status
+
+
+def otp_fingerprints(engine, table, since):
+    """{service_date: fingerprint} of the OTP rows per date since a date."""
+    query = f"""
+    SELECT service_date, COUNT(*) AS num_rows, SUM(observations) AS observations,
+           SUM(total_delay_sec) AS total_delay_sec
+    FROM {table}
+    WHERE service_date >= :since
+    GROUP BY service_date;
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(text(query), {'since': since}).fetchall()
+    return {
+        row.service_date.isoformat(): fingerprint(FEATURE_VERSION, row.num_rows, row.observations,
+                                                  row.total_delay_sec)
+        for row in rows
+    }
+
+
+def build_delay_partitions(store, engine=None, lookback_days=DELAY_LOOKBACK_DAYS, today=None, force=False):
+    """
+    Copy route_otp / stop_otp into per-service-date partitions.
+
+    Only dates whose OTP rows changed since the last run are read (in one
+    query per table); today's date keeps changing while the delay engine
+    runs, older dates are normally final. Partitions that fall out of the
+    lookback window are dropped. Returns {feature_set: dates rewritten}.
+    """
+    engine = engine or get_engine()
+    since = (today or date.today()) - timedelta(days=lookback_days)
+    rewritten = {}
+
+    for feature_set, table, id_column, _ in DELAY_SOURCES:
+        fingerprints = otp_fingerprints(engine, table, since)
+        changed = [d for d, fp in fingerprints.items()
+                   if force or not store.is_current(feature_set, d, fp)]
+        if changed:
+            query = f"""
+            SELECT service_date, {id_column}, hour, {', '.join(OTP_COUNTS)}
+            FROM {table}
+            WHERE service_date = ANY(CAST(:dates AS DATE[]));
+            """
+            rows = pd.read_sql(text(query), engine, params={'dates': changed})
+            rows['service_date'] = pd.to_datetime(rows['service_date'])
+            for service_date, partition in rows.groupby(rows['service_date'].dt.strftime('%Y-%m-%d')):
+                store.write(feature_set, service_date, fingerprints[service_date],
+                            partition.reset_index(drop=True))
+        for key in store.partitions(feature_set):
+            if key < since.isoformat():
+                store.drop(feature_set, key)
+        rewritten[feature_set] = changed
+    return rewritten
+
+
+def delay_lags(history, targets, id_column, prefix, window=LAG_WINDOW):
+    """
+    Delay features for each target (id, hour, service_date) from earlier days.
+
+    history holds one row per (service_date, id, hour) with OTP counts.
+    Within each (id, hour, day type) the counts are cumulated in date order,
+    so a window sum over the last `window` observed days is a difference of
+    two cumulative sums; merge_asof then gives every target the state of
+    the last observed day strictly before it. Targets with no history get NaN.
+    """
+    keys = [id_column, 'hour', 'day_type']
+    history = history.astype({id_column: str, 'hour': np.int16, 'service_date': 'datetime64[ns]'})
+    history['day_type'] = day_type_labels(history['service_date'])
+    history = history.sort_values(keys + ['service_date']).reset_index(drop=True)
+    group = history.groupby(keys, sort=False).ngroup()
+
+    for col in ('observations', 'on_time', 'total_delay_sec'):
+        running = history[col].groupby(group).cumsum()
+        history[f"_{col}"] = running - running.groupby(group).shift(window).fillna(0)
+
+    lagged = pd.DataFrame({
+        'service_date': history['service_date'],
+        id_column: history[id_column],
+        'hour': history['hour'],
+        'day_type': history['day_type'],
+        f"{prefix}_delay_lag_1": history['total_delay_sec'] / history['observations'].replace(0, np.nan),
+        f"{prefix}_delay_mean_{window}": history['_total_delay_sec'] / history['_observations'].replace(0, np.nan),
+        f"{prefix}_on_time_share_{window}": history['_on_time'] / history['_observations'].replace(0, np.nan),
+        f"{prefix}_observations_{window}": history['_observations'],
+    })
+
+    targets = targets[[id_column, 'hour', 'day_type', 'service_date']].drop_duplicates().astype(
+        {id_column: str, 'hour': np.int16, 'day_type': str, 'service_date': 'datetime64[ns]'})
+    return pd.merge_asof(
+        targets.sort_values('service_date'), lagged.sort_values('service_date'),
+        on='service_date', by=[id_column, 'hour', 'day_type'],
+        allow_exact_matches=False, direction='backward',
+    )
+
+
+def feature_frame(service_dates, store=None, with_delays=True):
+    """
+    Features per (route, stop, hour) for each of service_dates, from the store.
+
+    Every date gets the schedule partition of its day type; the delay
+    features (when real-time history is stored) only use days before it, so
+    the same frame serves training on past dates and scoring future ones.
+    """
+    store = store or FeatureStore()
+    dates = pd.DataFrame({'service_date': pd.to_datetime(pd.Series(list(service_dates))).astype('datetime64[ns]')})
+    dates['day_type'] = day_type_labels(dates['service_date'])
+
+    schedule = store.read('schedule', keys=sorted(set(dates['day_type'])))
+    features = schedule.merge(dates, on='day_type')
+    for col in ('route_id', 'stop_id', 'day_type'):
+        features[col] = features[col].astype('category')
+
+    if with_delays:
+        for feature_set, _, id_column, prefix in DELAY_SOURCES:
+            history = store.read(feature_set)
+            if history.empty:
+                continue
+            lags = delay_lags(history, features, id_column, prefix)
+            lags[id_column] = lags[id_column].astype(features[id_column].dtype)
+            lags['day_type'] = lags['day_type'].astype(features['day_type'].dtype)
+            features = features.merge(lags, on=[id_column, 'hour', 'day_type', 'service_date'], how='left')
+
+    return features.sort_values(['service_date'] + KEY_COLUMNS[:3], ignore_index=True)
+
+
+def main():
+    store = FeatureStore()
+    engine = get_engine()
+
+    start = time.perf_counter()
+    status = build_schedule_partitions(store, engine)
+    print(f"✓ Schedule features ({time.perf_counter() - start:.1f}s):")
+    for day_type in DAY_TYPES:
+        if day_type in status:
+            rows = status[day_type]
+            print(f"    {day_type:<10}" + ("current" if rows is None else f"rebuilt, {rows:,} rows"))
+    print()
+
+    start = time.perf_counter()
+    rewritten = build_delay_partitions(store, engine)
+    print(f"✓ Delay history ({time.perf_counter() - start:.1f}s): "
+          + ", ".join(f"{name}: {len(dates)} date(s) rewritten" for name, dates in rewritten.items()))
+    print()
+
+    tomorrow = date.today() + timedelta(days=1)
+    start = time.perf_counter()
+    features = feature_frame([tomorrow], store)
+    print(f"✓ Features for {tomorrow}: {len(features):,} (route, stop, hour) rows, "
+          f"{features.shape[1] - 5} features in {time.perf_counter() - start:.2f}s")
+    print(f"✓ Store: {store.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+project_root = Path(__file__).parent.parent.parent
+default_store_dir = project_root / 'data' / 'features' / 'store'
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def fingerprint(*parts):
+    """Short stable hash of the inputs a partition was computed from."""
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    """
+    Versioned Parquet partitions of feature sets under data/features/store.
+
+    Each feature set (e.g. schedule, stop_delay) is split into partitions
+    keyed by what they are computed from: a day type for schedule features,
+    a service date for delay history. A partition is written as
+    <set>/<key>/<fingerprint>.parquet, where the fingerprint hashes its
+    inputs (feed version, observation counts, feature definitions), and the
+    manifest points each key at its current file. Callers compute the
+    fingerprint first and skip the work when is_current() says the stored
+    partition was built from the same inputs.
+    """
+
+    def __init__(self, root=default_store_dir):
+        self.root = Path(root)
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        path = self.root / MANIFEST_NAME
+        if not path.exists():
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        # Write-then-rename, so a reader never sees half a manifest
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / (MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.root / MANIFEST_NAME)
+
+    def partitions(self, feature_set):
+        """{key: {'fingerprint', 'file', 'rows', 'written_at'}} of a feature set."""
+        return dict(self._manifest.get(feature_set, {}))
+
+    def is_current(self, feature_set, key, partition_fingerprint):
+        entry = self._manifest.get(feature_set, {}).get(str(key))
+        return (entry is not None and entry['fingerprint'] == partition_fingerprint
+                and (self.root / entry['file']).exists())
+
+    def write(self, feature_set, key, partition_fingerprint, df):
+        """Store df as the current version of a partition; older versions are removed."""
+        key = str(key)
+        partition_dir = self.root / feature_set / key
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        path = partition_dir / f"{partition_fingerprint}.parquet"
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+
+        self._manifest.setdefault(feature_set, {})[key] = {
+            'fingerprint': partition_fingerprint,
+            'file': str(path.relative_to(self.root)),
+            'rows': len(df),
+            'written_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._write_manifest()
+
+        for old_path in partition_dir.glob('*.parquet'):
+            if old_path != path:
+                old_path.unlink()
+        return path
+
+    def drop(self, feature_set, key):
+        entry = self._manifest.get(feature_set, {}).pop(str(key), None)
+        if entry is not None:
+            self._write_manifest()
+            (self.root / entry['file']).unlink(missing_ok=True)
+
+    def read_table(self, feature_set, keys=None, columns=None):
+        """
+        Current partitions of a feature set as one pyarrow Table, memory-mapped.
+
+        keys selects partitions (all by default); partitions are
+        concatenated in key order.
+        """
+        entries = self._manifest.get(feature_set, {})
+        selected = sorted(entries) if keys is None else [str(k) for k in keys if str(k) in entries]
+        tables = [
+            pq.read_table(self.root / entries[key]['file'], columns=columns, memory_map=True)
+            for key in selected
+        ]
+        if not tables:
+            return None
+        return pa.concat_tables(tables, promote_options='default')
+
+    def read(self, feature_set, keys=None, columns=None):
+        """Like read_table, as a DataFrame (empty when nothing is stored)."""
+        table = self.read_table(feature_set, keys, columns)
+        if table is None:
+            return pd.DataFrame(columns=columns)
+        return table.to_pandas()
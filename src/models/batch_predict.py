@@ -0,0 +1,125 @@
+import time
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.headways import STOP_TIMES_QUERY, load_departures
+from src.database.connection import get_engine
+from src.etl import feed_cache
+from src.etl.service_calendar import day_type_labels, load_service_calendar
+from src.features.build_features import feature_frame
+from src.features.feature_store import MANIFEST_NAME, FeatureStore, default_store_dir
+from src.models.delay_model import load_models, predict_delays
+
+project_root = Path(__file__).parent.parent.parent
+predictions_dir = project_root / 'data' / 'processed' / 'predictions'
+
+# Rows scored per matrix product; bounds the float64 working set
+CHUNK_ROWS = 200_000
+
+
+def predict_service_day(service_date, models=None, store=None, engine=None,
+                        cache_dir=feed_cache.default_cache_dir, chunk_rows=CHUNK_ROWS):
+    """
+    Predicted delay of every (trip, stop) departure on service_date: the
+    stop-level mean delay at that stop and hour (see DelayModel), estimated
+    with the model of the trip's route group.
+
+    The features are per (route, stop, hour), so they are computed once for
+    the day and broadcast to the departures with one merge; the models then
+    score the rows in chunks. Returns trip_id, route_id, stop_id,
+    stop_sequence, departure_sec, predicted_delay_sec and
+    predicted_departure_sec (NaN delay where no model covers the route).
+    """
+    models = models if models is not None else load_models()
+    engine = engine or get_engine()
+    service_calendar = load_service_calendar(engine, cache_dir)
+    feed_departures = None
+    if not feed_cache.cache_available(cache_dir):
+        feed_departures = pd.read_sql(STOP_TIMES_QUERY, engine)
+
+    departures = load_departures(service_date, service_calendar, feed_departures, cache_dir)
+    departures['hour'] = (departures['departure_sec'] // 3600 % 24).astype(np.int16)
+
+    features = feature_frame([service_date], store)
+    for col in ('route_id', 'stop_id'):
+        features[col] = features[col].astype('string')
+    rows = departures[['trip_id', 'route_id', 'stop_id', 'stop_sequence', 'departure_sec', 'hour']].merge(
+        features, on=['route_id', 'stop_id', 'hour'], how='left'
+    )
+    # Departures the representative day lacks still get the date's day type
+    rows['day_type'] = day_type_labels([service_date])[0]
+
+    delay = predict_delays(models, rows, chunk_rows)
+    result = rows[['trip_id', 'route_id', 'stop_id', 'stop_sequence', 'departure_sec']].copy()
+    result['predicted_delay_sec'] = np.round(delay, 1)
+    result['predicted_departure_sec'] = (result['departure_sec'] + np.nan_to_num(delay)).round().astype('Int64')
+    return result.sort_values(['trip_id', 'stop_sequence'], ignore_index=True)
+
+
+def feature_store_stamp(store_root=default_store_dir):
+    """Changes whenever the feature store is rebuilt (its manifest's mtime)."""
+    manifest = Path(store_root) / MANIFEST_NAME
+    return manifest.stat().st_mtime_ns if manifest.exists() else None
+
+
+@lru_cache(maxsize=4)
+def day_features(service_date, store_root, store_stamp):
+    """feature_frame() of one day, kept warm; store_stamp changes when the store is rebuilt."""
+    return feature_frame([service_date], FeatureStore(store_root))
+
+
+def stop_predictions(stop_id, service_date, models, store_root=default_store_dir):
+    """
+    Predicted stop-level mean delay at one stop, per route and hour (for
+    the API); routes only differ through their group's model and features.
+
+    The day's features are computed on the first request for that date and
+    reused by every later request until the feature store changes.
+    """
+    features = day_features(service_date, str(store_root), feature_store_stamp(store_root))
+    rows = features[features['stop_id'].astype(str) == stop_id]
+    if rows.empty or not models:
+        return []
+    predicted = predict_delays(models, rows)
+    return [
+        {'route_id': str(route_id), 'hour': int(hour), 'scheduled_trips': int(trips),
+         'predicted_delay_sec': None if np.isnan(delay) else round(float(delay), 1)}
+        for route_id, hour, trips, delay in zip(rows['route_id'], rows['hour'], rows['scheduled_trips'], predicted)
+    ]
+
+
+def save_predictions(predictions, service_date, output_dir=predictions_dir):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"delay_{service_date.isoformat()}.parquet"
+    predictions.to_parquet(path, index=False)
+    return path
+
+
+def main():
+    service_date = date.today() + timedelta(days=1)
+    models = load_models()
+    if not models:
+        print("✗ No trained models (run src.training.train_delay_model first)")
+        return
+
+    start = time.perf_counter()
+    predictions = predict_service_day(service_date, models, FeatureStore())
+    seconds = time.perf_counter() - start
+    covered = predictions['predicted_delay_sec'].notna()
+    print(f"✓ Scored {len(predictions):,} stop departures on {predictions['trip_id'].nunique():,} trips "
+          f"for {service_date} in {seconds:.1f}s ({covered.mean():.0%} covered by a model)")
+    print(f"✓ Saved: {save_predictions(predictions, service_date)}")
+    print()
+
+    by_route = (predictions[covered].groupby('route_id', observed=True)['predicted_delay_sec']
+                .mean().sort_values(ascending=False).head(10))
+    print("Highest predicted mean delay (seconds):")
+    print(by_route.round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+project_root = Path(__file__).parent.parent.parent
+models_dir = project_root / 'models'
+delay_models_dir = models_dir / 'delay'
+scalers_dir = models_dir / 'scalers'
+
+MANIFEST_NAME = 'manifest.json'
+
+# Halifax Transit numbering: 1-19 frequent corridors, 20-99 local, 100-299
+# express/MetroX, 300+ regional and rural; ferries are not numbered. One
+# model per group: routes in a group share stop spacing and traffic. The
+# target is stop-level (real-time OTP is kept per stop and hour, not per
+# route), so a group's model predicts the all-route mean delay at a stop
+# from that group's features.
+ROUTE_GROUPS = [('corridor', 1, 19), ('local', 20, 99), ('express', 100, 299), ('regional', 300, 999)]
+OTHER_GROUP = 'other'
+
+# Feature store columns used as-is
+NUMERIC_FEATURES = [
+    'scheduled_trips', 'headway_median_sec', 'headway_max_sec', 'stop_fraction',
+    'stop_trips_hour', 'routes_serving_stop', 'route_trips_day',
+    'stops_within_400m', 'nearest_stop_m',
+    'route_delay_lag_1', 'route_delay_mean_7', 'route_on_time_share_7', 'route_observations_7',
+    'stop_delay_lag_1', 'stop_delay_mean_7', 'stop_on_time_share_7', 'stop_observations_7',
+]
+FEATURE_COLUMNS = NUMERIC_FEATURES + [
+    'hour_sin', 'hour_cos', 'is_saturday', 'is_sunday', 'has_route_history', 'has_stop_history',
+]
+
+
+def route_group(route_ids):
+    """Model group of each route id (see ROUTE_GROUPS)."""
+    route_ids = pd.Series(route_ids, dtype='string')
+    number = pd.to_numeric(route_ids.str.extract(r'^(\d+)', expand=False), errors='coerce')
+    groups = np.full(len(route_ids), OTHER_GROUP, dtype=object)
+    for name, low, high in ROUTE_GROUPS:
+        groups[((number >= low) & (number <= high)).to_numpy(dtype=bool, na_value=False)] = name
+    return groups
+
+
+def design_matrix(features):
+    """
+    float32 matrix of FEATURE_COLUMNS from feature_frame() rows.
+
+    Delay-history columns missing from the frame (no real-time data stored
+    yet) come out as NaN, which the scaler maps to the training mean.
+    """
+    n = len(features)
+    hour = features['hour'].to_numpy(dtype=np.float32)
+    day_type = features['day_type'].astype(str).to_numpy()
+    columns = {}
+    for col in NUMERIC_FEATURES:
+        columns[col] = (features[col].to_numpy(dtype=np.float32, na_value=np.nan)
+                        if col in features.columns else np.full(n, np.nan, dtype=np.float32))
+    columns['hour_sin'] = np.sin(2 * np.pi * hour / 24)
+    columns['hour_cos'] = np.cos(2 * np.pi * hour / 24)
+    columns['is_saturday'] = (day_type == 'Saturday').astype(np.float32)
+    columns['is_sunday'] = (day_type == 'Sunday').astype(np.float32)
+    columns['has_route_history'] = (~np.isnan(columns['route_delay_mean_7'])).astype(np.float32)
+    columns['has_stop_history'] = (~np.isnan(columns['stop_delay_mean_7'])).astype(np.float32)
+    return np.column_stack([columns[col] for col in FEATURE_COLUMNS]).astype(np.float32)
+
+
+class Scaler:
+    """Standardizes columns with their NaN-ignoring mean and std; NaN becomes 0 (the mean)."""
+
+    def __init__(self, mean=None, scale=None):
+        self.mean = mean
+        self.scale = scale
+
+    def fit(self, X, weights=None):
+        X = np.asarray(X, dtype=np.float64)
+        present = ~np.isnan(X)
+        w = np.ones(len(X)) if weights is None else np.asarray(weights, dtype=np.float64)
+        w = present * w[:, None]
+        total = np.maximum(w.sum(axis=0), 1e-12)
+        filled = np.where(present, X, 0.0)
+        self.mean = (w * filled).sum(axis=0) / total
+        variance = (w * (filled - self.mean) ** 2).sum(axis=0) / total
+        self.scale = np.where(variance > 1e-12, np.sqrt(variance), 1.0)
+        return self
+
+    def transform(self, X):
+        scaled = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        return np.nan_to_num(scaled, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, scale=self.scale)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['mean'], data['scale'])
+
+
+def ridge_normal_equations(X, y, weights):
+    """Weighted Gram matrix and moment vector of [X, 1], for solving at several alphas."""
+    Xa = np.column_stack([X, np.ones(len(X))])
+    weighted = Xa * weights[:, None]
+    return weighted.T @ Xa, weighted.T @ y
+
+
+def ridge_solve(gram, moment, alpha):
+    """Coefficients and intercept for one alpha (the intercept is not penalized)."""
+    penalty = np.full(gram.shape[0], alpha)
+    penalty[-1] = 0.0
+    solution = np.linalg.solve(gram + np.diag(penalty), moment)
+    return solution[:-1], solution[-1]
+
+
+class DelayModel:
+    """
+    Weighted ridge regression of the stop-level mean delay (seconds, all
+    routes) at a stop and hour, fitted on one route group's rows, with its
+    scaler.
+
+    Saved as two small .npz files (models/delay/<group>.npz and
+    models/scalers/<group>.npz): a coefficient per feature, nothing else.
+    """
+
+    def __init__(self, group, scaler, coef, intercept, alpha):
+        self.group = group
+        self.scaler = scaler
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.alpha = float(alpha)
+
+    @classmethod
+    def fit(cls, group, X, y, weights, alpha):
+        scaler = Scaler().fit(X, weights)
+        gram, moment = ridge_normal_equations(scaler.transform(X), y, weights)
+        coef, intercept = ridge_solve(gram, moment, alpha)
+        return cls(group, scaler, coef, intercept, alpha)
+
+    def predict(self, X):
+        return self.scaler.transform(X) @ self.coef + self.intercept
+
+    def save(self, model_dir=delay_models_dir, scaler_dir=scalers_dir):
+        model_dir.mkdir(parents=True, exist_ok=True)
+        scaler_dir.mkdir(parents=True, exist_ok=True)
+        np.savez(model_dir / f"{self.group}.npz", coef=self.coef, intercept=self.intercept,
+                 alpha=self.alpha, features=np.array(FEATURE_COLUMNS))
+        self.scaler.save(scaler_dir / f"{self.group}.npz")
+
+    @classmethod
+    def load(cls, group, model_dir=delay_models_dir, scaler_dir=scalers_dir):
+        with np.load(model_dir / f"{group}.npz") as data:
+            if list(data['features']) != FEATURE_COLUMNS:
+                raise ValueError(f"Model {group} was trained on different features; retrain it")
+            coef, intercept, alpha = data['coef'], data['intercept'], data['alpha']
+        return cls(group, Scaler.load(scaler_dir / f"{group}.npz"), coef, intercept, alpha)
+
+
+def read_models_manifest(model_dir=delay_models_dir):
+    path = Path(model_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_models(model_dir=delay_models_dir, scaler_dir=scalers_dir):
+    """{group: DelayModel} for every group in the manifest."""
+    manifest = read_models_manifest(model_dir)
+    return {group: DelayModel.load(group, model_dir, scaler_dir) for group in manifest.get('groups', {})}
+
+
+def predict_delays(models, features, chunk_rows=None):
+    """
+    Predicted mean delay (seconds) for each feature_frame() row.
+
+    Rows are split by route group and scored with that group's model, in
+    chunks of chunk_rows to bound the float64 working set. Rows of a group
+    without a model get NaN.
+    """
+    predictions = np.full(len(features), np.nan)
+    groups = route_group(features['route_id'].astype(str))
+    chunk_rows = chunk_rows or max(len(features), 1)
+    for group, model in models.items():
+        rows = np.flatnonzero(groups == group)
+        for start in range(0, len(rows), chunk_rows):
+            chunk = rows[start:start + chunk_rows]
+            predictions[chunk] = model.predict(design_matrix(features.iloc[chunk]))
+    return predictions
+
+
+class ModelCache:
+    """
+    Models kept loaded in a long-running process (the API).
+
+    get() reloads only when the models manifest changes on disk, so a
+    retrain is picked up without a restart and requests never re-read the
+    .npz files. The manifest's version is read at the same time, so
+    version costs no I/O.
+    """
+
+    def __init__(self, model_dir=delay_models_dir, scaler_dir=scalers_dir):
+        self.model_dir = Path(model_dir)
+        self.scaler_dir = Path(scaler_dir)
+        self._models = None
+        self._version = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _manifest_stamp(self):
+        path = self.model_dir / MANIFEST_NAME
+        return path.stat().st_mtime_ns if path.exists() else None
+
+    def current(self):
+        """(models, version) as of the manifest on disk now."""
+        stamp = self._manifest_stamp()
+        with self._lock:
+            if self._models is None or stamp != self._stamp:
+                if stamp:
+                    self._models = load_models(self.model_dir, self.scaler_dir)
+                    self._version = read_models_manifest(self.model_dir).get('trained_at')
+                else:
+                    self._models, self._version = {}, None
+                self._stamp = stamp
+            return self._models, self._version
+
+    def get(self):
+        return self.current()[0]
+
+    @property
+    def version(self):
+        """Version of the models last loaded by get()/current()."""
+        return self._version
@@ -0,0 +1,214 @@
+import json
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.features.build_features import feature_frame
+from src.features.feature_store import FeatureStore
+from src.models.delay_model import (
+    FEATURE_COLUMNS, MANIFEST_NAME, DelayModel, Scaler, delay_models_dir, design_matrix,
+    ridge_normal_equations, ridge_solve, route_group, scalers_dir,
+)
+
+project_root = Path(__file__).parent.parent.parent
+arrays_dir = project_root / 'data' / 'processed' / 'training'
+
+ALPHAS = [0.1, 1.0, 10.0, 100.0, 1000.0]
+N_FOLDS = 5
+TRAIN_WORKERS = 4
+
+# Groups with fewer (stop, hour, day) rows than this aren't modelled
+MIN_GROUP_ROWS = 500
+
+
+def training_frame(store=None):
+    """
+    Feature rows for every past service day with real-time history, with
+    the observed mean delay at the stop and hour as target.
+
+    stop_otp has no route, so the target is the stop-level mean over all
+    routes and is shared by every (route, stop, hour) row at that stop and
+    hour. The observations behind it are split evenly between those rows
+    as weight, so a stop-hour counts once however many routes serve it.
+    """
+    store = store or FeatureStore()
+    targets = store.read('stop_delay', columns=['service_date', 'stop_id', 'hour',
+                                                'observations', 'total_delay_sec'])
+    targets = targets[targets['observations'] > 0]
+    if targets.empty:
+        return None
+    targets = targets.astype({'stop_id': str, 'hour': np.int16, 'service_date': 'datetime64[ns]'})
+    targets['target_delay_sec'] = targets['total_delay_sec'] / targets['observations']
+
+    features = feature_frame(sorted(targets['service_date'].dt.date.unique()), store)
+    features['stop_id'] = features['stop_id'].astype(str)
+    frame = features.merge(targets[['service_date', 'stop_id', 'hour', 'observations', 'target_delay_sec']],
+                           on=['service_date', 'stop_id', 'hour'], how='inner')
+    routes_at_stop = frame.groupby(['service_date', 'stop_id', 'hour'])['route_id'].transform('size')
+    frame['weight'] = frame['observations'] / routes_at_stop
+    return frame.drop(columns='observations')
+
+
+def write_group_arrays(frame, output_dir=arrays_dir):
+    """
+    Write each route group's design matrix, target, weights and CV fold as
+    .npy files, so the worker processes memory-map them instead of
+    receiving pickled copies. Folds interleave service dates (date index
+    mod N_FOLDS), so every fold sees all day types.
+    """
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+
+    groups = route_group(frame['route_id'].astype(str))
+    date_index = pd.factorize(frame['service_date'], sort=True)[0]
+    written = {}
+    for group in sorted(set(groups)):
+        rows = np.flatnonzero(groups == group)
+        if len(rows) < MIN_GROUP_ROWS:
+            continue
+        part = frame.iloc[rows]
+        np.save(output_dir / f"{group}_X.npy", design_matrix(part))
+        np.save(output_dir / f"{group}_y.npy", part['target_delay_sec'].to_numpy(dtype=np.float64))
+        np.save(output_dir / f"{group}_w.npy", part['weight'].to_numpy(dtype=np.float64))
+        np.save(output_dir / f"{group}_fold.npy", (date_index[rows] % N_FOLDS).astype(np.int8))
+        written[group] = len(rows)
+    return written
+
+
+def load_group_arrays(group, input_dir=arrays_dir):
+    return tuple(np.load(input_dir / f"{group}_{name}.npy", mmap_mode='r') for name in ('X', 'y', 'w', 'fold'))
+
+
+def weighted_errors(predicted, y, weights):
+    error = predicted - y
+    total = weights.sum()
+    return {
+        'mae': float((weights * np.abs(error)).sum() / total),
+        'rmse': float(np.sqrt((weights * error ** 2).sum() / total)),
+    }
+
+
+def evaluate_fold(group, fold, alphas=ALPHAS, input_dir=arrays_dir):
+    """
+    Fit on every fold but one and score the held-out fold at each alpha.
+
+    Runs in a worker process; the scaler is fitted on the training folds
+    only and the Gram matrix is built once and solved per alpha.
+    """
+    X, y, w, folds = load_group_arrays(group, input_dir)
+    train = np.asarray(folds) != fold
+    if train.all() or not train.any():
+        return group, fold, None
+
+    scaler = Scaler().fit(X[train], w[train])
+    gram, moment = ridge_normal_equations(scaler.transform(X[train]), y[train], w[train])
+    X_test = scaler.transform(X[~train])
+    scores = {}
+    for alpha in alphas:
+        coef, intercept = ridge_solve(gram, moment, alpha)
+        scores[alpha] = weighted_errors(X_test @ coef + intercept, y[~train], w[~train])
+
+    baseline = np.full((~train).sum(), np.average(y[train], weights=w[train]))
+    scores['baseline'] = weighted_errors(baseline, y[~train], w[~train])
+    return group, fold, scores
+
+
+def cross_validate(groups, workers=TRAIN_WORKERS, input_dir=arrays_dir):
+    """
+    {group: {alpha: mean held-out errors}} over N_FOLDS folds, one
+    (group, fold) task per process-pool job.
+    """
+    results = {group: [] for group in groups}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(evaluate_fold, group, fold, ALPHAS, input_dir)
+                   for group in groups for fold in range(N_FOLDS)]
+        for future in futures:
+            group, _, scores = future.result()
+            if scores is not None:
+                results[group].append(scores)
+
+    summary = {}
+    for group, fold_scores in results.items():
+        if not fold_scores:
+            continue
+        summary[group] = {
+            key: {metric: float(np.mean([s[key][metric] for s in fold_scores])) for metric in ('mae', 'rmse')}
+            for key in fold_scores[0]
+        }
+    return summary
+
+
+def fit_group(group, alpha, input_dir=arrays_dir):
+    X, y, w, _ = load_group_arrays(group, input_dir)
+    return DelayModel.fit(group, np.asarray(X), np.asarray(y), np.asarray(w), alpha)
+
+
+def save_manifest(cv_summary, chosen, rows, model_dir=delay_models_dir):
+    manifest = {
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'features': FEATURE_COLUMNS,
+        'groups': {
+            group: {
+                'alpha': chosen[group],
+                'rows': rows[group],
+                'cv': {str(key): scores for key, scores in cv_summary[group].items()},
+            }
+            for group in chosen
+        },
+    }
+    model_dir.mkdir(parents=True, exist_ok=True)
+    with open(model_dir / MANIFEST_NAME, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def train(store=None, workers=TRAIN_WORKERS, model_dir=delay_models_dir, scaler_dir=scalers_dir):
+    """
+    Train one delay model per route group and save the artifacts.
+
+    Returns {group: (alpha, cv errors at that alpha, baseline errors)}, or
+    None when the store has no real-time history to learn from.
+    """
+    frame = training_frame(store)
+    if frame is None:
+        return None
+    rows = write_group_arrays(frame)
+    del frame
+
+    cv_summary = cross_validate(list(rows), workers)
+    chosen = {group: min(ALPHAS, key=lambda a: scores[a]['rmse']) for group, scores in cv_summary.items()}
+    for group, alpha in chosen.items():
+        fit_group(group, alpha).save(model_dir, scaler_dir)
+    save_manifest(cv_summary, chosen, rows, model_dir)
+    shutil.rmtree(arrays_dir, ignore_errors=True)
+
+    return {group: (alpha, cv_summary[group][alpha], cv_summary[group]['baseline'])
+            for group, alpha in chosen.items()}
+
+
+def main():
+    start = time.perf_counter()
+    results = train()
+    if results is None:
+        print("✗ No real-time delay history in the feature store "
+              "(run src.analysis.delay_engine, then src.features.build_features)")
+        return
+
+    print(f"✓ Trained {len(results)} route-group models in {time.perf_counter() - start:.1f}s")
+    print()
+    print(f"{'Group':<12}{'Alpha':>8}{'CV MAE (s)':>12}{'CV RMSE (s)':>13}{'Baseline RMSE':>15}")
+    print("-" * 60)
+    for group, (alpha, scores, baseline) in sorted(results.items()):
+        print(f"{group:<12}{alpha:>8g}{scores['mae']:>12.1f}{scores['rmse']:>13.1f}{baseline['rmse']:>15.1f}")
+    print()
+    print(f"✓ Models: {delay_models_dir}")
+    print(f"✓ Scalers: {scalers_dir}")
+
+
+if __name__ == "__main__":
+    main()
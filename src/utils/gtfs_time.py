@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+
+def gtfs_time_to_seconds(values):
+    """
+    Convert GTFS HH:MM:SS strings to seconds since service-day midnight.
+
+    Hours can exceed 23 for trips running past midnight (25:10:00 -> 90600).
+    Blank or malformed values become <NA>. Returns an Int32 Series.
+    """
+    series = pd.Series(values, copy=False).astype('string').str.strip()
+    parts = series.str.split(':', n=2, expand=True)
+    if parts.shape[1] < 3:
+        return pd.Series(pd.NA, index=series.index, dtype='Int32')
+
+    hours = pd.to_numeric(parts[0], errors='coerce')
+    minutes = pd.to_numeric(parts[1], errors='coerce')
+    seconds = pd.to_numeric(parts[2], errors='coerce')
+    total = hours * 3600 + minutes * 60 + seconds
+    return total.round().astype('Int32')
+
+
+def seconds_to_gtfs_time(seconds):
+    """Format seconds since service-day midnight back to HH:MM:SS (hours may exceed 23)."""
+    seconds = np.asarray(seconds, dtype=np.int64)
+    hours, remainder = np.divmod(seconds, 3600)
+    minutes, secs = np.divmod(remainder, 60)
+    return [f"{h:02d}:{m:02d}:{s:02d}" for h, m, s in zip(hours, minutes, secs)]
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import streamlit as st
+
+# `streamlit run streamlit_app/app.py` puts only this folder on sys.path
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from streamlit_app.components import overview, reliability, routes, service, stops  # noqa: E402
+from streamlit_app.utils import data  # noqa: E402
+
+VIEWS = {
+    'Overview': overview,
+    'Routes': routes,
+    'Stops': stops,
+    'Service by hour': service,
+    'Reliability': reliability,
+}
+
+
+def main():
+    st.set_page_config(page_title="Halifax Transit Analytics", layout="wide")
+    st.title("Halifax Transit Analytics")
+
+    version = data.feed_version()
+
+    # Only the selected view runs its loaders (st.tabs would run all of them)
+    view = st.sidebar.radio("View", list(VIEWS))
+    st.sidebar.caption(f"Feed version: {version}")
+
+    VIEWS[view].render(version)
+
+
+main()
@@ -0,0 +1,20 @@
+import streamlit as st
+
+from streamlit_app.utils import data
+
+
+def render(version):
+    stats = data.network_stats(version)
+
+    st.subheader("Network")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Routes", f"{stats['total_routes']:,}")
+    col2.metric("Stops", f"{stats['total_stops']:,}")
+    col3.metric("Scheduled trips", f"{stats['total_trips']:,}")
+    col4.metric("Stop-time entries", f"{int(stats['total_stop_times'] or 0):,}")
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Avg routes per stop", f"{stats['avg_routes_per_stop']}")
+    col2.metric("Max routes at one stop", f"{stats['max_routes_at_stop']}")
+    col3.metric("Hub stops (5+ routes)", f"{stats['hub_stops']:,}")
+    col4.metric("Single-route stops", f"{stats['isolated_stops']:,}")
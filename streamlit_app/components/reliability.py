@@ -0,0 +1,26 @@
+import streamlit as st
+
+from streamlit_app.utils import data
+
+
+def render(version):
+    st.subheader("On-time performance")
+    days = st.slider("Days", 1, 30, 7)
+    otp = data.route_otp(days)
+    if otp.empty:
+        st.info("No real-time observations yet: run the realtime ingester and `python -m src.analysis.delay_engine`.")
+        return
+
+    routes = data.route_stats(version)[['route_id', 'route_short_name']]
+    otp = otp.merge(routes, on='route_id', how='left').sort_values('on_time_pct')
+
+    total = otp['observations'].sum()
+    col1, col2 = st.columns(2)
+    col1.metric("Stops observed", f"{int(total):,}")
+    col2.metric("On time", f"{otp['on_time'].sum() / total * 100:.1f}%")
+
+    st.bar_chart(otp.set_index('route_short_name')['on_time_pct'], horizontal=True)
+    st.dataframe(
+        otp[['route_short_name', 'observations', 'on_time_pct', 'early', 'late', 'avg_delay_sec']],
+        hide_index=True, use_container_width=True,
+    )
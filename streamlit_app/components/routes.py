@@ -0,0 +1,37 @@
+import streamlit as st
+
+from streamlit_app.utils import data
+
+
+def render(version):
+    routes = data.route_stats(version)
+
+    st.subheader("Route frequency")
+    top_n = st.slider("Routes shown", 5, 50, 20)
+    top = routes.nlargest(top_n, 'avg_trips_per_service').set_index('route_short_name')
+    st.bar_chart(top['avg_trips_per_service'], horizontal=True)
+
+    route_headways, _ = data.headways(version)
+    st.subheader("Scheduled headways")
+    if route_headways is None:
+        st.info("No headway features yet: run `python -m src.analysis.headways`.")
+    else:
+        col1, col2 = st.columns(2)
+        day_type = col1.selectbox("Day", sorted(route_headways['day_type'].unique()))
+        window = col2.selectbox("Time window", list(route_headways['window'].unique()))
+        selected = route_headways[(route_headways['day_type'] == day_type)
+                                  & (route_headways['window'] == window)]
+        selected = selected.merge(routes[['route_id', 'route_short_name', 'route_long_name']], on='route_id')
+        selected = selected.assign(
+            median_min=(selected['median_headway_sec'] / 60).round(1),
+            p90_min=(selected['p90_headway_sec'] / 60).round(1),
+            max_gap_min=(selected['max_gap_sec'] / 60).round(1),
+        ).sort_values('median_min')
+        st.dataframe(
+            selected[['route_short_name', 'route_long_name', 'direction_id', 'median_min', 'p90_min',
+                      'max_gap_min', 'trips_per_hour', 'bunched_gaps']],
+            hide_index=True, use_container_width=True,
+        )
+
+    st.subheader("All routes")
+    st.dataframe(routes, hide_index=True, use_container_width=True)
@@ -0,0 +1,22 @@
+import streamlit as st
+
+from streamlit_app.utils import data
+
+
+def render(version):
+    hourly = data.route_hourly(version)
+    routes = data.route_stats(version)
+
+    st.subheader("Departures by hour")
+    names = routes.set_index('route_id')['route_short_name']
+    choices = sorted(hourly['route_id'].unique(), key=lambda r: str(names.get(r, r)))
+    selected = st.multiselect("Routes (all when empty)", choices, format_func=lambda r: str(names.get(r, r)))
+
+    # Filtering works on the cached route x hour counts: no query per change
+    subset = hourly[hourly['route_id'].isin(selected)] if selected else hourly
+    by_hour = subset.groupby('hour')['num_departures'].sum()
+    st.bar_chart(by_hour)
+
+    peak_hour = int(by_hour.idxmax()) if len(by_hour) else None
+    if peak_hour is not None:
+        st.caption(f"Peak hour: {peak_hour}:00 ({by_hour.max():,} departures)")
@@ -0,0 +1,23 @@
+import streamlit as st
+
+from streamlit_app.utils import data
+
+
+def render(version):
+    stops = data.stop_stats(version)
+
+    st.subheader("Stops")
+    min_routes = st.slider("Minimum routes serving the stop", 0, int(stops['routes_serving_stop'].max() or 0), 0)
+    shown = stops[stops['routes_serving_stop'].fillna(0) >= min_routes]
+    st.caption(f"{len(shown):,} of {len(stops):,} stops")
+    st.map(shown, latitude='lat', longitude='lon', size=20)
+
+    st.subheader("Connectivity distribution")
+    distribution = stops['routes_serving_stop'].fillna(0).astype(int).value_counts().sort_index()
+    st.bar_chart(distribution.rename('num_stops'))
+
+    st.subheader("Best-connected stops")
+    st.dataframe(
+        stops.nlargest(20, 'routes_serving_stop')[['stop_name', 'routes_serving_stop', 'total_trips', 'route_list']],
+        hide_index=True, use_container_width=True,
+    )
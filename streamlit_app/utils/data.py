@@ -0,0 +1,142 @@
+"""
+Data access for the dashboard.
+
+Every loader takes the feed version as its first argument, so st.cache_data
+keeps one result per loaded feed and a reload (new version) is picked up
+without restarting the app. Loaders read the Parquet feed cache,
+data/features and the summary tables (route_stats, stop_stats, route_otp)
+- never the stop_times views - and each tab calls only the loaders it needs.
+"""
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+from src.analysis.headways import features_dir
+from src.analysis.temporal_engine import TemporalAggregates, load_stop_time_frame
+from src.database.connection import get_engine
+from src.etl import feed_cache
+
+VERSION_TTL_SECONDS = 30
+
+
+@st.cache_resource
+def engine():
+    return get_engine()
+
+
+@st.cache_data(ttl=VERSION_TTL_SECONDS)
+def feed_version():
+    """
+    Identifies the data currently loaded: the Parquet cache manifest when
+    present, else the feed_version the last load recorded. Checked every
+    VERSION_TTL_SECONDS; everything else is cached until it changes.
+    """
+    manifest = feed_cache.read_manifest()
+    if manifest:
+        return f"{manifest.get('feed_version')}:{manifest.get('written_at')}"
+    with engine().connect() as conn:
+        return conn.execute(text("""
+            SELECT COALESCE((SELECT version FROM feed_version), '')
+        """)).scalar()
+
+
+@st.cache_data(show_spinner=False)
+def network_stats(version):
+    query = """
+    SELECT
+        (SELECT COUNT(*) FROM routes) as total_routes,
+        (SELECT COUNT(*) FROM stops) as total_stops,
+        (SELECT COUNT(*) FROM trips) as total_trips,
+        (SELECT SUM(stop_time_count) FROM stop_stats) as total_stop_times,
+        (SELECT ROUND(AVG(routes_serving_stop)::numeric, 2) FROM stop_stats) as avg_routes_per_stop,
+        (SELECT MAX(routes_serving_stop) FROM stop_stats) as max_routes_at_stop,
+        (SELECT COUNT(*) FROM stop_stats WHERE routes_serving_stop >= 5) as hub_stops,
+        (SELECT COUNT(*) FROM stop_stats WHERE routes_serving_stop = 1) as isolated_stops;
+    """
+    return pd.read_sql(query, engine()).iloc[0].to_dict()
+
+
+@st.cache_data(show_spinner=False)
+def route_stats(version):
+    query = """
+    SELECT
+        route_id,
+        route_short_name,
+        route_long_name,
+        route_type,
+        total_trips,
+        service_patterns,
+        unique_stops,
+        total_trips::float / NULLIF(service_patterns, 0) as avg_trips_per_service
+    FROM route_stats
+    ORDER BY route_short_name;
+    """
+    return pd.read_sql(query, engine())
+
+
+@st.cache_data(show_spinner=False)
+def stop_stats(version):
+    query = """
+    SELECT
+        stop_id,
+        stop_name,
+        stop_lat::float as lat,
+        stop_lon::float as lon,
+        routes_serving_stop,
+        total_trips,
+        route_list
+    FROM stop_stats
+    WHERE stop_lat IS NOT NULL AND stop_lon IS NOT NULL;
+    """
+    return pd.read_sql(query, engine())
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def temporal_aggregates(version):
+    """
+    One pass over stop_times per feed version; every hourly view is cut from
+    it. Only the current version's aggregates are kept alive.
+    """
+    return TemporalAggregates.from_frame(load_stop_time_frame(engine()))
+
+
+@st.cache_data(show_spinner=False)
+def route_hourly(version):
+    """Departures per route and hour (long format) from the cached aggregates."""
+    aggregates = temporal_aggregates(version)
+    matrix = pd.DataFrame(aggregates.route_hour, index=aggregates.route_ids)
+    matrix.index.name = 'route_id'
+    matrix.columns.name = 'hour'
+    hourly = matrix.stack().rename('num_departures').reset_index()
+    return hourly[hourly['num_departures'] > 0].reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False)
+def headways(version):
+    """Route and stop headways written by src.analysis.headways (None if not computed yet)."""
+    route_path = features_dir / 'route_headways.parquet'
+    stop_path = features_dir / 'stop_headways.parquet'
+    if not route_path.exists():
+        return None, None
+    stops = pd.read_parquet(stop_path) if stop_path.exists() else None
+    return pd.read_parquet(route_path), stops
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def route_otp(days):
+    """On-time performance per route over the last days (live data: cached for a minute only)."""
+    query = """
+    SELECT
+        route_id,
+        SUM(observations) as observations,
+        SUM(on_time) as on_time,
+        SUM(early) as early,
+        SUM(late) as late,
+        SUM(total_delay_sec)::float / NULLIF(SUM(observations), 0) as avg_delay_sec
+    FROM route_otp
+    WHERE service_date >= CURRENT_DATE - CAST(:days AS INTEGER)
+    GROUP BY route_id;
+    """
+    df = pd.read_sql(text(query), engine(), params={'days': days})
+    df['on_time_pct'] = (df['on_time'] / df['observations'] * 100).round(1)
+    return df
@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.etl.shape_geometry import snap_stops_to_shape
+
+
+def out_and_back(length=1000.0, gap=12.0, step=10.0):
+    """Outbound along y=0 to x=length, then back along y=gap."""
+    outbound = np.arange(0.0, length + step, step)
+    x = np.r_[outbound, outbound[::-1]]
+    y = np.r_[np.zeros(len(outbound)), np.full(len(outbound), gap)]
+    return x, y
+
+
+def test_return_leg_stop_snaps_to_return_pass():
+    x, y = out_and_back()
+    stop_x = np.array([100.0, 500.0, 700.0])
+    stop_y = np.array([-3.0, -3.0, 15.0])
+
+    offsets, snap_distance = snap_stops_to_shape(x, y, stop_x, stop_y)
+
+    assert np.allclose(offsets[:2], [100.0, 500.0])
+    assert abs(offsets[2] - (1000.0 + 12.0 + 300.0)) < 1.0
+    assert np.allclose(snap_distance, [3.0, 3.0, 3.0])
+
+
+def test_offsets_never_go_backwards_on_out_and_back():
+    x, y = out_and_back()
+    stop_x = np.r_[np.linspace(0, 1000, 6), np.linspace(1000, 0, 6)[1:]]
+    stop_y = np.r_[np.full(6, -4.0), np.full(5, 16.0)]
+
+    offsets, snap_distance = snap_stops_to_shape(x, y, stop_x, stop_y)
+
+    assert np.all(np.diff(offsets) >= 0)
+    assert offsets[-1] > 1900.0
+    assert snap_distance.max() <= 4.0 + 1e-9
+
+
+def test_stop_closer_to_other_pass_keeps_stop_order():
+    # The middle outbound stop sits nearer the return pass; snapping it
+    # there would strand the stops after it
+    x, y = out_and_back()
+    stop_x = np.array([100.0, 400.0, 800.0])
+    stop_y = np.array([-2.0, 7.0, -2.0])
+
+    offsets, _ = snap_stops_to_shape(x, y, stop_x, stop_y)
+
+    assert np.allclose(offsets, [100.0, 400.0, 800.0])